@@ -0,0 +1,197 @@
+"""
+Offline geocoding and proximity queries for farm locations.
+
+Farm locations are free text, so they are resolved against a small bundled
+gazetteer (``data/places.csv``) without any network calls.  Each geocoded
+FarmerProfile also stores the geohash of its coordinates; a radius query
+first narrows farms to the few geohash cells covering the search circle's
+bounding box (an indexed prefix match), then trims to the box itself and
+only computes the exact great-circle distance for the survivors.
+"""
+import csv
+import math
+import os
+import re
+from functools import lru_cache
+
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Covers larger than this fall back to a plain bounding box
+MAX_COVER_CELLS = 16
+
+PLACES_FILE = os.path.join(os.path.dirname(__file__), 'data', 'places.csv')
+
+_WORD_RE = re.compile(r"[^\w\s,]+", re.UNICODE)
+
+
+def _normalize(text):
+    text = _WORD_RE.sub(' ', (text or '').lower())
+    return ' '.join(text.split())
+
+
+@lru_cache(maxsize=1)
+def gazetteer():
+    """Map normalized place names to ``(latitude, longitude)``."""
+    places = {}
+    with open(PLACES_FILE, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            point = (float(row['latitude']), float(row['longitude']))
+            name = _normalize(row['name'])
+            places.setdefault(name, point)
+            for qualifier in (row['region'], row['country']):
+                if qualifier:
+                    places.setdefault(f'{name} {_normalize(qualifier)}', point)
+    return places
+
+
+def geocode(text):
+    """Resolve free-text ``text`` to ``(latitude, longitude)`` or ``None``.
+
+    Comma-separated parts are tried most specific first ("Ejisu, Ashanti"
+    resolves to Ejisu, not the region), and within a part the longest run
+    of words naming a known place wins.
+    """
+    places = gazetteer()
+    normalized = _normalize(text)
+    if not normalized:
+        return None
+
+    parts = [part.strip() for part in normalized.split(',') if part.strip()]
+    qualified = ' '.join(parts)
+    if qualified in places:
+        return places[qualified]
+
+    for part in parts:
+        words = part.split()
+        for size in range(len(words), 0, -1):
+            for start in range(len(words) - size + 1):
+                point = places.get(' '.join(words[start:start + size]))
+                if point is not None:
+                    return point
+    return None
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def _cell_size(precision):
+    """``(lat_degrees, lon_degrees)`` spanned by one geohash cell."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """``(min_lat, max_lat, min_lon, max_lon)`` around a point.
+
+    Longitude bounds are ``None`` when the box reaches a pole or crosses the
+    antimeridian, where a longitude range stops being meaningful.
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    min_lat, max_lat = latitude - dlat, latitude + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), None, None
+    dlon = radius_km / (KM_PER_DEGREE_LAT * math.cos(math.radians(latitude)))
+    min_lon, max_lon = longitude - dlon, longitude + dlon
+    if min_lon < -180 or max_lon > 180:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, min_lon, max_lon
+
+
+def geohash_cover(min_lat, max_lat, min_lon, max_lon):
+    """Geohash prefixes whose cells together cover the box.
+
+    Uses the finest precision that needs at most ``MAX_COVER_CELLS`` cells;
+    returns an empty list if even that is too coarse to help.
+    """
+    best = []
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        lat_step, lon_step = _cell_size(precision)
+        rows = int(max_lat // lat_step - min_lat // lat_step) + 1
+        columns = int(max_lon // lon_step - min_lon // lon_step) + 1
+        if rows * columns > MAX_COVER_CELLS:
+            break
+        lats = [min_lat + row * lat_step for row in range(rows)] + [max_lat]
+        lons = [min_lon + column * lon_step for column in range(columns)] + [max_lon]
+        cells = {
+            encode_geohash(min(lat, max_lat), min(lon, max_lon), precision)
+            for lat in lats for lon in lons
+        }
+        best = sorted(cells)
+    return best
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def distance_expression(latitude, longitude, lat_field, lon_field):
+    """Haversine distance in km from a point to ``lat_field``/``lon_field``."""
+    lat = math.radians(latitude)
+    dlat = (Radians(F(lat_field)) - lat) / 2
+    dlon = (Radians(F(lon_field)) - math.radians(longitude)) / 2
+    a = Power(Sin(dlat), 2) + math.cos(lat) * Cos(Radians(F(lat_field))) * Power(Sin(dlon), 2)
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(a), output_field=FloatField())
+
+
+def filter_within(queryset, latitude, longitude, radius_km, prefix=''):
+    """Restrict ``queryset`` to rows within ``radius_km`` of a point.
+
+    ``prefix`` is the lookup path to the FarmerProfile, e.g. ``'farmer__'``
+    for products.  Rows are annotated with ``distance_km``.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+
+    box = Q(**{
+        f'{prefix}latitude__gte': min_lat,
+        f'{prefix}latitude__lte': max_lat,
+    })
+    if min_lon is not None:
+        box &= Q(**{
+            f'{prefix}longitude__gte': min_lon,
+            f'{prefix}longitude__lte': max_lon,
+        })
+        cells = Q()
+        for cell in geohash_cover(min_lat, max_lat, min_lon, max_lon):
+            cells |= Q(**{f'{prefix}geohash__startswith': cell})
+        box &= cells
+    else:
+        box &= Q(**{f'{prefix}longitude__isnull': False})
+
+    return queryset.filter(box).annotate(
+        distance_km=distance_expression(
+            latitude, longitude, f'{prefix}latitude', f'{prefix}longitude'
+        )
+    ).filter(distance_km__lte=radius_km)
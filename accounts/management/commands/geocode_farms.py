@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import FarmerProfile
+from products.cache import bump_catalog_generation
+
+
+class Command(BaseCommand):
+    help = 'Re-geocode farm locations against the bundled gazetteer'
+
+    def handle(self, *args, **options):
+        located = 0
+        moved = 0
+        profiles = FarmerProfile.objects.filter(location_is_manual=False)
+        for profile in profiles.iterator():
+            before = (profile.latitude, profile.longitude, profile.geohash)
+            profile.update_coordinates()
+            if (profile.latitude, profile.longitude, profile.geohash) != before:
+                FarmerProfile.objects.filter(pk=profile.pk).update(
+                    latitude=profile.latitude,
+                    longitude=profile.longitude,
+                    geohash=profile.geohash,
+                )
+                moved += 1
+            located += profile.latitude is not None
+        if moved:
+            # Distance-sorted and nearby listings are cached per generation
+            bump_catalog_generation()
+        self.stdout.write(self.style.SUCCESS(
+            f'Located {located} of {profiles.count()} farms ({moved} moved).'
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from accounts import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute stored farmer follower, rating and sales statistics and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report drift without correcting it',
+        )
+
+    def handle(self, *args, **options):
+        checked, drift = stats.rebuild_all(dry_run=options['dry_run'])
+        for farmer, field, stored, actual in drift:
+            self.stdout.write(f'{farmer.user.username}: {field} was {stored}, should be {actual}')
+        farmers = len({farmer.pk for farmer, field, stored, actual in drift})
+        verb = 'found' if options['dry_run'] else 'corrected'
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} farmers, {verb} {len(drift)} values on {farmers}.'
+        ))
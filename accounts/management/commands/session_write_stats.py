@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from farmmarket.sessions import session_stats
+
+
+class Command(BaseCommand):
+    help = 'Show how many session writes the coalescing session middleware made and avoided'
+
+    def handle(self, *args, **options):
+        stats = session_stats()
+        written = stats['saved'] + stats['refreshed']
+        avoided = stats['unchanged'] + stats['skipped']
+        for outcome, total in stats.items():
+            self.stdout.write(f'{outcome}: {total}')
+        share = f' ({avoided / (written + avoided):.1%})' if written + avoided else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{written} session writes, {avoided} avoided{share}.'
+        ))
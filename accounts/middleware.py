@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from . import profiles
+from .models import User
+
+
+def _load_request_user(request):
+    try:
+        user_id = User._meta.pk.to_python(request.session[SESSION_KEY])
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except (KeyError, ValidationError):
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+    backend = auth.load_backend(backend_path)
+    if not isinstance(backend, ModelBackend):
+        # Users from other backends come from wherever that backend gets them
+        return auth.get_user(request)
+
+    user = profiles.load_user(user_id)
+    if user is None or not backend.user_can_authenticate(user):
+        return AnonymousUser()
+    # Same session check as django.contrib.auth.get_user
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    session_auth_hash = user.get_session_auth_hash()
+    if session_hash and constant_time_compare(session_hash, session_auth_hash):
+        return user
+    # Signed with a key from SECRET_KEY_FALLBACKS: keep the user logged in
+    # and move the session over to the current key
+    if session_hash and any(
+        constant_time_compare(session_hash, fallback_hash)
+        for fallback_hash in user.get_session_auth_fallback_hash()
+    ):
+        request.session.cycle_key()
+        request.session[HASH_SESSION_KEY] = session_auth_hash
+        return user
+    request.session.flush()
+    return AnonymousUser()
+
+
+def get_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = _load_request_user(request)
+    return request._cached_user
+
+
+class UserProfileMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware whose ``request.user`` comes with its profile.
+
+    The user is loaded on first use by ``accounts.profiles.load_user``, so
+    ``request.user.customer_profile``/``farmer_profile`` need no further
+    queries for the rest of the request.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
@@ -0,0 +1,124 @@
+# Generated by Django 4.2 on 2026-10-16 21:01
+
+import csv
+import os
+import re
+
+from django.db import migrations, models
+
+# Frozen copies of the geocoder and geohash encoder in accounts.geo as of
+# this migration.  The gazetteer is read from the bundled CSV; if it has
+# moved, farms are left for the geocode_farms command.
+PLACES_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'places.csv')
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+_WORD_RE = re.compile(r"[^\w\s,]+", re.UNICODE)
+
+
+def _normalize(text):
+    text = _WORD_RE.sub(' ', (text or '').lower())
+    return ' '.join(text.split())
+
+
+def load_gazetteer():
+    places = {}
+    with open(PLACES_FILE, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            point = (float(row['latitude']), float(row['longitude']))
+            name = _normalize(row['name'])
+            places.setdefault(name, point)
+            for qualifier in (row['region'], row['country']):
+                if qualifier:
+                    places.setdefault(f'{name} {_normalize(qualifier)}', point)
+    return places
+
+
+def geocode(places, text):
+    normalized = _normalize(text)
+    if not normalized:
+        return None
+    parts = [part.strip() for part in normalized.split(',') if part.strip()]
+    qualified = ' '.join(parts)
+    if qualified in places:
+        return places[qualified]
+    for part in parts:
+        words = part.split()
+        for size in range(len(words), 0, -1):
+            for start in range(len(words) - size + 1):
+                point = places.get(' '.join(words[start:start + size]))
+                if point is not None:
+                    return point
+    return None
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def geocode_farms(apps, schema_editor):
+    FarmerProfile = apps.get_model('accounts', 'FarmerProfile')
+    try:
+        places = load_gazetteer()
+    except OSError:
+        return
+    for profile in FarmerProfile.objects.only('id', 'farm_location').iterator():
+        point = geocode(places, profile.farm_location)
+        if point:
+            FarmerProfile.objects.filter(pk=profile.pk).update(
+                latitude=point[0],
+                longitude=point[1],
+                geohash=encode_geohash(*point),
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_remove_farmerprofile_proof_of_farming_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farmerprofile',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='farmerprofile',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='farmerprofile',
+            name='location_is_manual',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='farmerprofile',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(geocode_farms, migrations.RunPython.noop),
+    ]
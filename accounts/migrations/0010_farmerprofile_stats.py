@@ -0,0 +1,65 @@
+# Generated by Django 4.2 on 2026-10-16 21:20
+
+from django.db import migrations, models
+
+
+def backfill_farmer_stats(apps, schema_editor):
+    FarmerProfile = apps.get_model('accounts', 'FarmerProfile')
+    FarmerRating = apps.get_model('accounts', 'FarmerRating')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    followers = FarmerProfile.followers.through.objects.values('farmerprofile_id').annotate(
+        total=models.Count('*')
+    ).order_by()
+    for row in followers:
+        FarmerProfile.objects.filter(pk=row['farmerprofile_id']).update(follower_count=row['total'])
+    ratings = FarmerRating.objects.values('farmer_id').annotate(
+        total=models.Sum('rating'), count=models.Count('id')
+    ).order_by()
+    for row in ratings:
+        FarmerProfile.objects.filter(pk=row['farmer_id']).update(
+            rating_sum=row['total'],
+            rating_count=row['count'],
+            rating_avg=row['total'] / row['count'],
+        )
+    sales = OrderItem.objects.filter(
+        order__status__in=('confirmed', 'shipped', 'delivered')
+    ).values('farmer_id').annotate(total=models.Sum('quantity')).order_by()
+    for row in sales:
+        FarmerProfile.objects.filter(pk=row['farmer_id']).update(sales_quantity=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_user_profile_picture_variants'),
+        ('orders', '0002_order_payment_intent_id_order_payment_method_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farmerprofile',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='farmerprofile',
+            name='rating_avg',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='farmerprofile',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='farmerprofile',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='farmerprofile',
+            name='sales_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_farmer_stats, migrations.RunPython.noop),
+    ]
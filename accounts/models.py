@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
+from . import geo
 
 class User(AbstractUser):
     USER_TYPE_CHOICES = (
@@ -14,12 +15,21 @@ class User(AbstractUser):
     age = models.PositiveIntegerField(null=True, blank=True)
     location = models.CharField(max_length=255, blank=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', null=True, blank=True)
+    # Resized copies of profile_picture, written by products.images
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.username} ({self.user_type})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored username; farmers' products show it
+        instance._loaded_username = dict(zip(field_names, values)).get('username')
+        return instance
+
 class CustomerProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='customer_profile')
     dietary_preferences = models.CharField(max_length=200, blank=True)
@@ -38,28 +48,57 @@ class FarmerProfile(models.Model):
     is_verified = models.BooleanField(default=False)
     verification_date = models.DateTimeField(null=True, blank=True)
     verification_documents = models.FileField(upload_to='verification/', blank=True, null=True)
+    # Geocoded from farm_location unless the farmer set coordinates by hand
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    location_is_manual = models.BooleanField(default=False)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
+    
+    # Maintained by accounts.stats as farmers are followed, rated and sell
+    follower_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(default=0, editable=False)
+    sales_quantity = models.PositiveIntegerField(default=0, editable=False)
+    
+    STAT_FIELDS = ('follower_count', 'rating_sum', 'rating_count', 'rating_avg', 'sales_quantity')
     
     def __str__(self):
         return f"{self.user.username} - Farmer"
     
+    def update_coordinates(self):
+        """Refresh latitude/longitude from farm_location and the geohash from both."""
+        if not self.location_is_manual:
+            point = geo.geocode(self.farm_location)
+            self.latitude, self.longitude = point if point else (None, None)
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geo.encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+    
+    def save(self, *args, **kwargs):
+        self.update_coordinates()
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # A profile loaded earlier (or from the user cache) must not write
+            # back stale statistics
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in self.get_deferred_fields()
+                and field.name not in self.STAT_FIELDS
+            ]
+        super().save(*args, **kwargs)
+    
     @property
     def total_followers(self):
-        return self.followers.count()
+        return self.follower_count
     
     @property
     def total_sales(self):
-        from orders.models import OrderItem
-        result = OrderItem.objects.filter(product__farmer=self).aggregate(
-            total=models.Sum('quantity')
-        )['total']
-        return result or 0
+        return self.sales_quantity
     
     @property
     def average_rating(self):
-        ratings = self.ratings.all()
-        if ratings:
-            return sum(rating.rating for rating in ratings) / len(ratings)
-        return 0
+        return self.rating_avg
 
 class FarmerRating(models.Model):
     farmer = models.ForeignKey(FarmerProfile, on_delete=models.CASCADE, related_name='ratings')
@@ -73,3 +112,10 @@ class FarmerRating(models.Model):
     
     def __str__(self):
         return f"{self.customer.user.username} rated {self.farmer.user.username}: {self.rating} stars"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored rating so an edit can be applied as a delta
+        instance._loaded_rating = dict(zip(field_names, values)).get('rating')
+        return instance
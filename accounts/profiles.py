@@ -0,0 +1,65 @@
+"""
+Loading the request user together with their profile.
+
+``load_user`` fetches a user with ``customer_profile`` and ``farmer_profile``
+joined in (a missing profile is remembered as missing), so the auth lookup
+and every later profile access in the request cost one query between them.
+``UserProfileMiddleware`` uses it for ``request.user``.
+
+With ``ACCOUNTS_USER_CACHE_TIMEOUT`` set and a cache shared by all workers
+(``SHARED_CACHE``), loaded users are also kept in the cache for that many
+seconds; entries in a per-process cache could not be dropped by the other
+workers.  Saving or deleting the user or either profile drops the entry;
+counters changed with ``update()`` (see ``accounts.stats``) may show up to
+the timeout late.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import CustomerProfile, FarmerProfile, User
+
+USER_KEY = 'accounts:user:%s'
+
+
+def cache_timeout():
+    if not getattr(settings, 'SHARED_CACHE', False):
+        return 0
+    return getattr(settings, 'ACCOUNTS_USER_CACHE_TIMEOUT', 0)
+
+
+def load_user(user_id):
+    timeout = cache_timeout()
+    if timeout:
+        user = cache.get(USER_KEY % user_id)
+        if user is not None:
+            return user
+    user = User.objects.select_related('customer_profile', 'farmer_profile').filter(pk=user_id).first()
+    if user is not None and timeout:
+        cache.set(USER_KEY % user_id, user, timeout)
+    return user
+
+
+def invalidate(user_id):
+    if cache_timeout():
+        transaction.on_commit(lambda: cache.delete(USER_KEY % user_id))
+
+
+def get_customer_profile(user):
+    """``user``'s customer profile, created if it is missing."""
+    try:
+        return user.customer_profile
+    except CustomerProfile.DoesNotExist:
+        profile, created = CustomerProfile.objects.get_or_create(user=user)
+        user.customer_profile = profile
+        return profile
+
+
+def get_farmer_profile(user):
+    """``user``'s farmer profile, created if it is missing."""
+    try:
+        return user.farmer_profile
+    except FarmerProfile.DoesNotExist:
+        profile, created = FarmerProfile.objects.get_or_create(user=user, defaults={'farm_location': ''})
+        user.farmer_profile = profile
+        return profile
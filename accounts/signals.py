@@ -0,0 +1,56 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import profiles, stats
+from .models import CustomerProfile, FarmerProfile, FarmerRating, User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    profiles.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=CustomerProfile)
+@receiver(post_delete, sender=CustomerProfile)
+@receiver(post_save, sender=FarmerProfile)
+@receiver(post_delete, sender=FarmerProfile)
+def forget_cached_profile_user(sender, instance, **kwargs):
+    profiles.invalidate(instance.user_id)
+
+
+@receiver(m2m_changed, sender=FarmerProfile.followers.through)
+def count_followers(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # Which farmers lose this follower is unknown after the clear
+        instance._cleared_farmer_ids = list(instance.following.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        farmer_ids = [instance.pk]
+    elif action == 'post_clear':
+        farmer_ids = getattr(instance, '_cleared_farmer_ids', [])
+    else:
+        farmer_ids = pk_set
+    stats.refresh_follower_counts(farmer_ids)
+
+
+@receiver(post_save, sender=FarmerRating)
+def apply_farmer_rating(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        stats.apply_rating_delta(instance.farmer_id, instance.rating, 1)
+    elif hasattr(instance, '_loaded_rating'):
+        if instance.rating != instance._loaded_rating:
+            stats.apply_rating_delta(instance.farmer_id, instance.rating - instance._loaded_rating, 0)
+    else:
+        # Saved without being loaded first, so the old rating is unknown
+        stats.recompute_ratings(instance.farmer_id)
+    instance._loaded_rating = instance.rating
+
+
+@receiver(post_delete, sender=FarmerRating)
+def remove_farmer_rating(sender, instance, **kwargs):
+    stats.apply_rating_delta(instance.farmer_id, -instance.rating, -1)
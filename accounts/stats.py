@@ -0,0 +1,134 @@
+"""
+Stored follower, rating and sales statistics on FarmerProfile.
+
+``follower_count``, ``rating_sum``/``rating_count``/``rating_avg`` and
+``sales_quantity`` are adjusted with single UPDATEs inside the transaction
+that follows a farmer, rates one (see ``accounts.signals``) or confirms an
+order (see ``products.signals``), so profile pages and dashboards read plain columns.
+``rebuild_all`` recomputes everything from the source rows and reports any
+drift.
+"""
+from django.db import transaction
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from products.recommendations import PURCHASED_STATUSES
+from .models import FarmerProfile, FarmerRating
+
+REBUILD_CHUNK_SIZE = 500
+
+STAT_FIELDS = FarmerProfile.STAT_FIELDS
+
+
+def refresh_follower_counts(farmer_ids):
+    """Recount the followers of ``farmer_ids`` in one UPDATE."""
+    followers = FarmerProfile.followers.through.objects.filter(
+        farmerprofile_id=OuterRef('pk')
+    ).order_by().values('farmerprofile_id').annotate(total=Count('*')).values('total')
+    FarmerProfile.objects.filter(pk__in=farmer_ids).update(
+        follower_count=Coalesce(Subquery(followers), Value(0))
+    )
+
+
+def apply_rating_delta(farmer_id, rating_delta, count_delta):
+    """Shift a farmer's rating aggregates by the given amounts."""
+    new_sum = F('rating_sum') + rating_delta
+    new_count = F('rating_count') + count_delta
+    FarmerProfile.objects.filter(pk=farmer_id).update(
+        rating_sum=new_sum,
+        rating_count=new_count,
+        rating_avg=Coalesce(
+            Cast(new_sum, FloatField()) / NullIf(new_count, 0),
+            0.0,
+            output_field=FloatField(),
+        ),
+    )
+
+
+def recompute_ratings(farmer_id):
+    stats = FarmerRating.objects.filter(farmer_id=farmer_id).aggregate(
+        total=Sum('rating'), count=Count('id')
+    )
+    total = stats['total'] or 0
+    count = stats['count']
+    FarmerProfile.objects.filter(pk=farmer_id).update(
+        rating_sum=total,
+        rating_count=count,
+        rating_avg=total / count if count else 0,
+    )
+
+
+def apply_order_sales(order, sign):
+    """Add (``sign=1``) or take back (``sign=-1``) the quantities in ``order``."""
+    from orders.models import OrderItem
+
+    totals = OrderItem.objects.filter(order=order).values('farmer_id').annotate(
+        total=Sum('quantity')
+    ).order_by()
+    for row in totals:
+        FarmerProfile.objects.filter(pk=row['farmer_id']).update(
+            sales_quantity=F('sales_quantity') + sign * row['total']
+        )
+
+
+def _expected_stats():
+    from orders.models import OrderItem
+
+    followers = dict(
+        FarmerProfile.followers.through.objects.values('farmerprofile_id').annotate(
+            total=Count('*')
+        ).values_list('farmerprofile_id', 'total').order_by()
+    )
+    ratings = {
+        row['farmer_id']: (row['total'], row['count'])
+        for row in FarmerRating.objects.values('farmer_id').annotate(
+            total=Sum('rating'), count=Count('id')
+        ).order_by()
+    }
+    sales = dict(
+        OrderItem.objects.filter(order__status__in=PURCHASED_STATUSES).values('farmer_id').annotate(
+            total=Sum('quantity')
+        ).values_list('farmer_id', 'total').order_by()
+    )
+    return followers, ratings, sales
+
+
+def rebuild_all(dry_run=False):
+    """Recompute every farmer's statistics from the source rows.
+
+    Returns ``(checked, drift)`` where ``drift`` lists ``(farmer, field,
+    stored, actual)`` for each value that was wrong.  Nothing is written
+    when ``dry_run`` is set.
+    """
+    followers, ratings, sales = _expected_stats()
+
+    checked = 0
+    drift = []
+    stale = []
+    farmers = FarmerProfile.objects.select_related('user').only('user__username', *STAT_FIELDS)
+    for farmer in farmers.iterator(chunk_size=REBUILD_CHUNK_SIZE):
+        checked += 1
+        total, count = ratings.get(farmer.pk, (0, 0))
+        actual = {
+            'follower_count': followers.get(farmer.pk, 0),
+            'rating_sum': total,
+            'rating_count': count,
+            'rating_avg': total / count if count else 0,
+            'sales_quantity': sales.get(farmer.pk, 0),
+        }
+        changed = False
+        for field, value in actual.items():
+            stored = getattr(farmer, field)
+            if field == 'rating_avg' and abs(stored - value) < 1e-9:
+                continue
+            if stored != value:
+                drift.append((farmer, field, stored, value))
+                setattr(farmer, field, value)
+                changed = True
+        if changed:
+            stale.append(farmer)
+
+    if not dry_run:
+        with transaction.atomic():
+            FarmerProfile.objects.bulk_update(stale, STAT_FIELDS, batch_size=REBUILD_CHUNK_SIZE)
+    return checked, drift
@@ -1,3 +1,104 @@
+from decimal import Decimal
+
 from django.test import TestCase
 
-# Create your tests here.
+from orders.models import Order, OrderItem
+from products.models import Category, Product
+from . import stats
+from .models import CustomerProfile, FarmerProfile, FarmerRating, User
+
+
+def make_customer(username):
+    user = User.objects.create_user(username=username, password='x', user_type='customer')
+    return CustomerProfile.objects.create(user=user)
+
+
+def make_farmer(username):
+    user = User.objects.create_user(username=username, password='x', user_type='farmer')
+    return FarmerProfile.objects.create(user=user, farm_location='Ejisu')
+
+
+class FarmerStatsTests(TestCase):
+    def setUp(self):
+        self.farmer = make_farmer('farmer')
+        self.alice = make_customer('alice')
+        self.bob = make_customer('bob')
+
+    def stored(self, field):
+        return FarmerProfile.objects.values_list(field, flat=True).get(pk=self.farmer.pk)
+
+    def assert_no_drift(self):
+        checked, drift = stats.rebuild_all(dry_run=True)
+        self.assertEqual(drift, [])
+
+    def test_follow_unfollow(self):
+        self.farmer.followers.add(self.alice, self.bob)
+        self.assertEqual(self.stored('follower_count'), 2)
+        self.farmer.followers.remove(self.alice)
+        self.assertEqual(self.stored('follower_count'), 1)
+        self.assert_no_drift()
+
+    def test_clear_from_either_side(self):
+        self.farmer.followers.add(self.alice, self.bob)
+        self.bob.following.clear()
+        self.assertEqual(self.stored('follower_count'), 1)
+        self.farmer.followers.clear()
+        self.assertEqual(self.stored('follower_count'), 0)
+        self.assert_no_drift()
+
+    def test_rating_edit_and_delete(self):
+        FarmerRating.objects.create(farmer=self.farmer, customer=self.alice, rating=4)
+        rating = FarmerRating.objects.create(farmer=self.farmer, customer=self.bob, rating=2)
+        self.assertEqual(self.stored('rating_avg'), 3)
+
+        rating = FarmerRating.objects.get(pk=rating.pk)
+        rating.rating = 5
+        rating.save()
+        self.assertEqual(self.stored('rating_sum'), 9)
+        self.assertEqual(self.stored('rating_count'), 2)
+
+        rating.delete()
+        self.assertEqual(self.stored('rating_sum'), 4)
+        self.assertEqual(self.stored('rating_count'), 1)
+        self.assertEqual(self.stored('rating_avg'), 4)
+        self.assert_no_drift()
+
+    def test_confirm_then_cancel_sales(self):
+        category = Category.objects.create(name='Vegetables')
+        product = Product.objects.create(
+            farmer=self.farmer, category=category, name='Kale', description='Kale',
+            price=Decimal('2.50'), stock=10,
+        )
+        order = Order.objects.create(
+            customer=self.alice, order_number='ORD-TEST-1',
+            delivery_address='Here', total_amount=Decimal('7.50'),
+        )
+        OrderItem.objects.create(order=order, product=product, farmer=self.farmer, quantity=3, price=product.price)
+        self.assertEqual(self.stored('sales_quantity'), 0)
+
+        order.status = 'confirmed'
+        order.save()
+        self.assertEqual(self.stored('sales_quantity'), 3)
+
+        order.status = 'shipped'
+        order.save()
+        self.assertEqual(self.stored('sales_quantity'), 3)
+
+        order = Order.objects.get(pk=order.pk)
+        order.status = 'cancelled'
+        order.save()
+        self.assertEqual(self.stored('sales_quantity'), 0)
+        self.assert_no_drift()
+
+    def test_stale_profile_save_keeps_stats(self):
+        stale = FarmerProfile.objects.get(pk=self.farmer.pk)
+        self.farmer.followers.add(self.alice)
+        FarmerRating.objects.create(farmer=self.farmer, customer=self.alice, rating=5)
+
+        stale.farm_name = 'Green Acres'
+        stale.save()
+
+        self.assertEqual(self.stored('farm_name'), 'Green Acres')
+        self.assertEqual(self.stored('follower_count'), 1)
+        self.assertEqual(self.stored('rating_count'), 1)
+        self.assert_no_drift()
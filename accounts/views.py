@@ -7,7 +7,8 @@ from django.urls import reverse_lazy
 from django.http import JsonResponse
 from django.contrib.auth.views import LoginView
 from .forms import CustomerRegistrationForm, FarmerRegistrationForm, CustomLoginForm
-from .models import User, CustomerProfile, FarmerProfile, FarmerRating
+from .models import User, FarmerProfile, FarmerRating
+from .profiles import get_customer_profile, get_farmer_profile
 
 def home(request):
     return render(request, 'accounts/home.html')
@@ -57,18 +58,10 @@ def register_choice(request):
 @login_required
 def profile(request):
     if request.user.user_type == 'customer':
-        try:
-            profile = request.user.customer_profile
-        except CustomerProfile.DoesNotExist:
-            CustomerProfile.objects.create(user=request.user)
-            profile = request.user.customer_profile
+        profile = get_customer_profile(request.user)
         return render(request, 'accounts/customer_profile.html', {'profile': profile})
     else:
-        try:
-            profile = request.user.farmer_profile
-        except FarmerProfile.DoesNotExist:
-            FarmerProfile.objects.create(user=request.user, farm_location='')
-            profile = request.user.farmer_profile
+        profile = get_farmer_profile(request.user)
         return render(request, 'accounts/farmer_profile.html', {'profile': profile})
 
 @login_required
@@ -78,7 +71,7 @@ def rate_farmer(request, farmer_id):
         return redirect('accounts:home')
     
     farmer = get_object_or_404(FarmerProfile, id=farmer_id)
-    customer = request.user.customer_profile
+    customer = get_customer_profile(request.user)
     
     if request.method == 'POST':
         rating_value = int(request.POST.get('rating'))
@@ -93,8 +86,6 @@ def rate_farmer(request, farmer_id):
             }
         )
         
-        # No need to update average_rating as it's calculated dynamically
-        
         action = 'updated' if not created else 'added'
         messages.success(request, f'Rating {action} successfully!')
         return redirect('products:farmer_products', farmer_id=farmer.id)
@@ -118,13 +109,9 @@ def follow_farmer(request, farmer_id):
     try:
         farmer = get_object_or_404(FarmerProfile, id=farmer_id)
         
-        # Ensure customer profile exists
-        try:
-            customer = request.user.customer_profile
-        except CustomerProfile.DoesNotExist:
-            CustomerProfile.objects.create(user=request.user)
-            customer = request.user.customer_profile
+        customer = get_customer_profile(request.user)
         
+        # follower_count is recounted by the m2m_changed handler
         if farmer.followers.filter(id=customer.id).exists():
             farmer.followers.remove(customer)
             following = False
@@ -147,6 +134,7 @@ def follow_farmer(request, farmer_id):
                 # Log the error but don't fail the follow action
                 print(f"Failed to create notification: {e}")
         
+        farmer.refresh_from_db(fields=['follower_count'])
         return JsonResponse({
             'success': True,
             'following': following,
@@ -163,10 +151,7 @@ def follow_farmer(request, farmer_id):
 @login_required
 def edit_profile(request):
     if request.user.user_type == 'customer':
-        try:
-            profile = request.user.customer_profile
-        except CustomerProfile.DoesNotExist:
-            profile = CustomerProfile.objects.create(user=request.user)
+        profile = get_customer_profile(request.user)
         
         if request.method == 'POST':
             # Update user fields
@@ -195,10 +180,7 @@ def edit_profile(request):
         })
     
     else:  # farmer
-        try:
-            profile = request.user.farmer_profile
-        except FarmerProfile.DoesNotExist:
-            profile = FarmerProfile.objects.create(user=request.user, farm_location='')
+        profile = get_farmer_profile(request.user)
         
         if request.method == 'POST':
             # Update user fields
@@ -222,6 +204,20 @@ def edit_profile(request):
             profile.years_of_experience = request.POST.get('years_of_experience') or 0
             profile.farming_methods = request.POST.get('farming_methods', '')
             
+            # Coordinates entered by hand override geocoding of farm_location
+            try:
+                latitude = float(request.POST.get('latitude', ''))
+                longitude = float(request.POST.get('longitude', ''))
+            except ValueError:
+                profile.location_is_manual = False
+            else:
+                if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+                    profile.latitude, profile.longitude = latitude, longitude
+                    profile.location_is_manual = True
+                else:
+                    messages.warning(request, 'Coordinates were out of range and have been ignored.')
+                    profile.location_is_manual = False
+            
             # Handle verification documents
             if 'verification_documents' in request.FILES:
                 profile.verification_documents = request.FILES['verification_documents']
@@ -0,0 +1,13 @@
+"""
+Write-coalescing sessions stored in the database only.
+
+Used instead of ``farmmarket.sessions`` when there is no cache shared by
+all workers; see that module for when sessions are written.
+"""
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+from .sessions import CoalescingStore
+
+
+class SessionStore(CoalescingStore, DBStore):
+    pass
@@ -0,0 +1,126 @@
+"""
+Write-coalescing sessions.
+
+``SESSION_SAVE_EVERY_REQUEST`` keeps sessions alive by rewriting every
+session on every request.  Instead, ``SESSION_ENGINE = 'farmmarket.sessions'``
+with ``CoalescingSessionMiddleware`` in place of Django's SessionMiddleware
+only writes a session when
+
+- its data actually changed (setting a key to the value it already had
+  does not count), or its key changed (login, logout), or
+- less than ``SESSION_REFRESH_THRESHOLD`` seconds of its lifetime are left,
+  in which case the expiry is pushed back a full ``SESSION_COOKIE_AGE``.
+
+The session cookie is only re-sent alongside a write, so it expires with
+the stored session.  Storage is ``cached_db`` (reads from the shared cache,
+writes to both) when ``REDIS_URL`` is set; without a shared cache, settings
+select ``farmmarket.db_sessions``, the same store over the database only.
+
+Counts of saves made and skipped are kept per process and added to shared
+counters (``products.counters``, so in the database when the cache is per
+process) every ``STATS_FLUSH_EVERY`` requests; see ``session_stats``.
+"""
+import copy
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.middleware import SessionMiddleware
+
+from products import counters
+
+# Session key holding the time of the last write, in epoch seconds
+REFRESHED_KEY = '_refreshed_at'
+
+STATS_KEY = 'sessions:writes:%s'
+STATS_FLUSH_EVERY = 100
+
+# saved: data or key changed; refreshed: expiry renewed;
+# unchanged: marked modified but identical; skipped: read-only request
+STATS = ('saved', 'refreshed', 'unchanged', 'skipped')
+
+_pending = Counter()
+_pending_lock = threading.Lock()
+
+
+def count(outcome):
+    with _pending_lock:
+        _pending[outcome] += 1
+        if sum(_pending.values()) < STATS_FLUSH_EVERY:
+            return
+        flushed = dict(_pending)
+        _pending.clear()
+    for name, amount in flushed.items():
+        counters.incr(STATS_KEY % name, amount)
+
+
+def session_stats():
+    """Shared counters (without the last unflushed requests of each process)."""
+    values = counters.get_many([STATS_KEY % outcome for outcome in STATS])
+    return {outcome: values.get(STATS_KEY % outcome, 0) for outcome in STATS}
+
+
+def refresh_threshold():
+    threshold = getattr(settings, 'SESSION_REFRESH_THRESHOLD', settings.SESSION_COOKIE_AGE // 2)
+    # Negative would never renew; beyond the age would renew on every request
+    return min(max(threshold, 0), settings.SESSION_COOKIE_AGE)
+
+
+class CoalescingStore:
+    """Change tracking for a session store; mixed in before the backend."""
+
+    def load(self):
+        data = super().load()
+        # What was stored, to tell real changes from rewrites of the same data
+        self._loaded_key = self.session_key
+        self._loaded_data = copy.deepcopy(data)
+        return data
+
+    def has_changes(self):
+        if not self.modified:
+            return False
+        if not hasattr(self, '_loaded_data'):
+            # Never loaded: a new session, or one written blind
+            return True
+        return self.session_key != self._loaded_key or self._session != self._loaded_data
+
+    def needs_refresh(self):
+        if not self._session:
+            # Stale cookie; let the middleware drop it rather than store {}
+            return False
+        refreshed_at = self._session.get(REFRESHED_KEY, 0)
+        remaining = refreshed_at + settings.SESSION_COOKIE_AGE - time.time()
+        return remaining < refresh_threshold()
+
+
+class SessionStore(CoalescingStore, CachedDBStore):
+    pass
+
+
+class CoalescingSessionMiddleware(SessionMiddleware):
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        if isinstance(session, CoalescingStore) and not session.is_empty():
+            self._coalesce(session)
+        return super().process_response(request, response)
+
+    def _coalesce(self, session):
+        # Looking at the data must not add "Vary: Cookie" to responses that
+        # never used the session
+        accessed = session.accessed
+        if session.has_changes():
+            outcome = 'saved'
+        elif session.needs_refresh():
+            outcome = 'refreshed'
+        elif session.modified:
+            outcome = 'unchanged'
+        else:
+            outcome = 'skipped'
+        if outcome in ('saved', 'refreshed'):
+            session[REFRESHED_KEY] = int(time.time())
+        else:
+            session.modified = False
+        session.accessed = accessed
+        count(outcome)
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'channels',
     'crispy_forms', 
     'crispy_bootstrap5',
@@ -58,10 +59,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'farmmarket.sessions.CoalescingSessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.UserProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,6 +80,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'products.context_processors.categories',
             ],
         },
     },
@@ -209,9 +211,57 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache: point REDIS_URL at a Redis shared by all workers in production.
+# Without one the cache is per process, so version counters that every
+# worker must see are kept in the database instead (see products.counters)
+REDIS_URL = config('REDIS_URL', default='')
+SHARED_CACHE = bool(REDIS_URL)
+if SHARED_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Product popularity: order volume loses half its weight every N days
+POPULARITY_HALF_LIFE_DAYS = config('POPULARITY_HALF_LIFE_DAYS', default=7, cast=float)
+
+# Background threads resizing uploaded images (see products.images)
+IMAGE_VARIANT_WORKERS = config('IMAGE_VARIANT_WORKERS', default=2, cast=int)
+
+# Background threads sending "new product" notifications (see messaging.fanout)
+NOTIFICATION_FANOUT_WORKERS = config('NOTIFICATION_FANOUT_WORKERS', default=1, cast=int)
+
+# Background threads adding confirmed orders to recommendations (see products.recommendations)
+RECOMMENDATION_WORKERS = config('RECOMMENDATION_WORKERS', default=1, cast=int)
+
+# Seconds to keep request users and their profiles in the shared cache
+# (0 = load once per request only; ignored without REDIS_URL; see accounts.profiles)
+ACCOUNTS_USER_CACHE_TIMEOUT = config('ACCOUNTS_USER_CACHE_TIMEOUT', default=0, cast=int)
+
+# Minutes that checkout holds stock for an unpaid order (see orders.inventory)
+STOCK_HOLD_MINUTES = config('STOCK_HOLD_MINUTES', default=15, cast=int)
+
 # Session Configuration
 SESSION_COOKIE_AGE = config('SESSION_COOKIE_AGE', default=1209600, cast=int)  # 2 weeks
-SESSION_SAVE_EVERY_REQUEST = config('SESSION_SAVE_EVERY_REQUEST', default=True, cast=bool)
+# Sessions are written when their data changes, or to renew them once less
+# than SESSION_REFRESH_THRESHOLD seconds are left (see farmmarket.sessions).
+# They are cached only in a cache every worker shares; a per-process cache
+# would keep serving sessions that were changed or logged out elsewhere.
+SESSION_ENGINE = 'farmmarket.sessions' if SHARED_CACHE else 'farmmarket.db_sessions'
+SESSION_REFRESH_THRESHOLD = config(
+    'SESSION_REFRESH_THRESHOLD',
+    default=max(SESSION_COOKIE_AGE - 60 * 60 * 24, SESSION_COOKIE_AGE // 2),
+    cast=int,
+)
+SESSION_SAVE_EVERY_REQUEST = False
 SESSION_EXPIRE_AT_BROWSER_CLOSE = config('SESSION_EXPIRE_AT_BROWSER_CLOSE', default=False, cast=bool)
 SESSION_COOKIE_SECURE = config('SESSION_COOKIE_SECURE', default=False, cast=bool)  # Set to True in production with HTTPS
 SESSION_COOKIE_HTTPONLY = True
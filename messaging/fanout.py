@@ -0,0 +1,128 @@
+"""
+Background fan-out of "new_product" notifications to a farmer's followers.
+
+A farmer can have tens of thousands of followers, so ProductCreateView only
+schedules the job: it runs after the product's transaction commits, on a
+small thread pool, and walks the follower table by primary key
+``FANOUT_CHUNK_SIZE`` rows at a time.  Each chunk becomes one
+``bulk_create`` of Notification rows followed by one round of
+``group_send`` calls to the followers' NotificationConsumer groups.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+from accounts.models import FarmerProfile
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+FANOUT_CHUNK_SIZE = 1000
+
+_executor = None
+
+
+def follower_user_chunks(farmer_id, chunk_size=FANOUT_CHUNK_SIZE):
+    """Yield lists of follower user ids, keyset-paged over the follow table."""
+    follows = FarmerProfile.followers.through.objects.filter(farmerprofile_id=farmer_id)
+    last_pk = 0
+    while True:
+        rows = list(
+            follows.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'customerprofile__user_id')[:chunk_size]
+        )
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        yield [user_id for pk, user_id in rows]
+
+
+def _payload(notification):
+    return {
+        'id': notification.pk,
+        'notification_type': notification.notification_type,
+        'title': notification.title,
+        'message': notification.message,
+        'created_at': notification.created_at.isoformat() if notification.created_at else None,
+    }
+
+
+async def _push(channel_layer, notifications):
+    await asyncio.gather(*(
+        channel_layer.group_send(f'notifications_{notification.user_id}', {
+            'type': 'notification_message',
+            'message': _payload(notification),
+        })
+        for notification in notifications
+    ))
+
+
+def push(notifications):
+    """Deliver ``notifications`` to connected clients; failures are only logged."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not notifications:
+        return
+    try:
+        async_to_sync(_push)(channel_layer, notifications)
+    except Exception:
+        logger.exception('Could not push %d notifications', len(notifications))
+
+
+def fan_out_new_product(product_id):
+    """Notify every follower of the product's farmer; returns how many were notified."""
+    from products.models import Product
+
+    product = Product.objects.select_related('farmer__user').filter(pk=product_id).first()
+    if product is None:
+        return 0
+    farmer = product.farmer
+    farm = farmer.farm_name or farmer.user.username
+    title = f'New from {farm}'
+    message = f'{farm} just added {product.name}.'
+
+    sent = 0
+    for user_ids in follower_user_chunks(farmer.pk):
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id,
+                notification_type='new_product',
+                title=title,
+                message=message,
+            )
+            for user_id in user_ids
+        ])
+        push(notifications)
+        sent += len(notifications)
+    return sent
+
+
+def _run(product_id):
+    close_old_connections()
+    try:
+        fan_out_new_product(product_id)
+    except Exception:
+        logger.exception('Could not notify followers about product %s', product_id)
+    finally:
+        # Worker threads are not request-scoped; don't leak their connections
+        connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'NOTIFICATION_FANOUT_WORKERS', 1),
+            thread_name_prefix='notification-fanout',
+        )
+    return _executor
+
+
+def schedule_new_product(product):
+    """Notify the farmer's followers about ``product`` in the background after commit."""
+    product_id = product.pk
+    transaction.on_commit(lambda: _get_executor().submit(_run, product_id))
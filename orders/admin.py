@@ -26,8 +26,8 @@ class CartItemAdmin(admin.ModelAdmin):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('order_number', 'customer', 'status', 'delivery_option', 'total_amount', 'created_at')
-    list_filter = ('status', 'delivery_option', 'created_at')
+    list_display = ('order_number', 'customer', 'status', 'payment_status', 'delivery_option', 'total_amount', 'created_at')
+    list_filter = ('status', 'payment_status', 'delivery_option', 'created_at')
     search_fields = ('order_number', 'customer__user__username')
     readonly_fields = ('order_number', 'created_at', 'updated_at')
     
@@ -0,0 +1,94 @@
+"""
+Cart totals and line items.
+
+The cart page, checkout and the navbar badge (polled every 30 seconds by
+``static/js/main.js``) all need a cart's item count and total.
+``cart_summary`` computes both with one aggregate query over the cart's
+items joined to their products, and keeps the result in the shared cache
+per customer, so a poll costs one cache read.
+
+Each customer's entry is keyed on a per-customer version counter (see
+``products.counters``), as in ``products.cache``: a CartItem change, or a price change on a product in
+the cart, bumps the counter after commit (``orders.signals``).  A reader
+that computed a summary from rows read before the change can only store it
+under the old version, which nobody looks up again, so a stale summary is
+never served.  ``cart_items`` loads the lines for display with their
+products and farmers joined in.
+"""
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from products import counters
+from .models import CartItem
+
+VERSION_KEY = 'orders:cart:%s:version'
+SUMMARY_KEY = 'orders:cart:%s:%s'
+SUMMARY_TIMEOUT = 60 * 30
+
+EMPTY_SUMMARY = {'count': 0, 'lines': 0, 'total': Decimal('0.00')}
+
+
+def compute_summary(customer_id):
+    money = DecimalField(max_digits=12, decimal_places=2)
+    return CartItem.objects.filter(cart__customer_id=customer_id).aggregate(
+        count=Coalesce(Sum('quantity'), 0),
+        lines=Count('id'),
+        total=Coalesce(
+            Sum(F('quantity') * F('product__price'), output_field=money),
+            Value(Decimal('0.00')),
+            output_field=money,
+        ),
+    )
+
+
+def _initial_version():
+    # Millisecond clock rather than 1, so a counter lost to eviction
+    # restarts above any version that might still be cached
+    return time.time_ns() // 1_000_000
+
+
+def cart_version(customer_id):
+    return counters.get_or_add(VERSION_KEY % customer_id, _initial_version())
+
+
+def cart_summary(customer_id):
+    """``{'count': units, 'lines': items, 'total': Decimal}`` for a customer's cart."""
+    if customer_id is None:
+        return dict(EMPTY_SUMMARY)
+    key = SUMMARY_KEY % (customer_id, cart_version(customer_id))
+    summary = cache.get(key)
+    if summary is None:
+        summary = compute_summary(customer_id)
+        cache.add(key, summary, SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate(customer_ids):
+    """Retire the cached summaries of ``customer_ids`` once the current transaction commits."""
+    customer_ids = list(customer_ids)
+
+    def bump():
+        # A counter evicted midway is not bumped; the next reader starts a new version
+        for customer_id in customer_ids:
+            counters.incr(VERSION_KEY % customer_id, initial=_initial_version())
+
+    if customer_ids:
+        transaction.on_commit(bump)
+
+
+def invalidate_products(product_ids):
+    """Retire the summaries of every cart holding one of ``product_ids``."""
+    invalidate(
+        CartItem.objects.filter(product_id__in=product_ids)
+        .values_list('cart__customer_id', flat=True).distinct().order_by()
+    )
+
+
+def cart_items(cart):
+    """The cart's items with product, farmer and farmer's user loaded."""
+    return list(cart.items.select_related('product__farmer__user').order_by('pk'))
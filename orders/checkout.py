@@ -0,0 +1,80 @@
+"""
+Turning a customer's cart into an order.
+
+``build_order`` loads the cart's items with their products in one query,
+totals them in Decimal, and inserts the Order and all of its OrderItems
+(one ``bulk_create``) in a single transaction, together with the order's
+stock holds (see ``orders.inventory``).  If anything fails nothing is
+written.
+
+Every checkout form carries a random ``checkout_token`` that is stored on
+the order it creates.  The cart row stays locked until the transaction
+commits, so a double-submitted form waits for the first request and then
+gets that request's order back instead of creating a second one.
+"""
+import uuid
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .inventory import place_holds
+from .models import Cart, Order, OrderItem
+
+CENT = Decimal('0.01')
+
+
+class EmptyCart(Exception):
+    pass
+
+
+def new_checkout_token():
+    return uuid.uuid4().hex
+
+
+def generate_order_number():
+    return f"ORD-{timezone.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+
+
+def build_order(customer, delivery_option, delivery_address, checkout_token=None):
+    """Create a pending order from ``customer``'s cart; returns ``(order, created)``.
+
+    Raises ``EmptyCart`` if there is nothing to order and
+    ``InsufficientStock`` if the stock cannot be held.
+    """
+    with transaction.atomic():
+        cart = Cart.objects.select_for_update().filter(customer=customer).first()
+        if checkout_token:
+            existing = Order.objects.filter(customer=customer, checkout_token=checkout_token).first()
+            if existing is not None:
+                return existing, False
+
+        items = list(cart.items.select_related('product').order_by('pk')) if cart else []
+        if not items:
+            raise EmptyCart()
+
+        total = sum((item.product.price * item.quantity for item in items), Decimal('0'))
+        order = Order.objects.create(
+            customer=customer,
+            order_number=generate_order_number(),
+            checkout_token=checkout_token or None,
+            delivery_option=delivery_option,
+            delivery_address=delivery_address,
+            total_amount=total.quantize(CENT),
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=item.product,
+                farmer_id=item.product.farmer_id,
+                quantity=item.quantity,
+                price=item.product.price,
+            )
+            for item in items
+        ])
+
+        # Hold the stock until payment (or STOCK_HOLD_MINUTES).  Checking out
+        # again abandons earlier unpaid orders, so their holds are handed back
+        abandoned = Order.objects.filter(customer=customer, status='pending').exclude(pk=order.pk)
+        place_holds(order, {item.product_id: item.quantity for item in items}, replacing=abandoned)
+    return order, True
@@ -15,6 +15,8 @@ class CheckoutForm(forms.Form):
         widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         help_text="Enter pickup location or delivery address"
     )
+    # Identifies this form, so submitting it twice places one order
+    checkout_token = forms.CharField(max_length=32, required=False, widget=forms.HiddenInput)
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -0,0 +1,259 @@
+"""
+Stock holds at checkout and committing an order's stock on payment.
+
+Checkout places a ``StockHold`` per product with an expiry
+(``STOCK_HOLD_MINUTES``) and adds it to ``Product.reserved_stock`` with a
+conditional ``UPDATE ... SET reserved_stock = reserved_stock + n WHERE
+stock >= reserved_stock + n``.  Because the check and the increment are one
+statement on the product row, concurrent checkouts of the last few units
+queue on that row and exactly as many succeed as there are units.  Cart and
+listing checks use ``Product.available_stock`` (stock minus holds).
+
+``commit_order`` turns an order's holds into a sale when payment completes:
+one conditional UPDATE per product takes the stock and drops the hold in
+the same statement, the order is confirmed and the cart emptied, all in one
+transaction.  Lines whose hold already expired are taken from unheld stock
+under the same condition, so nothing is ever oversold.  If any product is
+short the whole transaction rolls back and ``InsufficientStock`` says which.
+
+``release_expired_holds`` (the ``release_stock_holds`` command, meant to run
+every minute or so) returns expired holds in small batches.  A checkout that
+finds a product short first releases that product's expired holds itself,
+so an overdue sweep never blocks a sale.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from products.cache import bump_catalog_generation
+from products.models import Product
+from products.signals import catalog_bulk_changed
+from .models import CartItem, Order, OrderItem, StockHold
+
+logger = logging.getLogger(__name__)
+
+SWEEP_CHUNK_SIZE = 500
+
+
+class InsufficientStock(Exception):
+    def __init__(self, shortages):
+        # [(product name, requested, available)]
+        self.shortages = shortages
+        super().__init__(', '.join(
+            f'{name}: {available} left, {requested} ordered'
+            for name, requested, available in shortages
+        ))
+
+
+def hold_duration():
+    return timedelta(minutes=getattr(settings, 'STOCK_HOLD_MINUTES', 15))
+
+
+# Holds
+
+def _reserve(product_id, quantity):
+    """Change ``product_id``'s reserved units by ``quantity`` (negative releases)."""
+    products = Product.objects.filter(pk=product_id)
+    if quantity > 0:
+        products = products.filter(stock__gte=F('reserved_stock') + quantity)
+    return products.update(
+        reserved_stock=F('reserved_stock') + quantity,
+        # Cards show whether the product is in stock, and the catalog API's
+        # delta sync picks up available stock by updated_at
+        card_version=F('card_version') + 1,
+        updated_at=timezone.now(),
+    )
+
+
+def _release(holds):
+    """Return ``[(hold id, product id, quantity)]`` to stock and delete the holds."""
+    released = defaultdict(int)
+    for pk, product_id, quantity in holds:
+        released[product_id] += quantity
+    for product_id in sorted(released):
+        _reserve(product_id, -released[product_id])
+    StockHold.objects.filter(pk__in=[pk for pk, product_id, quantity in holds]).delete()
+    # Listings and facets filter on available stock
+    bump_catalog_generation()
+
+
+def release_expired_holds(product_ids=None, chunk_size=SWEEP_CHUNK_SIZE):
+    """Release expired holds, ``chunk_size`` per transaction; returns how many."""
+    released = 0
+    while True:
+        with transaction.atomic():
+            expired = StockHold.objects.filter(expires_at__lte=timezone.now())
+            if product_ids is not None:
+                expired = expired.filter(product_id__in=product_ids)
+            # Holds being committed by a payment right now are theirs to drop
+            holds = list(
+                expired.select_for_update(skip_locked=True).order_by('pk')
+                .values_list('pk', 'product_id', 'quantity')[:chunk_size]
+            )
+            if holds:
+                _release(holds)
+        released += len(holds)
+        if len(holds) < chunk_size:
+            return released
+
+
+def release_order_holds(order):
+    with transaction.atomic():
+        holds = list(
+            StockHold.objects.select_for_update().filter(order=order)
+            .values_list('pk', 'product_id', 'quantity')
+        )
+        if holds:
+            _release(holds)
+
+
+def place_holds(order, quantities, replacing=None):
+    """Hold ``{product id: quantity}`` for ``order``; call inside its transaction.
+
+    The holds of the orders in ``replacing`` (a queryset) are released in the same pass,
+    so every product row is locked once, in product id order, and two
+    checkouts cannot deadlock on each other.  Raises ``InsufficientStock``
+    if any product cannot be held, in which case the caller's transaction
+    must be rolled back.
+    """
+    old_holds = list(
+        StockHold.objects.select_for_update().filter(order__in=replacing)
+        .values_list('pk', 'product_id', 'quantity')
+    ) if replacing is not None else []
+    released = defaultdict(int)
+    for pk, product_id, quantity in old_holds:
+        released[product_id] += quantity
+
+    short = []
+    for product_id in sorted(set(quantities) | set(released)):
+        change = quantities.get(product_id, 0) - released[product_id]
+        if not change or _reserve(product_id, change):
+            continue
+        if release_expired_holds(product_ids=[product_id]) and _reserve(product_id, change):
+            continue
+        short.append(product_id)
+    if short:
+        products = Product.objects.filter(pk__in=short).values_list('pk', 'name', 'stock', 'reserved_stock')
+        raise InsufficientStock([
+            (name, quantities[pk], max(stock - reserved + released[pk], 0))
+            for pk, name, stock, reserved in products
+        ])
+
+    if old_holds:
+        StockHold.objects.filter(pk__in=[pk for pk, product_id, quantity in old_holds]).delete()
+    expires_at = timezone.now() + hold_duration()
+    StockHold.objects.bulk_create([
+        StockHold(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for product_id, quantity in quantities.items()
+    ])
+    # Listings and facets filter on available stock
+    bump_catalog_generation()
+
+
+# Payment
+
+def commit_order(order, **fields):
+    """Take ``order``'s stock, then save it with ``status='confirmed'`` and ``fields``.
+
+    Returns ``False`` without touching stock if the order is no longer
+    pending (a repeated confirmation, or it was cancelled; see
+    ``reject_payment``), ``True`` otherwise.  Raises
+    ``InsufficientStock`` with nothing changed if any product is short.
+    """
+    with transaction.atomic():
+        # Serializes concurrent confirmations of the same order
+        locked = Order.objects.select_for_update().only('status').get(pk=order.pk)
+        if locked.status != 'pending':
+            return False
+
+        quantities = dict(
+            OrderItem.objects.filter(order=order).values('product_id').annotate(
+                total=Sum('quantity')
+            ).values_list('product_id', 'total').order_by()
+        )
+        # Locked so the sweep cannot release them underneath us
+        holds = list(
+            StockHold.objects.select_for_update().filter(order=order)
+            .values_list('pk', 'product_id', 'quantity')
+        )
+        held = defaultdict(int)
+        for pk, product_id, quantity in holds:
+            held[product_id] += quantity
+
+        now = timezone.now()
+        short = []
+        for product_id in sorted(quantities):
+            quantity = quantities[product_id]
+            mine = min(held[product_id], quantity)
+            # Everyone else's holds must still fit in what is left
+            taken = Product.objects.filter(
+                pk=product_id, stock__gte=F('reserved_stock') - mine + quantity,
+            ).update(
+                stock=F('stock') - quantity,
+                reserved_stock=F('reserved_stock') - held[product_id],
+                updated_at=now,
+            )
+            if not taken:
+                short.append(product_id)
+        if short:
+            products = Product.objects.filter(pk__in=short).values_list('pk', 'name', 'stock', 'reserved_stock')
+            raise InsufficientStock([
+                (name, quantities[pk], max(stock - reserved + held[pk], 0))
+                for pk, name, stock, reserved in products
+            ])
+        # Holds on products no longer in the order just go back to stock
+        stray = [hold for hold in holds if hold[1] not in quantities]
+        if stray:
+            _release(stray)
+        StockHold.objects.filter(pk__in=[hold[0] for hold in holds if hold[1] in quantities]).delete()
+
+        for name, value in {'status': 'confirmed', **fields}.items():
+            setattr(order, name, value)
+        order._loaded_status = locked.status
+        order.save()
+
+        CartItem.objects.filter(cart__customer_id=order.customer_id).delete()
+        if quantities:
+            catalog_bulk_changed.send(sender=Product, product_ids=list(quantities), fields={'stock'})
+    return True
+
+
+def fail_order(order, charged=False):
+    """Cancel ``order`` after ``InsufficientStock``; its cart is left as it was.
+
+    With ``charged`` the customer has already paid, so the order is marked
+    ``refund_due`` and logged for a refund rather than left looking unpaid.
+    """
+    release_order_holds(order)
+    fields = {'status': 'cancelled', 'updated_at': timezone.now()}
+    if charged:
+        fields['payment_status'] = 'refund_due'
+    cancelled = Order.objects.filter(pk=order.pk, status='pending').update(**fields)
+    for name, value in fields.items():
+        setattr(order, name, value)
+    if charged and cancelled:
+        logger.error('Order %s was paid but is short of stock; refund due', order.order_number)
+
+
+def reject_payment(order, charged=False):
+    """Deal with a payment ``commit_order`` refused; returns ``order``'s status.
+
+    The order is no longer pending.  With ``charged``, money was taken
+    anyway: a cancelled order is marked ``refund_due``, and a second charge
+    for an order that is already paid is logged for a refund.
+    """
+    order.status = Order.objects.values_list('status', flat=True).get(pk=order.pk)
+    if not charged:
+        return order.status
+    if order.status == 'cancelled':
+        Order.objects.filter(pk=order.pk).update(payment_status='refund_due', updated_at=timezone.now())
+        order.payment_status = 'refund_due'
+        logger.error('Order %s was paid after it was cancelled; refund due', order.order_number)
+    else:
+        logger.error('Order %s was paid again after it was confirmed; refund due', order.order_number)
+    return order.status
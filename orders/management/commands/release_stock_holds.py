@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from orders.inventory import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Return stock held by checkouts whose hold has expired'
+
+    def handle(self, *args, **options):
+        released = release_expired_holds()
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired stock holds.'))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-16 23:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_checkout_token'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='payment_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed'), ('refund_due', 'Refund Due'), ('refunded', 'Refunded')], default='pending', max_length=20),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils.functional import cached_property
 from accounts.models import CustomerProfile, FarmerProfile
 from products.models import Product
 
@@ -11,13 +12,18 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart for {self.customer.user.username}"
     
+    @cached_property
+    def summary(self):
+        from .carts import cart_summary
+        return cart_summary(self.customer_id)
+    
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.items.all())
+        return self.summary['total']
     
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.summary['count']
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
@@ -54,6 +60,7 @@ class Order(models.Model):
         ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
+        ('refund_due', 'Refund Due'),
         ('refunded', 'Refunded'),
     )
     
@@ -63,6 +70,8 @@ class Order(models.Model):
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending')
     payment_method = models.CharField(max_length=50, blank=True)
     payment_intent_id = models.CharField(max_length=200, blank=True)
+    # From the checkout form that created the order; makes resubmitting it a no-op
+    checkout_token = models.CharField(max_length=32, unique=True, null=True, blank=True, editable=False)
     delivery_option = models.CharField(max_length=20, choices=DELIVERY_CHOICES, default='delivery')
     delivery_address = models.TextField()
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -74,6 +83,13 @@ class Order(models.Model):
     
     def __str__(self):
         return f"Order {self.order_number} by {self.customer.user.username}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so saves can detect transitions
+        instance._loaded_status = dict(zip(field_names, values)).get('status')
+        return instance
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -88,3 +104,17 @@ class OrderItem(models.Model):
     @property
     def total_price(self):
         return self.quantity * self.price
+
+class StockHold(models.Model):
+    """Units of a product set aside for an unpaid order until ``expires_at``.
+
+    Mirrored in ``Product.reserved_stock``; see ``orders.inventory``.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='holds')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='holds')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held for order {self.order_id}"
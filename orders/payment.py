@@ -27,19 +27,18 @@ class StripePaymentProcessor:
         except stripe.error.StripeError as e:
             return None
     
-    def confirm_payment(self, payment_intent_id):
-        """Confirm payment and update order status"""
+    def confirm_payment(self, payment_intent_id, order):
+        """Check that the intent succeeded and paid for ``order``.
+
+        The order itself is confirmed by ``orders.inventory.commit_order``.
+        """
         try:
             intent = self.stripe.PaymentIntent.retrieve(payment_intent_id)
-            if intent.status == 'succeeded':
-                order_id = intent.metadata.get('order_id')
-                if order_id:
-                    order = Order.objects.get(id=order_id)
-                    order.status = 'confirmed'
-                    order.save()
-                    return True
-            return False
-        except (stripe.error.StripeError, Order.DoesNotExist):
+            return (
+                intent.status == 'succeeded'
+                and str(intent.metadata.get('order_id')) == str(order.id)
+            )
+        except stripe.error.StripeError:
             return False
 
 def process_payment(request):
@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from products.models import Product
+from products.signals import catalog_bulk_changed
+from . import carts
+from .models import Cart, CartItem
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def forget_cart_summary(sender, instance, **kwargs):
+    try:
+        customer_id = instance.cart.customer_id
+    except Cart.DoesNotExist:
+        # Deleted along with its cart
+        return
+    carts.invalidate([customer_id])
+
+
+@receiver(post_save, sender=Product)
+def forget_product_cart_summaries(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    carts.invalidate_products([instance.pk])
+
+
+@receiver(catalog_bulk_changed)
+def forget_bulk_changed_cart_summaries(sender, product_ids, fields=None, **kwargs):
+    if fields is None or 'price' in fields:
+        carts.invalidate_products(product_ids)
@@ -1,3 +1,396 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import CustomerProfile, FarmerProfile, User
+from products.models import Category, Product
+from .carts import cart_summary
+from .checkout import build_order
+from .inventory import InsufficientStock, commit_order, fail_order, place_holds, release_expired_holds
+from .models import Cart, CartItem, Order, OrderItem, StockHold
+
+
+class OrderFixtures:
+    def make_customer(self, username):
+        user = User.objects.create_user(username=username, password='x', user_type='customer')
+        return CustomerProfile.objects.create(user=user)
+
+    def make_product(self, name, stock):
+        if not hasattr(self, 'farmer'):
+            user = User.objects.create_user(username='farmer', password='x', user_type='farmer')
+            self.farmer = FarmerProfile.objects.create(user=user, farm_location='Ejisu')
+            self.category = Category.objects.create(name='Vegetables')
+        return Product.objects.create(
+            farmer=self.farmer, category=self.category, name=name, description=name,
+            price=Decimal('2.00'), stock=stock,
+        )
+
+    def make_order(self, customer, quantities, number):
+        """A pending order for ``{product: quantity}``, also left in the customer's cart."""
+        cart, created = Cart.objects.get_or_create(customer=customer)
+        order = Order.objects.create(
+            customer=customer, order_number=number, delivery_address='Here', total_amount=Decimal('0'),
+        )
+        for product, quantity in quantities.items():
+            OrderItem.objects.create(
+                order=order, product=product, farmer=product.farmer, quantity=quantity, price=product.price,
+            )
+            CartItem.objects.update_or_create(cart=cart, product=product, defaults={'quantity': quantity})
+        return order
+
+    def stock(self, product):
+        return Product.objects.values_list('stock', flat=True).get(pk=product.pk)
+
+    def status(self, order):
+        return Order.objects.values_list('status', 'payment_status').get(pk=order.pk)
+
+    def reserved(self, product):
+        return Product.objects.values_list('reserved_stock', flat=True).get(pk=product.pk)
+
+    def hold(self, order, quantities):
+        with transaction.atomic():
+            place_holds(order, {product.pk: quantity for product, quantity in quantities.items()})
+
+
+class CommitOrderTests(OrderFixtures, TestCase):
+    def setUp(self):
+        self.customer = self.make_customer('alice')
+        self.kale = self.make_product('Kale', stock=5)
+        self.eggs = self.make_product('Eggs', stock=2)
+
+    def test_commit_takes_stock_and_clears_cart(self):
+        order = self.make_order(self.customer, {self.kale: 3, self.eggs: 2}, 'ORD-1')
+
+        self.assertTrue(commit_order(order, payment_status='completed'))
+
+        self.assertEqual(self.stock(self.kale), 2)
+        self.assertEqual(self.stock(self.eggs), 0)
+        self.assertEqual(self.status(order), ('confirmed', 'completed'))
+        self.assertFalse(CartItem.objects.filter(cart__customer=self.customer).exists())
+
+    def test_repeated_confirmation_returns_false(self):
+        order = self.make_order(self.customer, {self.kale: 3}, 'ORD-1')
+        self.assertTrue(commit_order(order))
+
+        self.assertFalse(commit_order(Order.objects.get(pk=order.pk)))
+        self.assertEqual(self.stock(self.kale), 2)
+
+    def test_shortage_rolls_back_everything(self):
+        order = self.make_order(self.customer, {self.kale: 3, self.eggs: 4}, 'ORD-1')
+
+        with self.assertRaises(InsufficientStock) as raised:
+            commit_order(order, payment_status='completed')
+
+        self.assertEqual(raised.exception.shortages, [('Eggs', 4, 2)])
+        # Kale was taken before Eggs came up short; the rollback restores it
+        self.assertEqual(self.stock(self.kale), 5)
+        self.assertEqual(self.stock(self.eggs), 2)
+        self.assertEqual(self.status(order), ('pending', 'pending'))
+        self.assertEqual(CartItem.objects.filter(cart__customer=self.customer).count(), 2)
+
+    def test_failed_paid_order_is_marked_refund_due(self):
+        order = self.make_order(self.customer, {self.eggs: 4}, 'ORD-1')
+        with self.assertRaises(InsufficientStock):
+            commit_order(order, payment_status='completed')
+
+        fail_order(order, charged=True)
+
+        self.assertEqual(self.status(order), ('cancelled', 'refund_due'))
+        self.assertEqual(self.stock(self.eggs), 2)
+
+
+class CartSummaryTests(OrderFixtures, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = self.make_customer('alice')
+        self.cart = Cart.objects.create(customer=self.customer)
+        self.kale = self.make_product('Kale', stock=5)
+
+    def summary(self):
+        summary = cart_summary(self.customer.pk)
+        return summary['count'], summary['total']
+
+    def test_adding_an_item_retires_the_summary_on_commit(self):
+        self.assertEqual(self.summary(), (0, Decimal('0.00')))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CartItem.objects.create(cart=self.cart, product=self.kale, quantity=2)
+            # Still the cached summary until the transaction commits
+            self.assertEqual(self.summary(), (0, Decimal('0.00')))
+
+        self.assertEqual(self.summary(), (2, Decimal('4.00')))
+
+    def test_changing_and_removing_items(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            item = CartItem.objects.create(cart=self.cart, product=self.kale, quantity=2)
+        self.assertEqual(self.summary(), (2, Decimal('4.00')))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.quantity = 3
+            item.save()
+        self.assertEqual(self.summary(), (3, Decimal('6.00')))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.delete()
+        self.assertEqual(self.summary(), (0, Decimal('0.00')))
+
+    def test_price_change_retires_summaries_of_carts_holding_the_product(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            CartItem.objects.create(cart=self.cart, product=self.kale, quantity=2)
+        self.assertEqual(self.summary(), (2, Decimal('4.00')))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kale.price = Decimal('2.50')
+            self.kale.save()
+
+        self.assertEqual(self.summary(), (2, Decimal('5.00')))
+
+
+class PaymentViewTests(OrderFixtures, TestCase):
+    def setUp(self):
+        self.customer = self.make_customer('alice')
+        self.client.force_login(self.customer.user)
+        self.kale = self.make_product('Kale', stock=5)
+        self.order = self.make_order(self.customer, {self.kale: 3}, 'ORD-1')
+
+    def pay(self, name, **data):
+        response = self.client.post(
+            reverse(name), json.dumps({'order_number': self.order.order_number, **data}),
+            content_type='application/json',
+        )
+        return response.json()
+
+    def test_mobile_payment_for_cancelled_order_is_refunded(self):
+        fail_order(self.order)
+
+        result = self.pay('orders:process_mobile_payment', provider='mtn', phone_number='0240000000')
+
+        self.assertFalse(result['success'])
+        self.assertIn('refunded', result['error'])
+        self.assertEqual(self.status(self.order), ('cancelled', 'refund_due'))
+        self.assertEqual(self.stock(self.kale), 5)
+
+    def test_cash_on_delivery_for_cancelled_order_fails(self):
+        fail_order(self.order)
+
+        result = self.pay('orders:process_cod_payment')
+
+        self.assertFalse(result['success'])
+        self.assertEqual(self.status(self.order), ('cancelled', 'pending'))
+
+    def test_second_payment_for_paid_order_fails(self):
+        self.assertTrue(self.pay('orders:process_mobile_payment', provider='mtn')['success'])
+
+        result = self.pay('orders:process_mobile_payment', provider='mtn')
+
+        self.assertFalse(result['success'])
+        self.assertEqual(self.status(self.order), ('confirmed', 'completed'))
+        self.assertEqual(self.stock(self.kale), 2)
+
+
+class StockHoldTests(OrderFixtures, TestCase):
+    def setUp(self):
+        self.alice = self.make_customer('alice')
+        self.bob = self.make_customer('bob')
+        self.kale = self.make_product('Kale', stock=5)
+
+    def expire(self, order):
+        StockHold.objects.filter(order=order).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+    def test_hold_reduces_available_stock(self):
+        order = self.make_order(self.alice, {self.kale: 3}, 'ORD-1')
+        self.hold(order, {self.kale: 3})
+
+        self.assertEqual(self.reserved(self.kale), 3)
+        self.assertEqual(self.stock(self.kale), 5)
+        self.assertEqual(Product.objects.get(pk=self.kale.pk).available_stock, 2)
+
+    def test_hold_beyond_available_fails_and_rolls_back(self):
+        self.hold(self.make_order(self.alice, {self.kale: 3}, 'ORD-1'), {self.kale: 3})
+        order = self.make_order(self.bob, {self.kale: 3}, 'ORD-2')
+
+        with self.assertRaises(InsufficientStock) as raised:
+            self.hold(order, {self.kale: 3})
+
+        self.assertEqual(raised.exception.shortages, [('Kale', 3, 2)])
+        self.assertEqual(self.reserved(self.kale), 3)
+        self.assertFalse(StockHold.objects.filter(order=order).exists())
+
+    def test_sweep_releases_expired_holds_only(self):
+        expired = self.make_order(self.alice, {self.kale: 2}, 'ORD-1')
+        current = self.make_order(self.bob, {self.kale: 1}, 'ORD-2')
+        self.hold(expired, {self.kale: 2})
+        self.hold(current, {self.kale: 1})
+        self.expire(expired)
+
+        self.assertEqual(release_expired_holds(), 1)
+
+        self.assertEqual(self.reserved(self.kale), 1)
+        self.assertEqual(list(StockHold.objects.values_list('order_id', flat=True)), [current.pk])
+
+    def test_short_hold_sweeps_expired_holds_first(self):
+        expired = self.make_order(self.alice, {self.kale: 4}, 'ORD-1')
+        self.hold(expired, {self.kale: 4})
+        self.expire(expired)
+
+        order = self.make_order(self.bob, {self.kale: 3}, 'ORD-2')
+        self.hold(order, {self.kale: 3})
+
+        self.assertEqual(self.reserved(self.kale), 3)
+        self.assertFalse(StockHold.objects.filter(order=expired).exists())
+
+    def test_commit_turns_hold_into_sale(self):
+        order = self.make_order(self.alice, {self.kale: 3}, 'ORD-1')
+        self.hold(order, {self.kale: 3})
+
+        self.assertTrue(commit_order(order))
+
+        self.assertEqual(self.stock(self.kale), 2)
+        self.assertEqual(self.reserved(self.kale), 0)
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_commit_after_hold_expired_uses_unheld_stock(self):
+        order = self.make_order(self.alice, {self.kale: 3}, 'ORD-1')
+        self.hold(order, {self.kale: 3})
+        self.expire(order)
+        release_expired_holds()
+
+        self.assertTrue(commit_order(order))
+        self.assertEqual(self.stock(self.kale), 2)
+        self.assertEqual(self.reserved(self.kale), 0)
+
+    def test_commit_cannot_take_units_held_for_others(self):
+        mine = self.make_order(self.alice, {self.kale: 3}, 'ORD-1')
+        self.hold(mine, {self.kale: 3})
+        self.expire(mine)
+        release_expired_holds()
+        self.hold(self.make_order(self.bob, {self.kale: 4}, 'ORD-2'), {self.kale: 4})
+
+        with self.assertRaises(InsufficientStock):
+            commit_order(mine)
+        self.assertEqual(self.stock(self.kale), 5)
+        self.assertEqual(self.reserved(self.kale), 4)
+
+    def test_failed_order_releases_its_holds(self):
+        order = self.make_order(self.alice, {self.kale: 3}, 'ORD-1')
+        self.hold(order, {self.kale: 3})
+
+        fail_order(order)
+
+        self.assertEqual(self.reserved(self.kale), 0)
+        self.assertEqual(self.status(order), ('cancelled', 'pending'))
+
+    def test_deleted_order_releases_its_holds(self):
+        order = self.make_order(self.alice, {self.kale: 3}, 'ORD-1')
+        self.hold(order, {self.kale: 3})
+
+        order.delete()
+
+        self.assertEqual(self.reserved(self.kale), 0)
+
+
+class BuildOrderTests(OrderFixtures, TestCase):
+    def setUp(self):
+        self.alice = self.make_customer('alice')
+        self.kale = self.make_product('Kale', stock=5)
+        cart = Cart.objects.create(customer=self.alice)
+        CartItem.objects.create(cart=cart, product=self.kale, quantity=2)
+
+    def checkout(self, token=None):
+        return build_order(self.alice, 'delivery', 'Here', checkout_token=token)
+
+    def test_builds_order_with_items_and_holds(self):
+        order, created = self.checkout()
+
+        self.assertTrue(created)
+        self.assertEqual(order.total_amount, Decimal('4.00'))
+        self.assertEqual(list(order.items.values_list('product_id', 'quantity')), [(self.kale.pk, 2)])
+        self.assertEqual(self.reserved(self.kale), 2)
+
+    def test_resubmitted_form_returns_the_same_order(self):
+        first, created = self.checkout(token='a' * 32)
+        second, created_again = self.checkout(token='a' * 32)
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertFalse(created_again)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.reserved(self.kale), 2)
+
+    def test_checking_out_again_replaces_earlier_holds(self):
+        first, created = self.checkout()
+        CartItem.objects.filter(cart__customer=self.alice).update(quantity=4)
+        second, created = self.checkout()
+
+        self.assertEqual(self.reserved(self.kale), 4)
+        self.assertEqual(list(StockHold.objects.values_list('order_id', flat=True)), [second.pk])
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentCommitTests(OrderFixtures, TransactionTestCase):
+    def run_concurrently(self, *calls):
+        barrier = threading.Barrier(len(calls))
+        results = [None] * len(calls)
+
+        def run(index, call):
+            try:
+                barrier.wait()
+                results[index] = call()
+            except Exception as e:
+                results[index] = e
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(index, call)) for index, call in enumerate(calls)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_last_unit_is_sold_once(self):
+        product = self.make_product('Kale', stock=1)
+        orders = [
+            self.make_order(self.make_customer(f'customer{i}'), {product: 1}, f'ORD-{i}')
+            for i in range(4)
+        ]
+
+        results = self.run_concurrently(*(lambda order=order: commit_order(order) for order in orders))
+
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(sum(isinstance(result, InsufficientStock) for result in results), 3)
+        self.assertEqual(self.stock(product), 0)
+
+    def test_same_order_confirmed_twice_at_once(self):
+        product = self.make_product('Kale', stock=5)
+        order = self.make_order(self.make_customer('alice'), {product: 2}, 'ORD-1')
+
+        results = self.run_concurrently(lambda: commit_order(order), lambda: commit_order(order))
+
+        self.assertEqual(sorted(results), [False, True])
+        self.assertEqual(self.stock(product), 3)
+
+    def test_concurrent_checkouts_do_not_oversell_or_deadlock(self):
+        kale = self.make_product('Kale', stock=3)
+        eggs = self.make_product('Eggs', stock=3)
+        customers = [self.make_customer(f'customer{i}') for i in range(4)]
+        for customer in customers:
+            cart = Cart.objects.create(customer=customer)
+            CartItem.objects.create(cart=cart, product=kale, quantity=1)
+            CartItem.objects.create(cart=cart, product=eggs, quantity=1)
+
+        results = self.run_concurrently(*(
+            lambda customer=customer: build_order(customer, 'delivery', 'Here')
+            for customer in customers
+        ))
+
+        self.assertEqual(sum(isinstance(result, tuple) for result in results), 3)
+        self.assertEqual(sum(isinstance(result, InsufficientStock) for result in results), 1)
+        self.assertEqual(self.reserved(kale), 3)
+        self.assertEqual(self.reserved(eggs), 3)
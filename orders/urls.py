@@ -7,6 +7,7 @@ urlpatterns = [
     path('cart/', views.CartView.as_view(), name='cart'),
     path('add-to-cart/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('update-cart/<int:item_id>/', views.update_cart_item, name='update_cart_item'),
+    path('cart-count/', views.cart_count, name='cart_count'),
     path('remove-from-cart/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('checkout/', views.CheckoutView.as_view(), name='checkout'),
     path('payment/<str:order_number>/', views.PaymentMethodView.as_view(), name='payment_method'),
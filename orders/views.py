@@ -4,15 +4,16 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, DetailView, TemplateView
 from django.http import JsonResponse
 from django.contrib import messages
-from django.db import transaction
 from django.core.paginator import Paginator
-from .models import Cart, CartItem, Order, OrderItem
+from .models import Cart, CartItem, Order
 from .forms import CheckoutForm
 from .payment import process_payment
+from .carts import cart_items, cart_summary
+from .checkout import EmptyCart, build_order, new_checkout_token
+from .inventory import InsufficientStock, commit_order, fail_order, reject_payment
 from products.models import Product
+from accounts.profiles import get_customer_profile
 from messaging.models import Notification
-import uuid
-from django.utils import timezone
 from django.conf import settings
 import json
 
@@ -31,6 +32,7 @@ class CartView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         cart, created = Cart.objects.get_or_create(customer=self.request.user.customer_profile)
         context['cart'] = cart
+        context['items'] = cart_items(cart)
         return context
 
 @login_required
@@ -44,7 +46,7 @@ def add_to_cart(request, product_id):
     
     quantity = int(request.POST.get('quantity', 1))
     
-    if quantity > product.stock:
+    if quantity > product.available_stock:
         return JsonResponse({'error': 'Not enough stock available'}, status=400)
     
     cart_item, created = CartItem.objects.get_or_create(
@@ -55,7 +57,7 @@ def add_to_cart(request, product_id):
     
     if not created:
         new_quantity = cart_item.quantity + quantity
-        if new_quantity > product.stock:
+        if new_quantity > product.available_stock:
             return JsonResponse({'error': 'Not enough stock available'}, status=400)
         cart_item.quantity = new_quantity
         cart_item.save()
@@ -74,7 +76,7 @@ def update_cart_item(request, item_id):
     cart_item = get_object_or_404(CartItem, id=item_id, cart__customer=request.user.customer_profile)
     quantity = int(request.POST.get('quantity', 1))
     
-    if quantity > cart_item.product.stock:
+    if quantity > cart_item.product.available_stock:
         return JsonResponse({'error': 'Not enough stock available'}, status=400)
     
     if quantity <= 0:
@@ -90,6 +92,14 @@ def update_cart_item(request, item_id):
         'cart_total': cart_item.cart.total_price
     })
 
+def cart_count(request):
+    """Units in the customer's cart, for the navbar badge"""
+    user = request.user
+    if not user.is_authenticated or user.user_type != 'customer':
+        # Polled from every page, signed in or not
+        return JsonResponse({'success': True, 'count': 0})
+    return JsonResponse({'success': True, 'count': cart_summary(get_customer_profile(user).pk)['count']})
+
 @login_required
 def remove_from_cart(request, item_id):
     if not request.user.is_authenticated or request.user.user_type != 'customer':
@@ -119,43 +129,36 @@ class CheckoutView(LoginRequiredMixin, TemplateView):
             return redirect('orders:cart')
         
         context['cart'] = cart
-        context['form'] = CheckoutForm()
+        context['items'] = cart_items(cart)
+        context['form'] = CheckoutForm(initial={'checkout_token': new_checkout_token()})
         return context
     
     def post(self, request, *args, **kwargs):
-        cart = get_object_or_404(Cart, customer=request.user.customer_profile)
         form = CheckoutForm(request.POST)
         
-        if form.is_valid() and cart.items.exists():
-            # Create order
-            order = Order.objects.create(
-                customer=request.user.customer_profile,
-                order_number=self.generate_order_number(),
-                delivery_option=form.cleaned_data['delivery_option'],
-                delivery_address=form.cleaned_data['delivery_address'],
-                total_amount=cart.total_price
-            )
-            
-            # Create order items
-            for cart_item in cart.items.all():
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    farmer=cart_item.product.farmer,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.price
+        if form.is_valid():
+            try:
+                order, created = build_order(
+                    get_customer_profile(request.user),
+                    delivery_option=form.cleaned_data['delivery_option'],
+                    delivery_address=form.cleaned_data['delivery_address'],
+                    checkout_token=form.cleaned_data['checkout_token'],
                 )
+            except EmptyCart:
+                messages.error(request, 'Your cart is empty.')
+                return redirect('orders:cart')
+            except InsufficientStock as e:
+                messages.error(request, f'Not enough stock: {e}')
+                return redirect('orders:cart')
             
             # Redirect to payment method selection instead of clearing cart immediately
-            messages.success(request, 'Order created successfully! Please complete payment.')
+            if created:
+                messages.success(request, 'Order created successfully! Please complete payment.')
             return redirect('orders:payment_method', order_number=order.order_number)
         
         context = self.get_context_data()
         context['form'] = form
         return render(request, self.template_name, context)
-    
-    def generate_order_number(self):
-        return f"ORD-{timezone.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
 
 class PaymentMethodView(LoginRequiredMixin, TemplateView):
     template_name = 'orders/payment_method.html'
@@ -219,6 +222,16 @@ def create_payment_intent(request):
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
+def payment_refused(order, charged=False):
+    """Response for a payment made for an order that is no longer pending."""
+    if reject_payment(order, charged) == 'cancelled':
+        error = 'This order has been cancelled.'
+    else:
+        error = 'This order has already been paid.'
+    if charged:
+        error += ' Your payment will be refunded.'
+    return JsonResponse({'success': False, 'error': error})
+
 @login_required
 def confirm_payment(request):
     if request.method != 'POST':
@@ -234,20 +247,17 @@ def confirm_payment(request):
         from .payment import StripePaymentProcessor
         processor = StripePaymentProcessor()
         
-        if processor.confirm_payment(payment_intent_id):
-            order.payment_status = 'completed'
-            order.status = 'confirmed'
-            order.save()
-            
-            # Update product stock and clear cart
-            for order_item in order.items.all():
-                order_item.product.stock -= order_item.quantity
-                order_item.product.save()
-            
-            # Clear customer's cart
-            cart = Cart.objects.filter(customer=request.user.customer_profile).first()
-            if cart:
-                cart.items.all().delete()
+        if processor.confirm_payment(payment_intent_id, order):
+            try:
+                committed = commit_order(order, payment_status='completed')
+            except InsufficientStock as e:
+                fail_order(order, charged=True)
+                return JsonResponse({'success': False, 'error': f'Not enough stock: {e}. Your payment will be refunded.'})
+            if not committed:
+                # Confirming the intent that already paid for it is not a second charge
+                order.refresh_from_db(fields=['status', 'payment_intent_id'])
+                repeated = order.status != 'cancelled' and order.payment_intent_id == payment_intent_id
+                return payment_refused(order, charged=not repeated)
             
             return JsonResponse({'success': True})
         
@@ -270,20 +280,17 @@ def process_mobile_payment(request):
         order = get_object_or_404(Order, order_number=order_number, customer=request.user.customer_profile)
         
         # Simulate mobile money processing
-        order.payment_method = f'Mobile Money ({provider.upper()})'
-        order.payment_status = 'completed'
-        order.status = 'confirmed'
-        order.save()
-        
-        # Update product stock and clear cart
-        for order_item in order.items.all():
-            order_item.product.stock -= order_item.quantity
-            order_item.product.save()
-        
-        # Clear customer's cart
-        cart = Cart.objects.filter(customer=request.user.customer_profile).first()
-        if cart:
-            cart.items.all().delete()
+        try:
+            committed = commit_order(
+                order,
+                payment_method=f'Mobile Money ({provider.upper()})',
+                payment_status='completed',
+            )
+        except InsufficientStock as e:
+            fail_order(order, charged=True)
+            return JsonResponse({'success': False, 'error': f'Not enough stock: {e}. Your payment will be refunded.'})
+        if not committed:
+            return payment_refused(order, charged=True)
         
         return JsonResponse({'success': True})
         
@@ -301,20 +308,13 @@ def process_cod_payment(request):
         
         order = get_object_or_404(Order, order_number=order_number, customer=request.user.customer_profile)
         
-        order.payment_method = 'Cash on Delivery'
-        order.payment_status = 'pending'
-        order.status = 'confirmed'
-        order.save()
-        
-        # Update product stock and clear cart
-        for order_item in order.items.all():
-            order_item.product.stock -= order_item.quantity
-            order_item.product.save()
-        
-        # Clear customer's cart
-        cart = Cart.objects.filter(customer=request.user.customer_profile).first()
-        if cart:
-            cart.items.all().delete()
+        try:
+            committed = commit_order(order, payment_method='Cash on Delivery', payment_status='pending')
+        except InsufficientStock as e:
+            fail_order(order)
+            return JsonResponse({'success': False, 'error': f'Not enough stock: {e}'})
+        if not committed:
+            return payment_refused(order)
         
         return JsonResponse({'success': True})
         
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Product, ProductImage, ProductReview
+from .models import Category, Product, ProductImage, ProductReview, Tag
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -7,10 +7,16 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ('name',)
     list_filter = ('created_at',)
 
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug')
+    search_fields = ('name', 'slug')
+    readonly_fields = ('slug', 'name', 'farmers')
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'farmer', 'category', 'price', 'stock', 'is_available', 'average_rating', 'created_at')
-    list_filter = ('category', 'is_available', 'created_at', 'farmer')
+    list_filter = ('category', 'is_available', 'tags', 'created_at', 'farmer')
     search_fields = ('name', 'description', 'farmer__user__username')
     readonly_fields = ('created_at', 'updated_at', 'average_rating', 'total_reviews')
     list_editable = ('is_available', 'stock')
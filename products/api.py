@@ -0,0 +1,219 @@
+"""
+Read-only JSON catalog API (``/products/api/v1/``).
+
+Each endpoint takes ``?fields=`` (comma separated, from the endpoint's
+``fields``), ``?limit=`` and the ``?cursor=`` returned as ``next`` by the
+previous page.  Bodies are compact JSON holding only the requested fields.
+
+Responses carry a strong ETag derived from the catalog generation counter
+(``products.cache``) and the canonical request parameters, so a client
+revalidating with ``If-None-Match`` gets a 304 from a single cache read,
+without touching the database, until something in the catalog changes.
+Rendered bodies are cached under the same key.
+
+``/products/?since=<ISO timestamp>`` returns products with ``updated_at``
+after ``since`` (in ``TIME_ZONE`` unless it has an offset), oldest first,
+including ones that were made unavailable,
+so a client can keep a local copy in sync.  Every write to a published
+field touches ``updated_at``, including the UPDATEs for review aggregates
+and stock holds.  Timestamps are taken before their transaction commits,
+so clients should start the next sync a few seconds before the newest
+``updated_at`` they saw.  Deletions are not reported.
+"""
+import hashlib
+import json
+
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
+
+from accounts.models import FarmerProfile
+from . import cache as result_cache
+from .models import Category, Product
+from .pagination import InvalidCursor, KeysetPaginator
+
+API_VERSION = 'v1'
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def _datetime(value):
+    return value.isoformat() if value is not None else None
+
+
+def _since(value):
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        # Well formed but out of range, e.g. month 13
+        parsed = None
+    if parsed is None:
+        raise result_cache.InvalidParameter(value)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed.isoformat()
+
+
+class Endpoint:
+    """One listing: ``fields`` maps each public name to ``(ORM path(s), getter)``."""
+    fields = {}
+    default_fields = ()
+    ordering = ('id',)
+    filters = {}
+
+    def get_queryset(self, params):
+        raise NotImplementedError
+
+    def get_ordering(self, params):
+        return self.ordering
+
+    def parse(self, query):
+        """Canonical ``(name, value)`` parameters; raises ``InvalidParameter``."""
+        params = dict(result_cache.canonical_params(query, {
+            **self.filters,
+            'cursor': str,
+            'limit': result_cache.integer,
+        }))
+        fields = query.get('fields', '')
+        names = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise result_cache.InvalidParameter(', '.join(unknown))
+        params['fields'] = sorted(set(names or self.default_fields))
+        params['limit'] = min(max(params.get('limit', DEFAULT_LIMIT), 1), MAX_LIMIT)
+        return params
+
+    def render(self, params):
+        paths = []
+        for name in params['fields']:
+            path = self.fields[name][0]
+            paths.extend(path if isinstance(path, tuple) else (path,))
+        ordering = self.get_ordering(params)
+        queryset = self.get_queryset(params)
+        related = {path.rsplit('__', 1)[0] for path in paths if '__' in path}
+        if related:
+            queryset = queryset.select_related(*related)
+        queryset = queryset.only(*paths, *(name.lstrip('-') for name in ordering))
+
+        paginator = KeysetPaginator(queryset, params['limit'], ordering)
+        page = paginator.page(params.get('cursor'))
+        results = [
+            {name: self.fields[name][1](obj) for name in params['fields']}
+            for obj in page
+        ]
+        return json.dumps(
+            {'results': results, 'next': page.next_cursor},
+            separators=(',', ':'),
+        )
+
+
+class ProductEndpoint(Endpoint):
+    fields = {
+        'id': ('id', lambda p: p.pk),
+        'name': ('name', lambda p: p.name),
+        'description': ('description', lambda p: p.description),
+        'price': ('price', lambda p: str(p.price)),
+        # Not counting units held for other customers' checkouts
+        'stock': (('stock', 'reserved_stock'), lambda p: p.available_stock),
+        'is_available': ('is_available', lambda p: p.is_available),
+        'image': ('image', lambda p: p.image.url if p.image else None),
+        'category': ('category_id', lambda p: p.category_id),
+        'category_name': ('category__name', lambda p: p.category.name),
+        'farmer': ('farmer_id', lambda p: p.farmer_id),
+        'farm_name': ('farmer__farm_name', lambda p: p.farmer.farm_name),
+        'farm_location': ('farmer__farm_location', lambda p: p.farmer.farm_location),
+        'rating': ('rating_avg', lambda p: p.rating_avg),
+        'rating_count': ('rating_count', lambda p: p.rating_count),
+        'created_at': ('created_at', lambda p: _datetime(p.created_at)),
+        'updated_at': ('updated_at', lambda p: _datetime(p.updated_at)),
+    }
+    default_fields = ('id', 'name', 'price', 'stock', 'is_available', 'category', 'farmer', 'updated_at')
+    ordering = ('-created_at', '-id')
+    filters = {
+        'category': result_cache.integer,
+        'farmer': result_cache.integer,
+        'since': _since,
+    }
+
+    def get_queryset(self, params):
+        queryset = Product.objects.all()
+        if 'since' in params:
+            queryset = queryset.filter(updated_at__gt=params['since'])
+        else:
+            queryset = queryset.filter(is_available=True)
+        if 'category' in params:
+            queryset = queryset.filter(category_id=params['category'])
+        if 'farmer' in params:
+            queryset = queryset.filter(farmer_id=params['farmer'])
+        return queryset
+
+    def get_ordering(self, params):
+        return ('updated_at', 'id') if 'since' in params else self.ordering
+
+
+class CategoryEndpoint(Endpoint):
+    fields = {
+        'id': ('id', lambda c: c.pk),
+        'name': ('name', lambda c: c.name),
+        'description': ('description', lambda c: c.description),
+    }
+    default_fields = ('id', 'name')
+
+    def get_queryset(self, params):
+        return Category.objects.all()
+
+
+class FarmerEndpoint(Endpoint):
+    fields = {
+        'id': ('id', lambda f: f.pk),
+        'username': ('user__username', lambda f: f.user.username),
+        'farm_name': ('farm_name', lambda f: f.farm_name),
+        'farm_location': ('farm_location', lambda f: f.farm_location),
+        'farm_description': ('farm_description', lambda f: f.farm_description),
+        'farming_methods': ('farming_methods', lambda f: f.farming_methods),
+        'is_verified': ('is_verified', lambda f: f.is_verified),
+        'latitude': ('latitude', lambda f: f.latitude),
+        'longitude': ('longitude', lambda f: f.longitude),
+    }
+    default_fields = ('id', 'farm_name', 'farm_location', 'is_verified')
+
+    def get_queryset(self, params):
+        return FarmerProfile.objects.all()
+
+
+def _etag(key):
+    return '"%s"' % hashlib.sha1(key.encode()).hexdigest()
+
+
+def _endpoint_view(endpoint):
+    @require_GET
+    def view(request):
+        try:
+            params = endpoint.parse(request.GET)
+        except result_cache.InvalidParameter as exc:
+            return JsonResponse({'error': f'Invalid parameter: {exc}'}, status=400)
+
+        key = result_cache.result_key(
+            f'api:{API_VERSION}:{type(endpoint).__name__}', sorted(params.items())
+        )
+        etag = _etag(key)
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+            response = HttpResponseNotModified()
+        else:
+            try:
+                body = result_cache.get_or_compute(key, lambda: endpoint.render(params))
+            except InvalidCursor:
+                return JsonResponse({'error': 'Invalid cursor'}, status=400)
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+    return view
+
+
+product_list = _endpoint_view(ProductEndpoint())
+category_list = _endpoint_view(CategoryEndpoint())
+farmer_list = _endpoint_view(FarmerEndpoint())
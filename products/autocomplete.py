@@ -0,0 +1,324 @@
+"""
+Per-process autocomplete index for the search typeahead.
+
+Each worker keeps every available product in memory together with a sorted
+list of ``(token, product_id, source)`` keys, so a prefix lookup is a bisect
+plus a short scan and never touches the database.
+
+Workers stay in step through a shared version counter (see
+``products.counters``).  Product and FarmerProfile signals bump the counter
+and record in the cache which product ids changed under the new version; on
+its next lookup a worker notices the new version, refetches just those
+products and patches its index.  If it has fallen too far behind, or the
+change records expired (or, without a shared cache, were written by
+another worker), it reloads everything.
+
+The index also keeps a trigram posting list over its distinct tokens, used
+to find close spellings of query terms it does not know (see
+``products.fuzzy``).
+"""
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.db import transaction
+
+from . import counters
+from .models import Product
+
+VERSION_KEY = 'products:autocomplete:version'
+CHANGE_KEY = 'products:autocomplete:change:%d'
+CHANGE_TIMEOUT = 60 * 60
+
+# Beyond this many pending versions a full reload is cheaper than replaying
+MAX_REPLAY = 200
+
+# Key sources, in ranking order
+SOURCE_NAME = 0
+SOURCE_FARM = 1
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+def trigrams(word):
+    """Trigrams of ``word`` padded the way pg_trgm pads them."""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class Entry:
+    id: int
+    name: str
+    farmer: str
+    farm_name: str
+    category: str
+    price: str
+    image_url: str
+    popularity: float
+
+    @classmethod
+    def from_product(cls, product):
+        return cls(
+            id=product.pk,
+            name=product.name,
+            farmer=product.farmer.user.username,
+            farm_name=product.farmer.farm_name,
+            category=product.category.name,
+            price=str(product.price),
+            image_url=product.image.url if product.image else '',
+            popularity=product.popularity_score,
+        )
+
+    def keys(self):
+        keys = {(token, self.id, SOURCE_NAME) for token in tokenize(self.name)}
+        keys.update(
+            (token, self.id, SOURCE_FARM)
+            for token in tokenize(f'{self.farm_name} {self.farmer}')
+        )
+        return keys
+
+    def as_json(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'price': self.price,
+            'farmer': self.farmer,
+            'farmer_name': self.farm_name or self.farmer,
+            'category': self.category,
+            'image_url': self.image_url,
+            'image': self.image_url,
+        }
+
+
+def _fetch(queryset):
+    return queryset.filter(is_available=True).select_related(
+        'farmer__user', 'category'
+    ).only(
+        'id', 'name', 'price', 'image', 'popularity_score',
+        'farmer__farm_name', 'farmer__user__username', 'category__name',
+    )
+
+
+class AutocompleteIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._keys = []
+        self._token_counts = Counter()
+        self._trigrams = defaultdict(set)
+        self.version = None
+
+    # Maintenance
+
+    def load(self):
+        version = current_version()
+        entries = {}
+        keys = []
+        for product in _fetch(Product.objects.all()).iterator(chunk_size=2000):
+            entry = Entry.from_product(product)
+            entries[entry.id] = entry
+            keys.extend(entry.keys())
+        keys.sort()
+        token_counts = Counter(key[0] for key in keys)
+        postings = defaultdict(set)
+        for token in token_counts:
+            for gram in trigrams(token):
+                postings[gram].add(token)
+        with self._lock:
+            self._entries = entries
+            self._keys = keys
+            self._token_counts = token_counts
+            self._trigrams = postings
+            self.version = version
+
+    def apply_changes(self, product_ids):
+        product_ids = set(product_ids)
+        fresh = {
+            product.pk: Entry.from_product(product)
+            for product in _fetch(Product.objects.filter(pk__in=product_ids))
+        }
+        with self._lock:
+            for product_id in product_ids:
+                self._remove(product_id)
+                if product_id in fresh:
+                    self._add(fresh[product_id])
+
+    def _add(self, entry):
+        self._entries[entry.id] = entry
+        for key in entry.keys():
+            insort(self._keys, key)
+            token = key[0]
+            if not self._token_counts[token]:
+                for gram in trigrams(token):
+                    self._trigrams[gram].add(token)
+            self._token_counts[token] += 1
+
+    def _remove(self, product_id):
+        entry = self._entries.pop(product_id, None)
+        if entry is None:
+            return
+        for key in entry.keys():
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+            token = key[0]
+            self._token_counts[token] -= 1
+            if self._token_counts[token] <= 0:
+                del self._token_counts[token]
+                for gram in trigrams(token):
+                    self._trigrams[gram].discard(token)
+
+    def sync(self):
+        """Catch up with changes published by any worker."""
+        version = current_version()
+        if version == self.version:
+            return
+        with self._lock:
+            if version == self.version:
+                return
+            behind = version - self.version if self.version is not None else None
+            if behind is None or behind < 0 or behind > MAX_REPLAY:
+                self.load()
+                return
+            change_keys = [CHANGE_KEY % v for v in range(self.version + 1, version + 1)]
+            changes = cache.get_many(change_keys)
+            if len(changes) < len(change_keys):
+                self.load()
+                return
+            product_ids = set()
+            for ids in changes.values():
+                product_ids.update(ids)
+            self.apply_changes(product_ids)
+            self.version = version
+
+    # Lookup
+
+    def _matches(self, prefix):
+        """Map product id -> best source for keys starting with ``prefix``."""
+        matches = {}
+        position = bisect_left(self._keys, (prefix,))
+        keys = self._keys
+        while position < len(keys) and keys[position][0].startswith(prefix):
+            token, product_id, source = keys[position]
+            if source < matches.get(product_id, SOURCE_FARM + 1):
+                matches[product_id] = source
+            position += 1
+        return matches
+
+    def suggest(self, query, limit=10):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        self.sync()
+
+        with self._lock:
+            candidates = None
+            for term in terms:
+                matches = self._matches(term)
+                if candidates is None:
+                    candidates = matches
+                else:
+                    candidates = {
+                        product_id: max(source, matches[product_id])
+                        for product_id, source in candidates.items()
+                        if product_id in matches
+                    }
+                if not candidates:
+                    return []
+
+            phrase = ' '.join(terms)
+            entries = self._entries
+
+            def rank(item):
+                product_id, source = item
+                entry = entries[product_id]
+                starts = entry.name.lower().startswith(phrase)
+                return (source, not starts, -entry.popularity, len(entry.name), entry.name)
+
+            best = heapq.nsmallest(limit, candidates.items(), key=rank)
+            return [entries[product_id] for product_id, source in best]
+
+    # Spelling
+
+    def _has_prefix(self, prefix):
+        position = bisect_left(self._keys, (prefix,))
+        return position < len(self._keys) and self._keys[position][0].startswith(prefix)
+
+    def similar_tokens(self, term, threshold, limit=5):
+        """Known tokens most similar to ``term``, best first.
+
+        Similarity is shared trigrams over the union of both trigram sets,
+        as in pg_trgm's ``similarity()``.
+        """
+        grams = trigrams(term)
+        with self._lock:
+            shared = Counter()
+            for gram in grams:
+                shared.update(self._trigrams.get(gram, ()))
+            scored = []
+            for token, common in shared.items():
+                score = common / (len(grams) + len(trigrams(token)) - common)
+                if score >= threshold:
+                    scored.append((score, self._token_counts[token], token))
+        scored.sort(reverse=True)
+        return [token for score, count, token in scored[:limit]]
+
+    def correct(self, query, threshold):
+        """Return ``query`` with unknown terms respelled, or ``None``.
+
+        Terms that prefix-match a known token are left alone, so only
+        queries that would otherwise miss entirely are rewritten.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return None
+        self.sync()
+
+        corrected = []
+        changed = False
+        for term in terms:
+            with self._lock:
+                known = self._has_prefix(term)
+            if not known:
+                candidates = self.similar_tokens(term, threshold, limit=1)
+                if candidates:
+                    term = candidates[0]
+                    changed = True
+            corrected.append(term)
+        return ' '.join(corrected) if changed else None
+
+
+def current_version():
+    return counters.get(VERSION_KEY, 0)
+
+
+def publish_changes(product_ids):
+    """Record that ``product_ids`` changed once the current transaction commits."""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+
+    def publish():
+        version = counters.incr(VERSION_KEY)
+        if version is None:
+            # Evicted midway; try again on the next change
+            return
+        cache.set(CHANGE_KEY % version, product_ids, CHANGE_TIMEOUT)
+
+    transaction.on_commit(publish)
+
+
+index = AutocompleteIndex()
+
+
+def suggest(query, limit=10):
+    return index.suggest(query, limit)
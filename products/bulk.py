@@ -0,0 +1,313 @@
+"""
+Bulk catalog import and export for one farmer's products.
+
+Imports stream the uploaded CSV or JSON Lines file one row at a time.  Each
+row is validated with the ``ProductForm`` rules (``ProductImportForm``) and
+matched to one of the farmer's products by ``id``, or failing that by exact
+``name``; empty cells keep the product's current value.  Rows are written
+``CHUNK_SIZE`` at a time, one ``bulk_create`` and one ``bulk_update`` per
+chunk, each chunk in its own transaction.  Invalid rows are skipped and
+reported with their line number without stopping the import.
+
+Exports stream the same columns back out, so an export can be edited and
+imported again.
+
+``apply_stock_changes`` is the dashboard's batch counterpart for the fields
+that change daily: stock, price and availability.
+"""
+import codecs
+import csv
+import json
+import posixpath
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+from django.forms.models import model_to_dict
+from django.utils import timezone
+
+from .categories import all_categories
+from .forms import ProductImportForm, StockChangeForm
+from .models import Product
+from .signals import catalog_bulk_changed
+
+COLUMNS = ('id', 'name', 'description', 'category', 'price', 'stock', 'is_available')
+FIELDS = COLUMNS[1:]
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+EXTENSIONS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.json': 'jsonl',
+}
+
+CHUNK_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 200
+MAX_STOCK_CHANGES = 1000
+
+_FALSE = {'0', 'false', 'no', 'n', 'off'}
+
+
+class CatalogFileError(ValueError):
+    pass
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        # (line number, message), the first MAX_REPORTED_ERRORS of them
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def detect_format(filename):
+    return EXTENSIONS.get(posixpath.splitext(filename or '')[1].lower())
+
+
+# Reading
+
+def _clean_row(row):
+    cleaned = {}
+    for key, value in row.items():
+        if key is None:
+            # Surplus CSV cells
+            continue
+        key = key.strip().lower()
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == '':
+            continue
+        if key == 'is_available' and isinstance(value, str):
+            value = value.lower() not in _FALSE
+        cleaned[key] = value
+    return cleaned
+
+
+def read_rows(fileobj, file_format):
+    """Yield ``(line number, row, error)`` from a binary file, streaming."""
+    lines = codecs.iterdecode(fileobj, 'utf-8-sig')
+    if file_format == 'csv':
+        reader = csv.DictReader(lines)
+        if not reader.fieldnames or 'name' not in [f.strip().lower() for f in reader.fieldnames]:
+            raise CatalogFileError('The first line must name the columns, including "name".')
+        for row in reader:
+            yield reader.line_num, _clean_row(row), None
+    elif file_format == 'jsonl':
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield number, None, 'Not valid JSON.'
+                continue
+            if not isinstance(row, dict):
+                yield number, None, 'Each line must be a JSON object.'
+                continue
+            yield number, _clean_row(row), None
+    else:
+        raise CatalogFileError(f'Unsupported format: {file_format}')
+
+
+# Importing
+
+def _form_errors(form):
+    return '; '.join(
+        message if field == '__all__' else f'{field}: {message}'
+        for field, messages in form.errors.items()
+        for message in messages
+    )
+
+
+def _import_chunk(farmer, chunk, categories, result):
+    ids = {int(row['id']) for line, row in chunk if str(row.get('id', '')).isdigit()}
+    names = {row['name'] for line, row in chunk if 'id' not in row and 'name' in row}
+    by_id = {}
+    by_name = defaultdict(list)
+    for product in Product.objects.filter(farmer=farmer).filter(Q(pk__in=ids) | Q(name__in=names)):
+        by_id[product.pk] = product
+        by_name[product.name].append(product)
+
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    seen = {}
+    for line, row in chunk:
+        if 'id' in row:
+            instance = by_id.get(int(row['id'])) if str(row['id']).isdigit() else None
+            if instance is None:
+                result.add_error(line, f'You have no product with id {row["id"]}.')
+                continue
+        else:
+            matches = by_name.get(row.get('name'), [])
+            if len(matches) > 1:
+                result.add_error(line, f'Several of your products are named "{row["name"]}"; give the id of the one to update.')
+                continue
+            instance = matches[0] if matches else None
+
+        key = instance.pk if instance else row.get('name')
+        if key in seen:
+            result.add_error(line, f'Same product as line {seen[key]}.')
+            continue
+        seen[key] = line
+
+        if instance is not None:
+            data = {**model_to_dict(instance, fields=FIELDS), **row}
+        else:
+            data = {'is_available': True, **row}
+        form = ProductImportForm(data, instance=instance, categories=categories)
+        if not form.is_valid():
+            result.add_error(line, _form_errors(form))
+            continue
+
+        product = form.save(commit=False)
+        if instance is not None:
+            # bulk_update() skips auto_now
+            product.updated_at = now
+            to_update.append(product)
+        else:
+            product.farmer = farmer
+            to_create.append(product)
+
+    with transaction.atomic():
+        Product.objects.bulk_create(to_create)
+        Product.objects.bulk_update(to_update, [*FIELDS, 'updated_at'])
+        changed = [product.pk for product in to_create + to_update]
+        if changed:
+            catalog_bulk_changed.send(sender=Product, product_ids=changed)
+    result.created += len(to_create)
+    result.updated += len(to_update)
+
+
+def import_products(farmer, fileobj, file_format):
+    """Create or update ``farmer``'s products from a CSV/JSONL file.
+
+    Raises ``CatalogFileError`` if the file as a whole cannot be read;
+    problems with single rows are collected in the returned ``ImportResult``.
+    """
+    categories = all_categories()
+    result = ImportResult()
+    chunk = []
+    rows = read_rows(fileobj, file_format)
+    while True:
+        try:
+            line, row, error = next(rows)
+        except StopIteration:
+            break
+        except UnicodeDecodeError:
+            raise CatalogFileError(
+                f'The file must be UTF-8 text; stopped after {result.created + result.updated} products.'
+            )
+        if error:
+            result.add_error(line, error)
+            continue
+        chunk.append((line, row))
+        if len(chunk) >= CHUNK_SIZE:
+            _import_chunk(farmer, chunk, categories, result)
+            chunk = []
+    if chunk:
+        _import_chunk(farmer, chunk, categories, result)
+    return result
+
+
+# Batch stock/price updates
+
+def apply_stock_changes(farmer, changes):
+    """Apply ``[{id, stock, price, is_available}, ...]`` to ``farmer``'s products.
+
+    All or nothing: returns ``(updated ids, errors)`` where ``errors`` maps
+    the index of each rejected entry to its message, and nothing is written
+    unless ``errors`` is empty.  Keys left out of an entry are not changed.
+    """
+    if not isinstance(changes, list):
+        raise CatalogFileError('Expected a list of changes.')
+    if len(changes) > MAX_STOCK_CHANGES:
+        raise CatalogFileError(f'At most {MAX_STOCK_CHANGES} changes per request.')
+
+    errors = {}
+    cleaned = {}
+    for index, change in enumerate(changes):
+        if not isinstance(change, dict):
+            errors[index] = 'Expected an object.'
+            continue
+        form = StockChangeForm(change)
+        if not form.is_valid():
+            errors[index] = _form_errors(form)
+            continue
+        if form.cleaned_data['id'] in cleaned:
+            errors[index] = f'Product {form.cleaned_data["id"]} appears more than once.'
+            continue
+        cleaned[form.cleaned_data['id']] = (index, form.cleaned_data)
+
+    fields = {'updated_at'}
+    with transaction.atomic():
+        products = {
+            product.pk: product
+            for product in Product.objects.select_for_update()
+            .filter(farmer=farmer, pk__in=cleaned)
+            .only('pk', 'stock', 'price', 'is_available', 'updated_at')
+        }
+        now = timezone.now()
+        for pk, (index, data) in cleaned.items():
+            product = products.get(pk)
+            if product is None:
+                errors[index] = f'You have no product with id {pk}.'
+                continue
+            for field in data['changed']:
+                setattr(product, field, data[field])
+                fields.add(field)
+            product.updated_at = now
+        if errors:
+            return [], errors
+
+        Product.objects.bulk_update(products.values(), sorted(fields), batch_size=CHUNK_SIZE)
+        if products:
+            catalog_bulk_changed.send(sender=Product, product_ids=list(products), fields=fields)
+    return list(products), errors
+
+
+# Exporting
+
+class _Echo:
+    """File-like object handing csv.writer's output straight back."""
+
+    def write(self, value):
+        return value
+
+
+def _export_rows(queryset):
+    return queryset.order_by('pk').values_list(
+        'id', 'name', 'description', 'category__name', 'price', 'stock', 'is_available'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def export_csv(queryset):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for row in _export_rows(queryset):
+        yield writer.writerow(row)
+
+
+def export_jsonl(queryset):
+    for row in _export_rows(queryset):
+        yield json.dumps(dict(zip(COLUMNS, row)), default=str) + '\n'
+
+
+def export_products(queryset, file_format):
+    """Return an iterator over the export of ``queryset``, a line at a time."""
+    if file_format == 'csv':
+        return export_csv(queryset)
+    if file_format == 'jsonl':
+        return export_jsonl(queryset)
+    raise CatalogFileError(f'Unsupported format: {file_format}')
@@ -0,0 +1,225 @@
+"""
+Catalog generation counter and cached listing results.
+
+Anything that can change which products a listing shows, or their order,
+bumps a single catalog generation counter (see ``products.counters``).  Cached
+listing results embed the generation in their key, so one bump retires all
+of them at once without having to find or delete anything.
+
+Results are keyed on a canonical form of the request's filter parameters
+(coerced, normalized, irrelevant parameters dropped), so ``?category=3``
+and ``?category=03&utm_source=x`` share an entry.  A miss is computed by a
+single worker holding a short lock; concurrent requests for the same key
+wait for its result instead of running the same query.
+"""
+import hashlib
+import json
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.core.paginator import Page
+from django.db import transaction
+
+from . import counters
+from .pagination import KeysetPage
+
+GENERATION_KEY = 'products:catalog:generation'
+RESULT_KEY = 'products:results:%s:%s:%s'
+LOCK_SUFFIX = ':lock'
+
+RESULT_TIMEOUT = 60 * 5
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 3.0
+LOCK_POLL_INTERVAL = 0.05
+
+
+class InvalidParameter(ValueError):
+    pass
+
+
+# Generation
+
+def _initial_generation():
+    # Millisecond clock rather than 1, so a counter lost to eviction
+    # restarts above any value that might still be in cached keys
+    return time.time_ns() // 1_000_000
+
+
+def catalog_generation():
+    return counters.get_or_add(GENERATION_KEY, _initial_generation())
+
+
+def bump_catalog_generation():
+    """Retire every cached listing once the current transaction commits."""
+    # A counter evicted midway is not bumped; the next reader starts a new generation
+    transaction.on_commit(lambda: counters.incr(GENERATION_KEY, initial=_initial_generation()))
+
+
+# Parameter canonicalization
+
+def text(value):
+    return ' '.join(value.lower().split())
+
+
+def integer(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise InvalidParameter(value)
+
+
+def number(value):
+    try:
+        return float(value)
+    except ValueError:
+        raise InvalidParameter(value)
+
+
+def decimal(value):
+    try:
+        value = Decimal(value)
+    except InvalidOperation:
+        raise InvalidParameter(value)
+    if not value.is_finite():
+        raise InvalidParameter(value)
+    return str(value.normalize())
+
+
+def flag(value):
+    return True
+
+
+def canonical_params(query, coercers):
+    """Return the sorted ``(name, value)`` pairs of ``query`` that matter.
+
+    ``coercers`` maps each relevant parameter to a function normalizing its
+    value; empty values and parameters not listed are dropped.  Raises
+    ``InvalidParameter`` for values a coercer rejects.
+    """
+    params = []
+    for name, coerce in coercers.items():
+        value = query.get(name)
+        if value is None or value.strip() == '':
+            continue
+        params.append((name, coerce(value.strip())))
+    return sorted(params)
+
+
+def result_key(namespace, params):
+    digest = hashlib.sha1(
+        json.dumps(params, separators=(',', ':'), default=str).encode()
+    ).hexdigest()
+    return RESULT_KEY % (catalog_generation(), namespace, digest)
+
+
+# Single-flight lookup
+
+def get_or_compute(key, compute, timeout=RESULT_TIMEOUT):
+    """Return the cached value for ``key``, computing it at most once at a time.
+
+    ``compute`` must return a picklable value other than ``None``.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = key + LOCK_SUFFIX
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    # Someone else is computing it; wait for their result
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+    # The holder is slow or died; answer this request without caching
+    return compute()
+
+
+# Listing views
+
+class CachedResultsMixin:
+    """ListView mixin caching each page's ordered product ids.
+
+    Subclasses list the GET parameters that affect their results in
+    ``result_cache_params`` (name -> coercer above).  A hit costs one cache
+    read plus one primary-key query for the page's products; requests with
+    parameters that fail to coerce are served uncached, exactly as before.
+    Per-row annotations named in ``result_cache_annotations`` are carried
+    along with the ids.
+    """
+    result_cache_params = {}
+    result_cache_annotations = ('distance_km',)
+    result_cache_select_related = ('farmer__user', 'category')
+
+    def get_result_cache_params(self):
+        return canonical_params(self.request.GET, self.result_cache_params)
+
+    def get_result_cache_key(self):
+        try:
+            params = self.get_result_cache_params()
+        except InvalidParameter:
+            return None
+        return result_key(type(self).__name__, params)
+
+    def paginate_queryset(self, queryset, page_size):
+        key = self.get_result_cache_key()
+        if key is None:
+            return super().paginate_queryset(queryset, page_size)
+        entry = get_or_compute(key, lambda: self._page_entry(queryset, page_size))
+        return self._restore_page(entry, page_size)
+
+    def _page_entry(self, queryset, page_size):
+        paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+        products = list(object_list)
+        cursor_page = getattr(self, 'cursor_page', None)
+        return {
+            'ids': [product.pk for product in products],
+            'annotations': {
+                name: [getattr(product, name) for product in products]
+                for name in self.result_cache_annotations
+                if products and hasattr(products[0], name)
+            },
+            'count': paginator.count if paginator is not None else None,
+            'number': page.number if paginator is not None else None,
+            'cursor_page': (
+                cursor_page.next_cursor,
+                cursor_page.previous_cursor,
+                cursor_page.estimated_count,
+            ) if cursor_page is not None else None,
+            'next_cursor': getattr(self, 'next_cursor', None),
+        }
+
+    def _restore_page(self, entry, page_size):
+        by_id = self.model._default_manager.select_related(
+            *self.result_cache_select_related
+        ).in_bulk(entry['ids'])
+        products = [by_id[pk] for pk in entry['ids'] if pk in by_id]
+        for name, values in entry['annotations'].items():
+            for pk, value in zip(entry['ids'], values):
+                if pk in by_id:
+                    setattr(by_id[pk], name, value)
+
+        self.next_cursor = entry['next_cursor']
+        if entry['cursor_page'] is not None:
+            page = KeysetPage(products, *entry['cursor_page'])
+            self.cursor_page = page
+            return (None, page, products, False)
+
+        self.cursor_page = None
+        paginator = self.get_paginator(
+            [], page_size, orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty(),
+        )
+        paginator.count = entry['count']
+        page = Page(products, entry['number'], paginator)
+        return (paginator, page, products, page.has_other_pages())
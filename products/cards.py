@@ -0,0 +1,66 @@
+"""
+Cached product-card fragments for listing pages.
+
+A card's cache key carries everything its markup depends on: the product
+id, its ``updated_at`` (any ``save()``), its ``card_version`` (bumped by
+UPDATEs that bypass ``save()``, such as review aggregates and farmer
+edits), the card variant and whether the viewer gets an "Add to Cart"
+button.  Stale fragments are therefore never invalidated, just no longer
+looked up, and a page's cards come back from one ``get_many``.
+"""
+from django.core.cache import cache
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CARD_TEMPLATES = {
+    'list': 'products/cards/list.html',
+    'search': 'products/cards/search.html',
+    'farmer': 'products/cards/farmer.html',
+}
+
+# Part of every key; bump when the card templates change
+CARD_TEMPLATE_VERSION = 2
+CARD_TIMEOUT = 60 * 60 * 24
+
+
+def card_key(product, variant, show_cart):
+    key = 'products:card:%d:%s:%d:%d:%d:%s' % (
+        CARD_TEMPLATE_VERSION,
+        variant,
+        show_cart,
+        product.pk,
+        product.card_version,
+        product.updated_at.timestamp() * 1e6,
+    )
+    # Distance-annotated listings (see NearbyFilterMixin) print it on the card
+    distance = getattr(product, 'distance_km', None)
+    if distance is not None:
+        key += ':%.1f' % distance
+    return key
+
+
+def render_cards(products, variant, show_cart=False):
+    """Return the concatenated card markup for ``products``."""
+    template = CARD_TEMPLATES[variant]
+    products = list(products)
+    keys = [card_key(product, variant, show_cart) for product in products]
+    cached = cache.get_many(keys)
+
+    fragments = []
+    missing = {}
+    for key, product in zip(keys, products):
+        fragment = cached.get(key)
+        if fragment is None:
+            fragment = render_to_string(template, {'product': product, 'show_cart': show_cart})
+            missing[key] = fragment
+        fragments.append(fragment)
+
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+    return mark_safe(''.join(fragments))
+
+
+def bump_card_versions(queryset):
+    """Retire the cached cards of every product in ``queryset``."""
+    return queryset.update(card_version=F('card_version') + 1)
@@ -0,0 +1,79 @@
+"""
+Per-process category registry.
+
+Categories change rarely but are read on nearly every page (navigation,
+listing filters, the product form), so each worker keeps them in memory,
+ordered by name, with ``product_count`` set to the number of available
+products in each.
+
+Workers stay in step through a shared version counter, as in
+``products.autocomplete``: anything that changes a category or which
+products are available in it bumps the counter, and a worker that sees a
+new version on its next read reloads everything with one grouped query.
+"""
+import threading
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from . import counters
+from .models import Category
+
+VERSION_KEY = 'products:categories:version'
+
+
+def current_version():
+    return counters.get(VERSION_KEY, 0)
+
+
+def bump_version():
+    """Make every worker reload its registry once the current transaction commits."""
+    # A counter evicted midway is not bumped; readers see version 0 and reload
+    transaction.on_commit(lambda: counters.incr(VERSION_KEY))
+
+
+class CategoryRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._categories = []
+        self._by_id = {}
+        self.version = None
+
+    def load(self):
+        version = current_version()
+        categories = list(
+            Category.objects.annotate(
+                product_count=Count('product', filter=Q(product__is_available=True))
+            ).order_by('name')
+        )
+        self._categories = categories
+        self._by_id = {category.pk: category for category in categories}
+        self.version = version
+
+    def sync(self):
+        version = current_version()
+        if version == self.version:
+            return
+        with self._lock:
+            if version != self.version:
+                self.load()
+
+    def all(self):
+        """Every category, by name, each with ``product_count``."""
+        self.sync()
+        return self._categories
+
+    def get(self, pk):
+        self.sync()
+        return self._by_id.get(pk)
+
+
+registry = CategoryRegistry()
+
+
+def all_categories():
+    return registry.all()
+
+
+def get_category(pk):
+    return registry.get(pk)
@@ -0,0 +1,6 @@
+from .categories import all_categories
+
+
+def categories(request):
+    # Templates call it on first use, so pages without the menu skip the sync
+    return {'nav_categories': all_categories}
@@ -0,0 +1,83 @@
+"""
+Counters every worker process can see.
+
+Version stamps (the catalog generation, the autocomplete and category
+versions, per-customer cart versions) are bumped by one worker and must
+reach all the others.  With ``SHARED_CACHE`` (a ``REDIS_URL`` is set) they
+live in the shared cache.  Without it, ``CACHES['default']`` is private to
+each process, where a bump would never be seen by the other workers, so
+counters are kept in the ``SharedCounter`` table instead: one indexed read
+per lookup and an atomic ``UPDATE ... SET value = value + n`` per bump.
+Anything cached under a version can stay in the per-process cache either
+way, since nobody looks it up once the version moves on.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import SharedCounter
+
+
+def in_cache():
+    return getattr(settings, 'SHARED_CACHE', False)
+
+
+def get(name, default=None):
+    if in_cache():
+        return cache.get(name, default)
+    value = SharedCounter.objects.filter(name=name).values_list('value', flat=True).first()
+    return default if value is None else value
+
+
+def get_many(names):
+    """``{name: value}`` for those of ``names`` that exist."""
+    if in_cache():
+        return cache.get_many(names)
+    return dict(SharedCounter.objects.filter(name__in=names).values_list('name', 'value'))
+
+
+def add(name, value):
+    """Start ``name`` at ``value`` unless it exists; returns whether it did."""
+    if in_cache():
+        return cache.add(name, value, timeout=None)
+    try:
+        with transaction.atomic():
+            SharedCounter.objects.create(name=name, value=value)
+    except IntegrityError:
+        return False
+    return True
+
+
+def get_or_add(name, initial):
+    """The value of ``name``, started at ``initial`` if it does not exist yet."""
+    value = get(name)
+    if value is None:
+        add(name, initial)
+        value = get(name, initial)
+    return value
+
+
+def incr(name, delta=1, initial=None):
+    """Add ``delta`` to ``name`` and return the new value.
+
+    A counter that does not exist yet starts at ``initial`` (by default
+    ``delta``).  Returns ``None`` if a cached counter was evicted midway.
+    """
+    initial = delta if initial is None else initial
+    if in_cache():
+        if cache.add(name, initial, timeout=None):
+            return initial
+        try:
+            return cache.incr(name, delta)
+        except ValueError:
+            return None
+
+    with transaction.atomic():
+        # The row stays locked until commit, so the value read back is ours
+        if SharedCounter.objects.filter(name=name).update(value=F('value') + delta):
+            return get(name)
+    if add(name, initial):
+        return initial
+    # Someone else added it first
+    return incr(name, delta, initial)
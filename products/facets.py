@@ -0,0 +1,76 @@
+"""
+Facet counts for the advanced search sidebar.
+
+All counts come from one grouped aggregate over the filtered result set:
+rows are grouped by category and every other facet (price buckets, in stock,
+attribute tags) is a conditional COUNT in the same SELECT, summed across the
+category rows afterwards.
+
+The result set is taken without the category filter, so every category
+shows how many products it would have under the other filters.  With a
+category selected, only that category's row goes into the other facets.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, F, Q
+
+from .tags import RULES, tag_filter
+
+# (label, min price inclusive, max price exclusive)
+PRICE_BUCKETS = (
+    ('Under $5', None, Decimal('5')),
+    ('$5 - $10', Decimal('5'), Decimal('10')),
+    ('$10 - $25', Decimal('10'), Decimal('25')),
+    ('$25 - $50', Decimal('25'), Decimal('50')),
+    ('$50 & up', Decimal('50'), None),
+)
+
+
+def _bucket_filter(low, high):
+    condition = Q()
+    if low is not None:
+        condition &= Q(price__gte=low)
+    if high is not None:
+        condition &= Q(price__lt=high)
+    return condition
+
+
+def compute_facets(queryset, category_id=None):
+    """Return facet counts for ``queryset`` using a single query.
+
+    ``queryset`` must not be filtered on category; ``category_id`` is the
+    selected category, if any, and limits every facet but the categories.
+    """
+    aggregates = {
+        'total': Count('id'),
+        'in_stock': Count('id', filter=Q(stock__gt=F('reserved_stock'))),
+    }
+    for slug, name, pattern in RULES:
+        aggregates[f'tag_{slug}'] = Count('id', filter=tag_filter(slug))
+    for position, (label, low, high) in enumerate(PRICE_BUCKETS):
+        aggregates[f'price_{position}'] = Count('id', filter=_bucket_filter(low, high))
+
+    rows = queryset.order_by().values('category_id').annotate(**aggregates)
+
+    facets = {
+        'total': 0,
+        'in_stock': 0,
+        'categories': {},
+        'tags': {slug: 0 for slug, name, pattern in RULES},
+        'price_buckets': [
+            {'label': label, 'min': low, 'max': high, 'count': 0}
+            for label, low, high in PRICE_BUCKETS
+        ],
+    }
+    for row in rows:
+        facets['categories'][row['category_id']] = row['total']
+        if category_id is not None and row['category_id'] != category_id:
+            continue
+        facets['total'] += row['total']
+        facets['in_stock'] += row['in_stock']
+        for slug in facets['tags']:
+            facets['tags'][slug] += row[f'tag_{slug}']
+        for position, bucket in enumerate(facets['price_buckets']):
+            bucket['count'] += row[f'price_{position}']
+    facets['organic'] = facets['tags']['organic']
+    return facets
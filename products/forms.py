@@ -1,4 +1,5 @@
 from django import forms
+from .categories import all_categories
 from .models import Product, Category
 
 class ProductForm(forms.ModelForm):
@@ -14,7 +15,84 @@ class ProductForm(forms.ModelForm):
             'image': forms.FileInput(attrs={'class': 'form-control'}),
         }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, categories=None, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['category'].queryset = Category.objects.all()
-        self.fields['category'].empty_label = "Select a category"
+        self.fields['category'] = CategoryLookupField(
+            all_categories() if categories is None else categories,
+            empty_label="Select a category",
+            widget=self._meta.widgets['category'],
+        )
+
+
+class CategoryLookupField(forms.ModelChoiceField):
+    """Category by id or (case-insensitive) name from a preloaded list.
+
+    Choices and validation both come from ``categories`` (normally the
+    category registry), so the field never queries the database.
+    """
+
+    def __init__(self, categories, **kwargs):
+        self.categories = list(categories)
+        self.lookup = {}
+        for category in self.categories:
+            self.lookup[str(category.pk)] = category
+            self.lookup[category.name.lower()] = category
+        super().__init__(queryset=Category.objects.none(), **kwargs)
+
+    def _get_choices(self):
+        choices = [(category.pk, str(category)) for category in self.categories]
+        if self.empty_label is not None:
+            choices.insert(0, ('', self.empty_label))
+        return choices
+
+    choices = property(_get_choices, forms.ChoiceField._set_choices)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, Category):
+            value = value.pk
+        key = str(value).strip()
+        category = self.lookup.get(key) or self.lookup.get(key.lower())
+        if category is None:
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice'
+            )
+        return category
+
+
+class ProductImportForm(ProductForm):
+    """ProductForm rules for one row of a bulk import (no image upload)."""
+
+    class Meta(ProductForm.Meta):
+        fields = ['name', 'description', 'category', 'price', 'stock', 'is_available']
+
+
+class CatalogImportForm(forms.Form):
+    FORMAT_CHOICES = (
+        ('', 'Detect from file name'),
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    )
+
+    file = forms.FileField(widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,.jsonl,.json'}))
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False,
+                               widget=forms.Select(attrs={'class': 'form-control'}))
+
+
+class StockChangeForm(forms.Form):
+    """One ``{id, stock, price, is_available}`` entry of a batch update."""
+
+    id = forms.IntegerField()
+    stock = forms.IntegerField(min_value=0, required=False)
+    price = forms.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    is_available = forms.NullBooleanField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Keys that were sent, so a missing key is left alone rather than cleared
+        cleaned_data['changed'] = [
+            field for field in ('stock', 'price', 'is_available')
+            if self.data.get(field) is not None and cleaned_data.get(field) is not None
+        ]
+        return cleaned_data
@@ -0,0 +1,54 @@
+"""
+Typo-tolerant fallback for searches that found nothing.
+
+Callers run their normal search first and only come here on zero hits, so
+well-spelled queries never pay for fuzzy matching.
+
+"Did you mean" respells unknown query terms against the vocabulary of the
+in-process autocomplete index (trigram similarity, no database access).
+The fallback result set comes from pg_trgm word similarity over product and
+farm names on PostgreSQL (GIN trigram indexed), and elsewhere from
+re-running the normal search with the respelled query.
+"""
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections
+from django.db.models import FloatField, Q
+from django.db.models.functions import Coalesce, Greatest
+
+from . import autocomplete
+from .search import search_products
+
+# Same default cut-off as pg_trgm's similarity_threshold
+SIMILARITY_THRESHOLD = 0.3
+
+
+def did_you_mean(query):
+    """Return a respelled ``query`` if any of its terms look misspelled."""
+    return autocomplete.index.correct(query, SIMILARITY_THRESHOLD)
+
+
+def fuzzy_search(queryset, query):
+    """Return ``(queryset, suggestion)`` for a query that had no exact hits.
+
+    ``queryset`` is filtered to close matches and annotated with
+    ``search_rank``; ``suggestion`` is the respelled query, or ``None``.
+    """
+    suggestion = did_you_mean(query)
+
+    if connections[queryset.db].vendor == 'postgresql':
+        # <% (trigram_word_similar) is the operator the GIN trigram indexes serve
+        matches = queryset.filter(
+            Q(name__trigram_word_similar=query) |
+            Q(farmer__farm_name__trigram_word_similar=query)
+        ).annotate(
+            search_rank=Greatest(
+                TrigramWordSimilarity(query, 'name'),
+                Coalesce(TrigramWordSimilarity(query, 'farmer__farm_name'), 0.0),
+                output_field=FloatField(),
+            )
+        ).order_by('-search_rank', '-created_at')
+        return matches, suggestion
+
+    if suggestion:
+        return search_products(queryset, suggestion), suggestion
+    return queryset.none(), None
@@ -0,0 +1,234 @@
+"""
+Resized WebP/JPEG derivatives of uploaded images.
+
+Each registered image field (``SOURCES``) gets ``thumbnail``, ``card`` and
+``detail`` renditions, written through the field's own storage (local media
+or S3) under ``derivatives/<original name>/``.  What exists is recorded in a
+``<field>_variants`` JSON column on the same row, together with the name of
+the original it was made from, so templates can build a srcset without
+touching storage and fall back to the original while a new upload is still
+being processed.
+
+Generation runs after the upload's transaction commits, on a small thread
+pool (Pillow releases the GIL while resizing and encoding), so requests
+never wait for it.  ``generate_image_variants`` backfills existing uploads.
+"""
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# (app_label.Model, image field); the variants live in '<field>_variants'
+SOURCES = (
+    ('products.Product', 'image'),
+    ('products.ProductImage', 'image'),
+    ('accounts.User', 'profile_picture'),
+)
+
+# Name -> bounding box; images are scaled down to fit, never up
+VARIANTS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'detail': (1200, 1200),
+}
+
+# Extension -> (Pillow format, save options)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+DERIVATIVE_ROOT = 'derivatives'
+
+_executor = None
+
+
+def variants_field(field_name):
+    return field_name + '_variants'
+
+
+def variants_for(fieldfile):
+    """Return the stored variants of ``fieldfile``, or ``{}`` if not ready.
+
+    Variants made from a previous upload do not count.
+    """
+    if not fieldfile:
+        return {}
+    record = getattr(fieldfile.instance, variants_field(fieldfile.field.name), None) or {}
+    if record.get('source') != fieldfile.name:
+        return {}
+    return record.get('variants', {})
+
+
+def needs_variants(instance, field_name):
+    """True if the stored variants do not match the current upload."""
+    fieldfile = getattr(instance, field_name)
+    record = getattr(instance, variants_field(field_name)) or {}
+    return (fieldfile.name or '') != record.get('source', '')
+
+
+# Rendering
+
+def _derivative_name(source_name, variant, extension):
+    root, _ = posixpath.splitext(source_name)
+    return posixpath.join(DERIVATIVE_ROOT, root, '%s.%s' % (variant, extension))
+
+
+def _load(fieldfile):
+    fieldfile.open('rb')
+    try:
+        image = Image.open(fieldfile)
+        image.load()
+    finally:
+        fieldfile.close()
+    # Phone uploads carry their rotation in EXIF
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def _flatten(image):
+    # JPEG has no alpha channel; composite onto white instead of black
+    if image.mode != 'RGBA':
+        return image
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def _encode(image, extension):
+    image_format, options = FORMATS[extension]
+    if image_format == 'JPEG':
+        image = _flatten(image)
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def render_variants(fieldfile):
+    """Write every variant of ``fieldfile`` to its storage; return the record."""
+    storage = fieldfile.storage
+    original = _load(fieldfile)
+    variants = {}
+    for variant, box in VARIANTS.items():
+        image = original.copy()
+        image.thumbnail(box, Image.LANCZOS)
+        entry = {'width': image.width, 'height': image.height}
+        for extension in FORMATS:
+            name = _derivative_name(fieldfile.name, variant, extension)
+            if storage.exists(name):
+                # save() would pick a new name rather than overwrite
+                storage.delete(name)
+            entry[extension] = storage.save(name, ContentFile(_encode(image, extension)))
+        variants[variant] = entry
+    return {'source': fieldfile.name, 'variants': variants}
+
+
+def delete_variants(storage, record):
+    for entry in (record or {}).get('variants', {}).values():
+        for extension in FORMATS:
+            if entry.get(extension):
+                storage.delete(entry[extension])
+
+
+# Generation
+
+def generate(model, pk, field_name):
+    """Bring the variants of one row's image up to date.
+
+    Returns True if the row was updated.  A row whose image changed again
+    meanwhile is left for the job scheduled by that change.
+    """
+    instance = model._default_manager.filter(pk=pk).first()
+    if instance is None:
+        return False
+    fieldfile = getattr(instance, field_name)
+    column = variants_field(field_name)
+    previous = getattr(instance, column) or {}
+
+    record = render_variants(fieldfile) if fieldfile else {}
+    changes = {column: record}
+    if hasattr(model, 'card_version'):
+        # Cached product cards embed the image URLs; see products.cards
+        changes['card_version'] = F('card_version') + 1
+    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+        # update() skips auto_now; API clients sync on updated_at
+        changes['updated_at'] = timezone.now()
+    if fieldfile:
+        unchanged = Q(**{field_name: fieldfile.name})
+    else:
+        unchanged = Q(**{field_name: ''}) | Q(**{field_name + '__isnull': True})
+    updated = model._default_manager.filter(unchanged, pk=pk).update(**changes)
+
+    if not updated:
+        delete_variants(fieldfile.storage, record)
+    elif previous.get('source') and previous.get('source') != record.get('source'):
+        delete_variants(fieldfile.storage, previous)
+    return bool(updated)
+
+
+def _run(label, pk, field_name):
+    close_old_connections()
+    try:
+        generate(apps.get_model(label), pk, field_name)
+    except Exception:
+        logger.exception('Could not generate image variants for %s %s', label, pk)
+    finally:
+        # Worker threads are not request-scoped; don't leak their connections
+        connections.close_all()
+
+
+def _cleanup(storage, record):
+    try:
+        delete_variants(storage, record)
+    except Exception:
+        logger.exception('Could not delete image variants of %s', record.get('source'))
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2),
+            thread_name_prefix='image-variants',
+        )
+    return _executor
+
+
+def schedule(instance, field_name):
+    """Generate ``instance``'s variants in the background after commit."""
+    label = instance._meta.label
+    pk = instance.pk
+    transaction.on_commit(lambda: _get_executor().submit(_run, label, pk, field_name))
+
+
+def schedule_cleanup(instance, field_name):
+    """Delete a removed row's variant files in the background after commit."""
+    storage = getattr(instance, field_name).storage
+    record = getattr(instance, variants_field(field_name))
+    if record:
+        transaction.on_commit(lambda: _get_executor().submit(_cleanup, storage, record))
+
+
+def pending(label, field_name, force=False):
+    """Yield ``(model, pk)`` for rows of ``label`` whose variants are missing or stale."""
+    model = apps.get_model(label)
+    rows = model._default_manager.exclude(**{field_name: ''}).exclude(
+        **{'%s__isnull' % field_name: True}
+    ).only('pk', field_name, variants_field(field_name))
+    for instance in rows.iterator(chunk_size=500):
+        if force or needs_variants(instance, field_name):
+            yield model, instance.pk
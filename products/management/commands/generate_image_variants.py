@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from products import images
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/JPEG variants for uploaded images that lack them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Regenerate variants that are already up to date',
+        )
+
+    def handle(self, *args, **options):
+        generated = failed = 0
+        for label, field_name in images.SOURCES:
+            for model, pk in images.pending(label, field_name, force=options['force']):
+                try:
+                    if images.generate(model, pk, field_name):
+                        generated += 1
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'{label} {pk}: {exc}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated variants for {generated} images ({failed} failed).'
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import FarmerProfile
+from products import bulk
+
+
+class Command(BaseCommand):
+    help = "Create or update a farmer's products from a CSV or JSON Lines file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Username of the farmer who owns the products')
+        parser.add_argument('path', help='CSV or JSON Lines file to import')
+        parser.add_argument(
+            '--format', choices=sorted(bulk.FORMATS),
+            help='File format (default: detected from the file name)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            farmer = FarmerProfile.objects.get(user__username=options['username'])
+        except FarmerProfile.DoesNotExist:
+            raise CommandError(f'No farmer named {options["username"]}.')
+        file_format = options['format'] or bulk.detect_format(options['path'])
+        if file_format is None:
+            raise CommandError('Could not tell the format from the file name; pass --format.')
+
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                result = bulk.import_products(farmer, fileobj, file_format)
+        except (OSError, bulk.CatalogFileError) as exc:
+            raise CommandError(str(exc))
+
+        for line, message in result.errors:
+            self.stderr.write(f'line {line}: {message}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result.created} and updated {result.updated} products '
+            f'({result.error_count} rows skipped).'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from products import ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute stored product rating aggregates from ProductReview'
+
+    def handle(self, *args, **options):
+        checked, fixed = ratings.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} products, corrected {fixed}.'
+        ))
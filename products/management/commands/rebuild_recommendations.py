@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from products import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Recompute "customers also bought" recommendations from order history'
+
+    def handle(self, *args, **options):
+        rows = recommendations.rebuild_recommendations()
+        self.stdout.write(self.style.SUCCESS(f'Stored {rows} recommendations.'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from products import search
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search document for every product'
+
+    def handle(self, *args, **options):
+        total = search.reindex_queryset(Product.objects.all())
+        self.stdout.write(self.style.SUCCESS(f'Reindexed {total} products.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from products import tags
+from products.cache import bump_catalog_generation
+
+
+class Command(BaseCommand):
+    help = 'Re-apply the attribute tag rules to every product and farmer'
+
+    def handle(self, *args, **options):
+        product_count, farmer_count = tags.retag_all()
+        bump_catalog_generation()
+        self.stdout.write(self.style.SUCCESS(
+            f'Assigned {product_count} product tags and {farmer_count} farmer tags.'
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from products import popularity
+
+
+class Command(BaseCommand):
+    help = 'Decay product popularity scores (run every few minutes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute all scores from the full order history',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            processed = popularity.rebuild_popularity()
+            self.stdout.write(self.style.SUCCESS(f'Processed {processed} order lines.'))
+        else:
+            decayed = popularity.refresh_popularity()
+            self.stdout.write(self.style.SUCCESS(f'Decayed {decayed} product scores.'))
@@ -0,0 +1,84 @@
+# Generated by Django 4.2 on 2026-10-16 20:54
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+# Frozen copy of products.search as of this migration; later changes to the
+# documents are applied with the rebuild_search_index command instead
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'products_product_fts'
+
+
+def _weighted_fields(product):
+    farmer = product.farmer
+    return (
+        (product.name, 'A'),
+        (' '.join(filter(None, [product.category.name, farmer.farm_name, farmer.user.username])), 'B'),
+        (farmer.farming_methods, 'C'),
+        (product.description, 'D'),
+    )
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+            'USING fts5(document, tokenize="porter unicode61")'
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def backfill_search_documents(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    vendor = schema_editor.connection.vendor
+    products = Product.objects.select_related('category', 'farmer__user').order_by('pk')
+    fts_rows = []
+    for product in products.iterator(chunk_size=500):
+        fields = _weighted_fields(product)
+        document = '\n'.join(text for text, weight in fields if text)
+        updates = {'search_document': document}
+        if vendor == 'postgresql':
+            vector = None
+            for text, weight in fields:
+                part = SearchVector(models.Value(text or ''), weight=weight, config=SEARCH_CONFIG)
+                vector = part if vector is None else vector + part
+            updates['search_vector'] = vector
+        Product.objects.filter(pk=product.pk).update(**updates)
+        fts_rows.append((product.pk, document))
+
+    if vendor == 'sqlite' and fts_rows:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {FTS_TABLE}(rowid, document) VALUES (%s, %s)', fts_rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_add_farm_name_only'),
+        ('products', '0002_alter_product_options_alter_product_category_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-16 21:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('co_purchases', models.PositiveIntegerField(default=0)),
+                ('score', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='products.product')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='productrecommendation',
+            index=models.Index(fields=['product', '-score'], name='product_recommendation_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='productrecommendation',
+            unique_together={('product', 'recommended')},
+        ),
+    ]
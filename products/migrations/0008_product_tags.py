@@ -0,0 +1,84 @@
+# Generated by Django 4.2 on 2026-10-16 21:07
+
+import re
+
+from django.db import migrations, models
+
+# Frozen copy of the rules in products.tags as of this migration; later
+# rule changes are applied with the retag_products command instead
+_NEGATION = r'(?<!\bnon[\s-])(?<!\bnot\s)(?<!\bno\s)'
+
+RULES = (
+    ('organic', 'Organic',
+     _NEGATION + r'\borganic(?:ally)?\b'),
+    ('pesticide-free', 'Pesticide-free',
+     r'\b(?:pesticide|spray|chemical)[\s-]?free\b'
+     r'|\b(?:no|without)\s+(?:\w+\s+)?(?:pesticides?|sprays?|chemicals)\b'
+     r'|\bunsprayed\b'),
+    ('grass-fed', 'Grass-fed',
+     r'\bgrass[\s-]?(?:fed|finished)\b|\bpasture[\s-]?raised\b'),
+    ('free-range', 'Free-range',
+     r'\bfree[\s-]?range\b'),
+    ('non-gmo', 'Non-GMO',
+     r'\bnon[\s-]?gmo\b|\bgmo[\s-]?free\b'),
+    ('hydroponic', 'Hydroponic',
+     r'\bhydroponic(?:ally|s)?\b'),
+    ('sustainable', 'Sustainable',
+     _NEGATION + r'\bsustainabl[ey]\b'),
+)
+
+
+def extract_tags(*texts):
+    text = '\n'.join(t for t in texts if t)
+    return {slug for slug, name, pattern in RULES if re.search(pattern, text, re.IGNORECASE)}
+
+
+def backfill_tags(apps, schema_editor):
+    Tag = apps.get_model('products', 'Tag')
+    Product = apps.get_model('products', 'Product')
+    FarmerProfile = apps.get_model('accounts', 'FarmerProfile')
+    Tag.objects.bulk_create([Tag(slug=slug, name=name) for slug, name, pattern in RULES])
+    ids = dict(Tag.objects.values_list('slug', 'id'))
+
+    ProductTag = Product.tags.through
+    ProductTag.objects.bulk_create([
+        ProductTag(product_id=product.pk, tag_id=ids[slug])
+        for product in Product.objects.only('pk', 'name', 'description').iterator()
+        for slug in extract_tags(product.name, product.description)
+    ], batch_size=1000)
+
+    FarmerTag = Tag.farmers.through
+    FarmerTag.objects.bulk_create([
+        FarmerTag(farmerprofile_id=farmer.pk, tag_id=ids[slug])
+        for farmer in FarmerProfile.objects.only('pk', 'farming_methods').iterator()
+        for slug in extract_tags(farmer.farming_methods)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_farmerprofile_coordinates'),
+        ('products', '0007_product_card_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('farmers', models.ManyToManyField(blank=True, related_name='method_tags', to='accounts.farmerprofile')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='tags',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='products', to='products.tag'),
+        ),
+        migrations.RunPython(backfill_tags, migrations.RunPython.noop),
+    ]
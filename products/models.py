@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from accounts.models import FarmerProfile
 
 class Category(models.Model):
@@ -13,6 +15,22 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+class Tag(models.Model):
+    """A normalized product attribute such as "organic" or "grass-fed".
+
+    Assigned by the rules in ``products.tags`` from product text and from
+    the farmer's farming methods; never edited by hand.
+    """
+    slug = models.SlugField(max_length=50, unique=True)
+    name = models.CharField(max_length=100)
+    farmers = models.ManyToManyField('accounts.FarmerProfile', blank=True, related_name='method_tags')
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
 class Product(models.Model):
     farmer = models.ForeignKey('accounts.FarmerProfile', on_delete=models.CASCADE, related_name='products')
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
@@ -25,23 +43,76 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Maintained by products.search; never edited directly
+    search_document = models.TextField(blank=True, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+    
+    # Review aggregates, maintained by products.ratings on every review write
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(default=0, editable=False)
+    
+    # Time-decayed order volume, maintained by products.popularity
+    popularity_score = models.FloatField(default=0, editable=False)
+    
+    # Attributes extracted from name/description by products.tags
+    tags = models.ManyToManyField(Tag, blank=True, related_name='products', editable=False)
+    
+    # Bumped whenever something a cached product card shows changes without
+    # touching updated_at (reviews, farmer details); see products.cards
+    card_version = models.PositiveIntegerField(default=0, editable=False)
+    
+    # Resized copies of image, written by products.images after upload
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    
+    # Units held for unpaid checkouts, maintained by orders.inventory with
+    # conditional UPDATEs; never written by save() on existing rows
+    reserved_stock = models.PositiveIntegerField(default=0, editable=False)
+    
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+            models.Index(fields=['-rating_avg', '-rating_count'], name='product_rating_idx'),
+            models.Index(fields=['-popularity_score'], name='product_popularity_idx'),
+        ]
+    
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # A row loaded before a checkout must not write back its stale hold count
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in self.get_deferred_fields()
+                and field.name != 'reserved_stock'
+            ]
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the category registry counts, see products.categories
+        row = dict(zip(field_names, values))
+        instance._loaded_listing = (row.get('category_id'), row.get('is_available'))
+        return instance
+    
+    @property
+    def available_stock(self):
+        """Stock not held for someone else's checkout."""
+        return max(self.stock - self.reserved_stock, 0)
+    
     @property
     def is_in_stock(self):
-        return self.stock > 0 and self.is_available
+        return self.available_stock > 0 and self.is_available
     
     @property
     def average_rating(self):
-        reviews = self.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / len(reviews)
-        return 0
+        return self.rating_avg
     
     @property
     def total_reviews(self):
-        return self.reviews.count()
+        return self.rating_count
 
 class ProductReview(models.Model):
     RATING_CHOICES = [
@@ -63,11 +134,58 @@ class ProductReview(models.Model):
     
     def __str__(self):
         return f'{self.customer.user.username} - {self.product.name} ({self.rating} stars)'
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored rating so an edit can be applied as a delta
+        instance._loaded_rating = dict(zip(field_names, values)).get('rating')
+        return instance
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='additional_images')
     image = models.ImageField(upload_to='products/additional/')
     alt_text = models.CharField(max_length=200, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     
     def __str__(self):
         return f"Image for {self.product.name}"
+
+class PopularityCheckpoint(models.Model):
+    """Single row: when stored popularity scores were last decayed."""
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"Popularity as of {self.last_run_at}"
+
+class ProductRecommendation(models.Model):
+    """A product bought together with ``product``, strongest first by ``score``.
+
+    ``score`` is the cosine similarity of the two products' order histories:
+    co-purchases / sqrt(orders containing product * orders containing
+    recommended).  Every co-purchased pair is kept; readers take the top
+    few.  Rebuilt by ``rebuild_recommendations`` and kept up to date as orders
+    are confirmed or cancelled; see ``products.recommendations``.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    co_purchases = models.PositiveIntegerField(default=0)
+    score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('product', 'recommended')
+        indexes = [
+            models.Index(fields=['product', '-score'], name='product_recommendation_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name} -> {self.recommended.name} ({self.score:.3f})"
+
+class SharedCounter(models.Model):
+    """A named counter every worker process can see; see ``products.counters``."""
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.name} = {self.value}"
@@ -0,0 +1,209 @@
+"""
+Keyset (cursor) pagination for product listings.
+
+Offset pagination needs a COUNT(*) plus an OFFSET that gets slower with every
+page.  A keyset page instead seeks past the last row of the previous page
+using the sort key, e.g. ``(created_at, id) < (:created_at, :id)``, so page
+400 costs the same as page 1.  Positions are handed to clients as opaque
+URL-safe tokens.
+"""
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _dump(value):
+    # Full precision: DjangoJSONEncoder would cut datetimes to milliseconds
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def estimate_count(queryset):
+    """Planner row estimate for ``queryset`` on PostgreSQL, else ``None``."""
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    try:
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, estimated_count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.estimated_count = estimated_count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """Paginate ``queryset`` by ``ordering``, which must end in a unique field.
+
+    ``ordering`` uses ``order_by()`` syntax, e.g. ``('-created_at', '-id')``.
+    Only concrete model fields are supported.
+    """
+
+    def __init__(self, queryset, per_page, ordering, estimate=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.estimate = estimate
+        self.fields = [
+            (name.lstrip('-'), name.startswith('-')) for name in self.ordering
+        ]
+
+    def encode_cursor(self, obj, direction):
+        values = [_dump(getattr(obj, name)) for name, descending in self.fields]
+        payload = json.dumps({'d': direction, 'v': values}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            direction = payload['d']
+            raw_values = payload['v']
+            if direction not in ('next', 'prev') or len(raw_values) != len(self.fields):
+                raise InvalidCursor(cursor)
+            model = self.queryset.model
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for (name, descending), value in zip(self.fields, raw_values)
+            ]
+        except (ValueError, KeyError, TypeError, ValidationError) as e:
+            raise InvalidCursor(cursor) from e
+        return direction, values
+
+    def _seek(self, values, backwards):
+        """Q selecting rows strictly after ``values`` in sort order (or before)."""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.fields, values):
+            after = descending != backwards
+            condition |= equal & Q(**{f'{name}__{"lt" if after else "gt"}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def page(self, cursor=None):
+        direction, values = ('next', None)
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+        backwards = direction == 'prev'
+
+        if backwards:
+            ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+        else:
+            ordering = list(self.ordering)
+
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, backwards))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], 'next') if rows and has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], 'prev') if rows and has_previous else None,
+            estimated_count=estimate_count(self.queryset) if self.estimate else None,
+        )
+
+
+class KeysetPaginationMixin:
+    """ListView mixin adding a ``?cursor=`` mode next to page numbers.
+
+    Without a cursor the view paginates by page number as before, but its
+    "Next" link carries a cursor, so anyone walking forward (crawlers,
+    infinite scroll) moves onto keyset pages after the first page.  Views
+    return ``None`` from ``get_keyset_ordering()`` for sorts that cannot be
+    seeked (e.g. search relevance) and stay on page numbers.
+
+    Set ``estimate_count`` to show an "about N products" line on keyset
+    pages; it costs an EXPLAIN per page, so it is off by default.
+    """
+    cursor_param = 'cursor'
+    keyset_ordering = ('-created_at', '-id')
+    estimate_count = False
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def _page_query(self, cursor):
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        params[self.cursor_param] = cursor
+        return params.urlencode()
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = self.get_keyset_ordering()
+        self.cursor_page = None
+        self.next_cursor = None
+        if ordering is None:
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = KeysetPaginator(queryset, page_size, ordering, estimate=self.estimate_count)
+
+        if self.cursor_param not in self.request.GET:
+            # Same order as the keyset pages so "Next" continues seamlessly
+            result = super().paginate_queryset(queryset.order_by(*ordering), page_size)
+            page = result[1]
+            if page.has_next() and page.object_list:
+                self.next_cursor = paginator.encode_cursor(list(page.object_list)[-1], 'next')
+            return result
+
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_param) or None)
+        except InvalidCursor:
+            page = paginator.page()
+        self.cursor_page = page
+        return (None, page, page.object_list, False)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = getattr(self, 'cursor_page', None)
+        context['cursor_page'] = page
+        if page is not None:
+            context['page_obj'] = None
+            params = self.request.GET.copy()
+            params.pop(self.cursor_param, None)
+            context['first_page_query'] = params.urlencode()
+            context['next_page_query'] = self._page_query(page.next_cursor) if page.has_next else ''
+            context['previous_page_query'] = self._page_query(page.previous_cursor) if page.has_previous else ''
+        elif getattr(self, 'next_cursor', None):
+            context['next_page_query'] = self._page_query(self.next_cursor)
+        return context
@@ -0,0 +1,116 @@
+"""
+Time-decayed product popularity.
+
+``Product.popularity_score`` is the sum of purchased quantities, each
+weighted by ``0.5 ** (age / half_life)`` where age counts from when the
+order was placed.
+
+Sales are added when an order enters a purchased status and taken back if
+it leaves one (see ``products.signals.record_purchased_order``), so late
+commits, abandoned checkouts and later cancellations are all accounted for.
+Stored scores are kept as of the checkpoint's ``last_run_at``: a sale is
+added with the weight it had at that moment, and the periodic refresh
+decays every score by the time elapsed since (one set-based UPDATE), which
+brings both up to date together.  A sale recorded while a refresh is
+running may be off by one decay step; ``rebuild_popularity`` recomputes
+everything exactly.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from orders.models import OrderItem
+from . import autocomplete
+from .cache import bump_catalog_generation
+from .models import PopularityCheckpoint, Product
+from .recommendations import PURCHASED_STATUSES
+
+# Scores that decay below this are snapped to zero so the decay UPDATE only
+# ever touches products that sold recently
+MIN_SCORE = 0.01
+
+
+def _half_life_seconds():
+    return getattr(settings, 'POPULARITY_HALF_LIFE_DAYS', 7) * 86400
+
+
+def decay_factor(elapsed):
+    seconds = max(elapsed.total_seconds(), 0)
+    return 0.5 ** (seconds / _half_life_seconds())
+
+
+def _weight(ordered_at, as_of):
+    # May exceed 1 for orders placed after as_of; the next decay evens it out
+    if as_of is None:
+        return 1.0
+    return 0.5 ** ((as_of - ordered_at).total_seconds() / _half_life_seconds())
+
+
+def record_order(order, sign):
+    """Add (``sign=1``) or take back (``sign=-1``) the quantities in ``order``."""
+    as_of = PopularityCheckpoint.objects.filter(pk=1).values_list('last_run_at', flat=True).first()
+    weight = sign * _weight(order.created_at, as_of)
+    totals = OrderItem.objects.filter(order=order).values('product_id').annotate(
+        total=Sum('quantity')
+    ).values_list('product_id', 'total').order_by('product_id')
+
+    product_ids = []
+    for product_id, total in totals:
+        Product.objects.filter(pk=product_id).update(
+            popularity_score=Greatest(F('popularity_score') + total * weight, Value(0.0))
+        )
+        product_ids.append(product_id)
+    # Typeahead and sort=popular rank on popularity
+    autocomplete.publish_changes(product_ids)
+    if product_ids:
+        bump_catalog_generation()
+
+
+def refresh_popularity(now=None):
+    """Decay stored scores up to ``now``. Returns the number of products decayed."""
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        checkpoint, _ = PopularityCheckpoint.objects.select_for_update().get_or_create(pk=1)
+
+        decayed = 0
+        if checkpoint.last_run_at:
+            factor = decay_factor(now - checkpoint.last_run_at)
+            if factor < 1:
+                decayed = Product.objects.filter(popularity_score__gte=MIN_SCORE).update(
+                    popularity_score=F('popularity_score') * factor
+                )
+                Product.objects.filter(
+                    popularity_score__gt=0, popularity_score__lt=MIN_SCORE
+                ).update(popularity_score=0)
+
+        checkpoint.last_run_at = now
+        checkpoint.save()
+    # Decay keeps the relative order, so cached listings stay valid
+    return decayed
+
+
+def rebuild_popularity(now=None):
+    """Recompute every score from the full purchase history. Returns the number of order lines."""
+    now = now or timezone.now()
+    items = OrderItem.objects.filter(
+        order__status__in=PURCHASED_STATUSES
+    ).values_list('product_id', 'quantity', 'order__created_at').order_by()
+
+    scores = {}
+    processed = 0
+    for product_id, quantity, ordered_at in items.iterator(chunk_size=5000):
+        processed += 1
+        scores[product_id] = scores.get(product_id, 0.0) + quantity * decay_factor(now - ordered_at)
+
+    with transaction.atomic():
+        PopularityCheckpoint.objects.update_or_create(pk=1, defaults={'last_run_at': now})
+        Product.objects.filter(popularity_score__gt=0).update(popularity_score=0)
+        for product_id, score in scores.items():
+            if score >= MIN_SCORE:
+                Product.objects.filter(pk=product_id).update(popularity_score=score)
+        autocomplete.publish_changes(scores.keys())
+        bump_catalog_generation()
+    return processed
@@ -0,0 +1,82 @@
+"""
+Stored review aggregates on Product.
+
+``rating_sum``/``rating_count``/``rating_avg`` are adjusted with single
+conditional UPDATEs as reviews are added, edited or deleted, so listings can
+filter and sort on ``rating_avg`` without touching ProductReview.
+"""
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
+
+from .models import Product, ProductReview
+
+REBUILD_CHUNK_SIZE = 500
+
+
+def apply_rating_delta(product_id, rating_delta, count_delta):
+    """Shift a product's rating aggregates by the given amounts."""
+    new_sum = F('rating_sum') + rating_delta
+    new_count = F('rating_count') + count_delta
+    Product.objects.filter(pk=product_id).update(
+        rating_sum=new_sum,
+        rating_count=new_count,
+        rating_avg=Coalesce(
+            Cast(new_sum, FloatField()) / NullIf(new_count, 0),
+            0.0,
+            output_field=FloatField(),
+        ),
+        # Product cards show the rating; delta sync (products.api) reads updated_at
+        card_version=F('card_version') + 1,
+        updated_at=timezone.now(),
+    )
+
+
+def recompute_product(product_id):
+    stats = ProductReview.objects.filter(product_id=product_id).aggregate(
+        total=Sum('rating'), count=Count('id')
+    )
+    total = stats['total'] or 0
+    count = stats['count']
+    Product.objects.filter(pk=product_id).update(
+        rating_sum=total,
+        rating_count=count,
+        rating_avg=total / count if count else 0,
+        card_version=F('card_version') + 1,
+        updated_at=timezone.now(),
+    )
+
+
+def rebuild_all():
+    """Recompute every product's aggregates from ProductReview.
+
+    Returns ``(checked, fixed)``.
+    """
+    stats = {
+        row['product_id']: (row['total'], row['count'])
+        for row in ProductReview.objects.values('product_id').annotate(
+            total=Sum('rating'), count=Count('id')
+        ).order_by()
+    }
+
+    now = timezone.now()
+    checked = 0
+    stale = []
+    products = Product.objects.only('id', 'rating_sum', 'rating_count', 'rating_avg')
+    for product in products.iterator(chunk_size=REBUILD_CHUNK_SIZE):
+        checked += 1
+        total, count = stats.get(product.pk, (0, 0))
+        avg = total / count if count else 0
+        if (product.rating_sum, product.rating_count, product.rating_avg) != (total, count, avg):
+            product.rating_sum, product.rating_count, product.rating_avg = total, count, avg
+            product.card_version = F('card_version') + 1
+            product.updated_at = now
+            stale.append(product)
+
+    with transaction.atomic():
+        Product.objects.bulk_update(
+            stale, ['rating_sum', 'rating_count', 'rating_avg', 'card_version', 'updated_at'],
+            batch_size=REBUILD_CHUNK_SIZE
+        )
+    return checked, len(stale)
@@ -0,0 +1,205 @@
+"""
+"Customers also bought" recommendations from order co-occurrence.
+
+The batch rebuild streams order lines grouped by order and counts, in sparse
+dictionaries, how many orders contain each product and each pair of
+products.  Pairs are scored by cosine similarity, so a bestseller that
+appears in every basket does not top every list.
+
+Every pair is stored with its exact co-purchase count; the detail page
+reads only the best few per product through the ``(product, -score)``
+index, so nothing is ever trimmed and a pair's count never restarts.
+
+When an order is confirmed its pairs are added in the background, after
+the payment's transaction commits, with one ``INSERT ... ON CONFLICT``
+upsert per ``UPSERT_BATCH_SIZE`` pairs.  When a purchased order is
+cancelled or refunded its pairs are taken back the same way, with one
+UPDATE of the order's pairs (pairs left without co-purchases are
+deleted).  Only the order's own pairs are re-scored then; a rebuild
+re-scores everything.  With more than one ``RECOMMENDATION_WORKERS`` an
+order confirmed and cancelled in quick succession may be applied out of
+order, which only a rebuild corrects.
+"""
+import logging
+import math
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import permutations
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+from django.db.models import Case, Count, F, FloatField, Value, When
+from django.db.models.functions import Cast, Sqrt
+from django.utils import timezone
+
+from orders.models import OrderItem
+from .models import ProductRecommendation
+
+logger = logging.getLogger(__name__)
+
+# Orders in these states count as purchases
+PURCHASED_STATUSES = ('confirmed', 'shipped', 'delivered')
+
+BULK_BATCH_SIZE = 1000
+UPSERT_BATCH_SIZE = 500
+
+_executor = None
+
+
+def _score(co_purchases, orders_a, orders_b):
+    if not orders_a or not orders_b:
+        return 0.0
+    return co_purchases / math.sqrt(orders_a * orders_b)
+
+
+def _baskets():
+    """Yield the set of product ids in each purchased order."""
+    lines = OrderItem.objects.filter(
+        order__status__in=PURCHASED_STATUSES
+    ).values_list('order_id', 'product_id').order_by('order_id')
+
+    current_order = None
+    basket = set()
+    for order_id, product_id in lines.iterator(chunk_size=5000):
+        if order_id != current_order:
+            if basket:
+                yield basket
+            current_order = order_id
+            basket = set()
+        basket.add(product_id)
+    if basket:
+        yield basket
+
+
+def rebuild_recommendations():
+    """Recompute the whole table from order history. Returns the row count."""
+    order_counts = Counter()
+    pair_counts = defaultdict(Counter)
+    for basket in _baskets():
+        order_counts.update(basket)
+        for a, b in permutations(basket, 2):
+            pair_counts[a][b] += 1
+
+    rows = [
+        ProductRecommendation(
+            product_id=product_id,
+            recommended_id=other,
+            co_purchases=co,
+            score=_score(co, order_counts[product_id], order_counts[other]),
+        )
+        for product_id, partners in pair_counts.items()
+        for other, co in partners.items()
+    ]
+
+    with transaction.atomic():
+        ProductRecommendation.objects.all().delete()
+        ProductRecommendation.objects.bulk_create(rows, batch_size=BULK_BATCH_SIZE)
+    return len(rows)
+
+
+def record_order(order_id, sign=1):
+    """Add the product pairs of a newly purchased order in one upsert per batch.
+
+    With ``sign=-1`` the pairs of an order that is no longer purchased are
+    taken back instead.
+    """
+    product_ids = set(OrderItem.objects.filter(order_id=order_id).values_list('product_id', flat=True))
+    if len(product_ids) < 2:
+        return
+
+    order_counts = dict(
+        OrderItem.objects.filter(
+            product_id__in=product_ids,
+            order__status__in=PURCHASED_STATUSES,
+        ).values('product_id').annotate(
+            orders=Count('order_id', distinct=True)
+        ).values_list('product_id', 'orders').order_by()
+    )
+    if sign < 0:
+        _remove_pairs(product_ids, order_counts)
+        return
+
+    # Inserted with the score of a single co-purchase; an existing pair
+    # scales that by its new count, which keeps the same denominator
+    now = timezone.now()
+    pairs = [
+        (a, b, 1, _score(1, order_counts.get(a, 0), order_counts.get(b, 0)), now)
+        for a, b in sorted(permutations(product_ids, 2))
+    ]
+    table = connection.ops.quote_name(ProductRecommendation._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(pairs), UPSERT_BATCH_SIZE):
+            batch = pairs[start:start + UPSERT_BATCH_SIZE]
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (product_id, recommended_id, co_purchases, score, updated_at)
+                VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(batch))}
+                ON CONFLICT (product_id, recommended_id) DO UPDATE SET
+                    co_purchases = {table}.co_purchases + 1,
+                    score = ({table}.co_purchases + 1) * EXCLUDED.score,
+                    updated_at = EXCLUDED.updated_at
+                """,
+                [value for pair in batch for value in pair],
+            )
+
+
+def _remove_pairs(product_ids, order_counts):
+    pairs = ProductRecommendation.objects.filter(
+        product_id__in=product_ids, recommended_id__in=product_ids,
+    )
+
+    def orders_of(field):
+        return Case(
+            *[When(**{field: pk}, then=Value(float(max(order_counts.get(pk, 0), 1)))) for pk in product_ids],
+            default=Value(1.0),
+            output_field=FloatField(),
+        )
+
+    with transaction.atomic():
+        pairs.filter(co_purchases__lte=1).delete()
+        # Scored like rebuild_recommendations, with the order already gone
+        # from the counts
+        pairs.update(
+            co_purchases=F('co_purchases') - 1,
+            score=Cast(F('co_purchases') - 1, FloatField()) / Sqrt(
+                orders_of('product_id') * orders_of('recommended_id')
+            ),
+            updated_at=timezone.now(),
+        )
+
+
+def _run(order_id, sign):
+    close_old_connections()
+    try:
+        record_order(order_id, sign)
+    except Exception:
+        logger.exception('Could not record recommendations for order %s', order_id)
+    finally:
+        # Worker threads are not request-scoped; don't leak their connections
+        connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'RECOMMENDATION_WORKERS', 1),
+            thread_name_prefix='recommendations',
+        )
+    return _executor
+
+
+def schedule_order(order, sign=1):
+    """Add (or take back) ``order``'s pairs in the background after commit."""
+    order_id = order.pk
+    transaction.on_commit(lambda: _get_executor().submit(_run, order_id, sign))
+
+
+def recommended_products(product, limit=4):
+    """Available products most often bought with ``product``."""
+    rows = ProductRecommendation.objects.filter(
+        product=product, recommended__is_available=True
+    ).select_related(
+        'recommended__farmer__user', 'recommended__category'
+    ).order_by('-score', '-co_purchases')[:limit]
+    return [row.recommended for row in rows]
@@ -0,0 +1,202 @@
+"""
+Full-text product search.
+
+Every product carries a denormalized ``search_document`` built from its name,
+description, category, farm name and farming methods.  On PostgreSQL the same
+text is stored as a weighted ``tsvector`` (GIN indexed) and ranked with
+``ts_rank``; on SQLite it is mirrored into an FTS5 table and ranked with
+``bm25``.  Any other backend falls back to plain ``icontains`` matching.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.core.exceptions import EmptyResultSet
+from django.db import OperationalError, connections, router, transaction
+from django.db.models import Case, F, FloatField, Q, Value, When
+
+from .models import Product
+
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'products_product_fts'
+
+# SQLite only: how many of the best FTS hits among the queryset's rows are
+# handed back to the ORM as an id list
+FTS_MAX_HITS = 500
+
+REINDEX_CHUNK_SIZE = 500
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _vendor(model=Product):
+    return connections[router.db_for_write(model)].vendor
+
+
+def _terms(query):
+    return _TERM_RE.findall(query.lower())
+
+
+def _weighted_fields(product):
+    farmer = product.farmer
+    return (
+        (product.name, 'A'),
+        (' '.join(filter(None, [product.category.name, farmer.farm_name, farmer.user.username])), 'B'),
+        (farmer.farming_methods, 'C'),
+        (product.description, 'D'),
+    )
+
+
+def build_search_document(product):
+    """Return the plain-text search document for ``product``."""
+    return '\n'.join(text for text, weight in _weighted_fields(product) if text)
+
+
+def _search_vector(fields):
+    vector = None
+    for text, weight in fields:
+        part = SearchVector(Value(text or ''), weight=weight, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+    return vector
+
+
+def reindex_products(products):
+    """Rebuild the search document of each product in ``products``.
+
+    ``products`` should be fetched with ``select_related('category',
+    'farmer__user')`` to keep this to one query per product written.
+    """
+    vendor = _vendor()
+    fts_rows = []
+    with transaction.atomic():
+        for product in products:
+            fields = _weighted_fields(product)
+            document = build_search_document(product)
+            updates = {'search_document': document}
+            if vendor == 'postgresql':
+                updates['search_vector'] = _search_vector(fields)
+            Product.objects.filter(pk=product.pk).update(**updates)
+            fts_rows.append((product.pk, document))
+
+        if vendor == 'sqlite' and fts_rows:
+            _fts_write(fts_rows)
+
+
+def reindex_queryset(queryset):
+    """Reindex every product in ``queryset`` in chunks. Returns the count."""
+    queryset = queryset.select_related('category', 'farmer__user').order_by('pk')
+    chunk = []
+    total = 0
+    for product in queryset.iterator(chunk_size=REINDEX_CHUNK_SIZE):
+        chunk.append(product)
+        if len(chunk) >= REINDEX_CHUNK_SIZE:
+            reindex_products(chunk)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        reindex_products(chunk)
+        total += len(chunk)
+    return total
+
+
+def reindex_product_ids(product_ids):
+    return reindex_queryset(Product.objects.filter(pk__in=list(product_ids)))
+
+
+def remove_products(product_ids):
+    """Drop deleted products from the SQLite FTS table (no-op elsewhere)."""
+    if _vendor() != 'sqlite':
+        return
+    try:
+        with connections[router.db_for_write(Product)].cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(pk,) for pk in product_ids]
+            )
+    except OperationalError:
+        pass
+
+
+def _fts_write(rows):
+    try:
+        with connections[router.db_for_write(Product)].cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(pk,) for pk, document in rows]
+            )
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE}(rowid, document) VALUES (%s, %s)',
+                rows
+            )
+    except OperationalError:
+        # SQLite built without FTS5; searches use the icontains fallback
+        pass
+
+
+def _fallback_search(queryset, query):
+    return queryset.filter(
+        Q(name__icontains=query) |
+        Q(description__icontains=query) |
+        Q(farmer__user__username__icontains=query)
+    ).annotate(
+        search_rank=Value(0.0, output_field=FloatField())
+    ).order_by('-created_at')
+
+
+def search_products(queryset, query):
+    """Filter ``queryset`` to products matching ``query``, best match first.
+
+    The result is annotated with ``search_rank`` (higher is better) and
+    ordered by it, newest first on ties.  Apply every filter to ``queryset``
+    before searching: on SQLite the hits are capped at ``FTS_MAX_HITS``
+    among the rows of ``queryset``, so filters applied afterwards would
+    only thin out the best few hundred.
+    """
+    terms = _terms(query)
+    if not terms:
+        return queryset
+
+    vendor = connections[queryset.db].vendor
+
+    if vendor == 'postgresql':
+        # Terms are \w+ only, so they are safe to join into a raw tsquery;
+        # every term is a prefix match so partial words still hit.
+        search_query = SearchQuery(
+            ' & '.join(f'{term}:*' for term in terms),
+            search_type='raw',
+            config=SEARCH_CONFIG,
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', '-created_at')
+
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        try:
+            candidates, params = queryset.order_by().values('pk').query.sql_with_params()
+        except EmptyResultSet:
+            return queryset.none()
+        try:
+            with connections[queryset.db].cursor() as cursor:
+                cursor.execute(
+                    f'SELECT rowid, bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+                    f'WHERE {FTS_TABLE} MATCH %s AND rowid IN ({candidates}) '
+                    f'ORDER BY 2 LIMIT %s',
+                    [match, *params, FTS_MAX_HITS]
+                )
+                hits = cursor.fetchall()
+        except OperationalError:
+            return _fallback_search(queryset, query)
+
+        if not hits:
+            return queryset.none()
+
+        # bm25() is lower-is-better; flip it so search_rank sorts like ts_rank
+        return queryset.filter(pk__in=[pk for pk, score in hits]).annotate(
+            search_rank=Case(
+                *[When(pk=pk, then=Value(-score)) for pk, score in hits],
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        ).order_by('-search_rank', '-created_at')
+
+    return _fallback_search(queryset, query)
@@ -0,0 +1,185 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from accounts import stats as farmer_stats
+from accounts.models import FarmerProfile, User
+from orders.models import Order
+from . import autocomplete, cards, categories, images, popularity, ratings, recommendations, search, tags
+from .cache import bump_catalog_generation
+from .models import Category, Product, ProductImage, ProductReview
+
+# Sent with ``product_ids`` (and, if known, the changed ``fields``) after
+# bulk writes that bypass the per-instance signals below
+catalog_bulk_changed = Signal()
+
+# Product fields that feed tags and the search documents
+INDEXED_FIELDS = {'name', 'description', 'category', 'category_id'}
+
+
+@receiver(post_save, sender=Product)
+def reindex_saved_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    tags.tag_product(instance)
+    search.reindex_product_ids([instance.pk])
+    autocomplete.publish_changes([instance.pk])
+    bump_catalog_generation()
+
+
+@receiver(post_save, sender=Product)
+def refresh_category_counts(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    listing = (instance.category_id, instance.is_available)
+    if created or listing != getattr(instance, '_loaded_listing', None):
+        categories.bump_version()
+    instance._loaded_listing = listing
+
+
+@receiver(catalog_bulk_changed)
+def reindex_bulk_changed_products(sender, product_ids, fields=None, **kwargs):
+    product_ids = list(product_ids)
+    products = Product.objects.filter(pk__in=product_ids)
+    if fields is None or INDEXED_FIELDS.intersection(fields):
+        tags.tag_products(products)
+        search.reindex_queryset(products)
+    if fields is None or {'is_available', 'category', 'category_id'}.intersection(fields):
+        categories.bump_version()
+    autocomplete.publish_changes(product_ids)
+    cards.bump_card_versions(products)
+    bump_catalog_generation()
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+    if instance.is_available:
+        categories.bump_version()
+    autocomplete.publish_changes([instance.pk])
+    bump_catalog_generation()
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    categories.bump_version()
+    if created:
+        # Only the category list changes
+        bump_catalog_generation()
+        return
+    search.reindex_queryset(Product.objects.filter(category=instance))
+    autocomplete.publish_changes(
+        Product.objects.filter(category=instance).values_list('pk', flat=True)
+    )
+    bump_catalog_generation()
+
+
+@receiver(post_delete, sender=Category)
+def forget_deleted_category(sender, instance, **kwargs):
+    categories.bump_version()
+    bump_catalog_generation()
+
+
+def _reindex_farmer(farmer):
+    cards.bump_card_versions(Product.objects.filter(farmer=farmer))
+    search.reindex_queryset(Product.objects.filter(farmer=farmer))
+    autocomplete.publish_changes(
+        Product.objects.filter(farmer=farmer).values_list('pk', flat=True)
+    )
+    bump_catalog_generation()
+
+
+@receiver(post_save, sender=FarmerProfile)
+def reindex_farmer_products(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    tags.tag_farmer(instance)
+    if created:
+        bump_catalog_generation()
+        return
+    _reindex_farmer(instance)
+
+
+@receiver(post_save, sender=User)
+def reindex_renamed_farmer(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    # The username is in search documents, cards, the typeahead and the API
+    if raw or (update_fields is not None and 'username' not in update_fields):
+        return
+    renamed = not created and instance.username != getattr(instance, '_loaded_username', None)
+    instance._loaded_username = instance.username
+    if renamed and instance.user_type == 'farmer':
+        farmer = FarmerProfile.objects.filter(user=instance).first()
+        if farmer is not None:
+            _reindex_farmer(farmer)
+
+
+@receiver(post_save, sender=ProductReview)
+def apply_review_rating(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        ratings.apply_rating_delta(instance.product_id, instance.rating, 1)
+    elif hasattr(instance, '_loaded_rating'):
+        if instance.rating != instance._loaded_rating:
+            ratings.apply_rating_delta(instance.product_id, instance.rating - instance._loaded_rating, 0)
+    else:
+        # Saved without being loaded first, so the old rating is unknown
+        ratings.recompute_product(instance.product_id)
+    instance._loaded_rating = instance.rating
+    bump_catalog_generation()
+
+
+@receiver(post_delete, sender=ProductReview)
+def remove_review_rating(sender, instance, **kwargs):
+    ratings.apply_rating_delta(instance.product_id, -instance.rating, -1)
+    bump_catalog_generation()
+
+
+@receiver(post_save, sender=Order)
+def record_purchased_order(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    purchased = recommendations.PURCHASED_STATUSES
+    was_purchased = getattr(instance, '_loaded_status', None) in purchased
+    if instance.status in purchased and not was_purchased:
+        farmer_stats.apply_order_sales(instance, 1)
+        popularity.record_order(instance, 1)
+        recommendations.schedule_order(instance)
+    elif was_purchased and instance.status not in purchased:
+        farmer_stats.apply_order_sales(instance, -1)
+        popularity.record_order(instance, -1)
+        recommendations.schedule_order(instance, -1)
+    instance._loaded_status = instance.status
+
+
+@receiver(pre_delete, sender=Order)
+def release_deleted_order_holds(sender, instance, **kwargs):
+    # The holds would cascade away without giving their stock back
+    from orders.inventory import release_order_holds
+
+    release_order_holds(instance)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=User)
+def generate_image_variants(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    for label, field_name in images.SOURCES:
+        if label != sender._meta.label:
+            continue
+        if update_fields is not None and field_name not in update_fields:
+            continue
+        if images.needs_variants(instance, field_name):
+            images.schedule(instance, field_name)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=User)
+def delete_image_variants(sender, instance, **kwargs):
+    for label, field_name in images.SOURCES:
+        if label == sender._meta.label:
+            images.schedule_cleanup(instance, field_name)
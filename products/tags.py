@@ -0,0 +1,137 @@
+"""
+Rule-based product attribute tags.
+
+Tags such as "organic" are extracted from a product's name and description
+and, separately, from its farmer's ``farming_methods``.  A product has an
+attribute if either it or its farmer carries the tag, which makes a filter
+two indexed lookups on the M2M tables instead of ``icontains`` scans, and
+keeps "inorganic" or "non-organic" from matching.
+
+The rules live in ``RULES``; after changing them run ``retag_products`` to
+re-apply them to the whole catalog.
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Q
+
+from accounts.models import FarmerProfile
+from .models import Product, Tag
+
+BULK_BATCH_SIZE = 1000
+
+# Words that flip the meaning of the attribute right after them
+_NEGATION = r'(?<!\bnon[\s-])(?<!\bnot\s)(?<!\bno\s)'
+
+# (slug, display name, pattern)
+RULES = (
+    ('organic', 'Organic',
+     _NEGATION + r'\borganic(?:ally)?\b'),
+    ('pesticide-free', 'Pesticide-free',
+     r'\b(?:pesticide|spray|chemical)[\s-]?free\b'
+     r'|\b(?:no|without)\s+(?:\w+\s+)?(?:pesticides?|sprays?|chemicals)\b'
+     r'|\bunsprayed\b'),
+    ('grass-fed', 'Grass-fed',
+     r'\bgrass[\s-]?(?:fed|finished)\b|\bpasture[\s-]?raised\b'),
+    ('free-range', 'Free-range',
+     r'\bfree[\s-]?range\b'),
+    ('non-gmo', 'Non-GMO',
+     r'\bnon[\s-]?gmo\b|\bgmo[\s-]?free\b'),
+    ('hydroponic', 'Hydroponic',
+     r'\bhydroponic(?:ally|s)?\b'),
+    ('sustainable', 'Sustainable',
+     _NEGATION + r'\bsustainabl[ey]\b'),
+)
+
+_COMPILED = [(slug, re.compile(pattern, re.IGNORECASE)) for slug, name, pattern in RULES]
+
+_tag_ids = {}
+
+
+def extract_tags(*texts):
+    """Return the set of tag slugs whose rules match any of ``texts``."""
+    text = '\n'.join(t for t in texts if t)
+    return {slug for slug, pattern in _COMPILED if pattern.search(text)}
+
+
+def tag_ids():
+    """Map rule slug -> Tag id, creating missing tags on first use."""
+    if len(_tag_ids) < len(RULES):
+        Tag.objects.bulk_create(
+            [Tag(slug=slug, name=name) for slug, name, pattern in RULES],
+            ignore_conflicts=True,
+        )
+        _tag_ids.update(
+            Tag.objects.filter(slug__in=[slug for slug, name, pattern in RULES])
+            .values_list('slug', 'id')
+        )
+    return _tag_ids
+
+
+def product_tags(product):
+    return extract_tags(product.name, product.description)
+
+
+def farmer_tags(farmer):
+    return extract_tags(farmer.farming_methods)
+
+
+def _sync(relation, slugs):
+    ids = tag_ids()
+    wanted = {ids[slug] for slug in slugs}
+    if set(relation.values_list('id', flat=True)) != wanted:
+        relation.set(wanted)
+
+
+def tag_product(product):
+    _sync(product.tags, product_tags(product))
+
+
+def tag_farmer(farmer):
+    _sync(farmer.method_tags, farmer_tags(farmer))
+
+
+def tag_filter(slug):
+    """Q matching products that carry ``slug`` themselves or through their farmer."""
+    return (
+        Q(pk__in=Product.tags.through.objects.filter(tag__slug=slug).values('product_id')) |
+        Q(farmer_id__in=Tag.farmers.through.objects.filter(tag__slug=slug).values('farmerprofile_id'))
+    )
+
+
+def _retag(queryset, fields, extract, through, owner_field, replace_all=True):
+    ids = tag_ids()
+    owners = []
+    rows = []
+    for obj in queryset.only('pk', *fields).iterator(chunk_size=BULK_BATCH_SIZE):
+        owners.append(obj.pk)
+        rows.extend(
+            through(**{owner_field: obj.pk, 'tag_id': ids[slug]})
+            for slug in extract(obj)
+        )
+    with transaction.atomic():
+        if replace_all:
+            through.objects.all().delete()
+        else:
+            through.objects.filter(**{owner_field + '__in': owners}).delete()
+        through.objects.bulk_create(rows, batch_size=BULK_BATCH_SIZE)
+    return len(rows)
+
+
+def tag_products(queryset):
+    """Re-apply ``RULES`` to the products in ``queryset`` (after bulk writes)."""
+    return _retag(queryset, ('name', 'description'), product_tags,
+                  Product.tags.through, 'product_id', replace_all=False)
+
+
+def retag_all():
+    """Re-apply ``RULES`` to every product and farmer.
+
+    Returns ``(product_tags, farmer_tags)``, the number of assignments made.
+    """
+    return (
+        _retag(Product.objects.all(), ('name', 'description'), product_tags,
+               Product.tags.through, 'product_id'),
+        _retag(FarmerProfile.objects.all(), ('farming_methods',), farmer_tags,
+               Tag.farmers.through, 'farmerprofile_id'),
+    )
@@ -0,0 +1,47 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from products import images
+
+register = template.Library()
+
+# Default sizes attribute per variant, matching where each is used
+SIZES = {
+    'thumbnail': '160px',
+    'card': '(min-width: 992px) 33vw, (min-width: 576px) 50vw, 100vw',
+    'detail': '(min-width: 992px) 50vw, 100vw',
+}
+
+
+def _srcset(storage, variants, extension):
+    return ', '.join(
+        '%s %dw' % (storage.url(entry[extension]), entry['width'])
+        for entry in sorted(variants.values(), key=lambda entry: entry['width'])
+    )
+
+
+@register.simple_tag
+def responsive_image(fieldfile, variant='card', sizes=None, **attrs):
+    """Render ``fieldfile`` as a ``<picture>`` with WebP and JPEG srcsets.
+
+    ``{% responsive_image product.image "card" alt=product.name class="card-img-top" %}``
+
+    Keyword arguments become attributes of the ``<img>``.  Until the
+    variants of the current upload exist the original is used as is.
+    """
+    if not fieldfile:
+        return ''
+    variants = images.variants_for(fieldfile)
+    if variant not in variants:
+        return format_html('<img src="{}"{}>', fieldfile.url, flatatt(attrs))
+
+    storage = fieldfile.storage
+    sizes = sizes or SIZES.get(variant, '100vw')
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        _srcset(storage, variants, 'webp'), sizes,
+        storage.url(variants[variant]['jpg']), _srcset(storage, variants, 'jpg'), sizes,
+        flatatt(attrs),
+    )
@@ -0,0 +1,15 @@
+from django import template
+
+from products.cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def product_cards(context, products, variant):
+    """Render cached cards for ``products``: ``{% product_cards products "list" %}``."""
+    user = context.get('user')
+    show_cart = bool(
+        user and user.is_authenticated and getattr(user, 'user_type', None) == 'customer'
+    )
+    return render_cards(products, variant, show_cart)
@@ -1,3 +1,377 @@
+import warnings
+from datetime import timedelta
+from io import BytesIO
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import CustomerProfile, FarmerProfile, User
+from orders.inventory import place_holds
+from orders.models import Order, OrderItem
+from . import autocomplete, bulk, recommendations
+from .fuzzy import did_you_mean
+from .models import Category, Product, ProductRecommendation, ProductReview
+
+
+class CatalogFixtures:
+    def make_farmer(self, username, **fields):
+        user = User.objects.create_user(username=username, password='x', user_type='farmer')
+        return FarmerProfile.objects.create(user=user, farm_location='Ejisu', **fields)
+
+    def make_product(self, name, category, farmer=None, price='2.00', stock=10, **fields):
+        if farmer is None:
+            if not hasattr(self, 'farmer'):
+                self.farmer = self.make_farmer('farmer')
+            farmer = self.farmer
+        return Product.objects.create(
+            farmer=farmer, category=category, name=name, description=name,
+            price=Decimal(price), stock=stock, **fields,
+        )
+
+
+class CatalogAPITests(CatalogFixtures, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.veg = Category.objects.create(name='Vegetables')
+        self.kale = self.make_product('Kale', self.veg)
+        self.eggs = self.make_product('Eggs', self.veg)
+
+    def get(self, **headers):
+        return self.client.get(reverse('products:api_product_list'), **headers)
+
+    def get_since(self, since):
+        return self.client.get(reverse('products:api_product_list'), {'since': since, 'fields': 'id'})
+
+    def test_revalidation_is_not_modified_until_the_catalog_changes(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kale.price = Decimal('3.00')
+            self.kale.save()
+        changed = self.get(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+        self.assertIn('"3.00"', changed.content.decode())
+
+    def test_farmer_rename_changes_the_farmers_etag(self):
+        url = reverse('products:api_farmer_list')
+        first = self.client.get(url, {'fields': 'id,username'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.get(pk=self.farmer.user_id)
+            user.username = 'greenacres'
+            user.save()
+        changed = self.client.get(url, {'fields': 'id,username'}, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()['results'][0]['username'], 'greenacres')
+
+    def test_since_lists_products_updated_after_it(self):
+        long_ago = timezone.now() - timedelta(days=2)
+        Product.objects.filter(pk=self.kale.pk).update(updated_at=long_ago)
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+
+        results = self.get_since(since).json()['results']
+
+        self.assertEqual(results, [{'id': self.eggs.pk}])
+
+    def test_since_includes_rating_and_hold_changes(self):
+        Product.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        customer = CustomerProfile.objects.create(
+            user=User.objects.create_user(username='alice', password='x', user_type='customer'),
+        )
+
+        ProductReview.objects.create(product=self.kale, customer=customer, rating=4)
+        order = Order.objects.create(
+            customer=customer, order_number='ORD-1', delivery_address='Here', total_amount=Decimal('2.00'),
+        )
+        with transaction.atomic():
+            place_holds(order, {self.eggs.pk: 1})
+
+        ids = [result['id'] for result in self.get_since(since).json()['results']]
+        self.assertEqual(sorted(ids), sorted([self.kale.pk, self.eggs.pk]))
+
+    def test_naive_since_is_read_in_the_current_time_zone(self):
+        Product.objects.filter(pk=self.kale.pk).update(updated_at=timezone.now() - timedelta(days=2))
+        naive = timezone.make_naive(timezone.now() - timedelta(days=1)).isoformat()
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)
+            response = self.get_since(naive)
+
+        self.assertEqual(response.json()['results'], [{'id': self.eggs.pk}])
+
+    def test_invalid_since_is_rejected(self):
+        self.assertEqual(self.get_since('yesterday').status_code, 400)
+        self.assertEqual(self.get_since('2026-13-01T00:00:00').status_code, 400)
+
+
+class FacetTests(CatalogFixtures, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fruit = Category.objects.create(name='Fruit')
+        self.veg = Category.objects.create(name='Vegetables')
+        self.make_product('Apples', self.fruit, price='3.00')
+        self.make_product('Mangoes', self.fruit, price='12.00')
+        self.make_product('Kale', self.veg, price='2.00')
+        self.make_product('Yams', self.veg, price='8.00', stock=0)
+
+    def facets(self, **params):
+        response = self.client.get(reverse('products:advanced_search'), params)
+        return response.context
+
+    def test_selected_category_keeps_counts_for_the_others(self):
+        context = self.facets(category=self.veg.pk)
+
+        self.assertEqual(
+            [(category.name, count) for category, count in context['category_facets']],
+            [('Fruit', 2), ('Vegetables', 2)],
+        )
+        self.assertEqual(context['facets']['total'], 2)
+        self.assertEqual(context['facets']['in_stock'], 1)
+        self.assertEqual([bucket['count'] for bucket in context['facets']['price_buckets']], [1, 1, 0, 0, 0])
+
+    def test_other_filters_still_apply_to_category_counts(self):
+        context = self.facets(category=self.veg.pk, max_price='5')
+
+        self.assertEqual(
+            [(category.name, count) for category, count in context['category_facets']],
+            [('Fruit', 1), ('Vegetables', 1)],
+        )
+        self.assertEqual(context['facets']['total'], 1)
+
+
+class PriceFilterTests(CatalogFixtures, TestCase):
+    def setUp(self):
+        cache.clear()
+        veg = Category.objects.create(name='Vegetables')
+        self.kale = self.make_product('Kale', veg, price='2.00')
+        self.yams = self.make_product('Yams', veg, price='8.00')
+
+    def listed(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return {product.pk for product in response.context['products']}
+
+    def test_price_range(self):
+        for name in ('products:product_list', 'products:advanced_search'):
+            self.assertEqual(self.listed(name, min_price='5'), {self.yams.pk})
+            self.assertEqual(self.listed(name, max_price='5.00'), {self.kale.pk})
+
+    def test_invalid_prices_are_ignored(self):
+        for name in ('products:product_list', 'products:advanced_search'):
+            self.assertEqual(self.listed(name, min_price='abc', max_price='NaN'), {self.kale.pk, self.yams.pk})
+
+
+class RecommendationTests(CatalogFixtures, TestCase):
+    def setUp(self):
+        veg = Category.objects.create(name='Vegetables')
+        self.kale = self.make_product('Kale', veg)
+        self.eggs = self.make_product('Eggs', veg)
+        self.yams = self.make_product('Yams', veg)
+        self.customer = CustomerProfile.objects.create(
+            user=User.objects.create_user(username='alice', password='x', user_type='customer'),
+        )
+
+    def purchase(self, number, products):
+        order = Order.objects.create(
+            customer=self.customer, order_number=number, delivery_address='Here',
+            total_amount=Decimal('0'), status='confirmed',
+        )
+        for product in products:
+            OrderItem.objects.create(
+                order=order, product=product, farmer=product.farmer, quantity=1, price=product.price,
+            )
+        recommendations.record_order(order.pk)
+        return order
+
+    def cancel(self, order):
+        Order.objects.filter(pk=order.pk).update(status='cancelled')
+        recommendations.record_order(order.pk, -1)
+
+    def pairs(self):
+        return {
+            (row.product_id, row.recommended_id): (row.co_purchases, round(row.score, 6))
+            for row in ProductRecommendation.objects.all()
+        }
+
+    def assertMatchesRebuild(self):
+        pairs = self.pairs()
+        recommendations.rebuild_recommendations()
+        self.assertEqual(pairs, self.pairs())
+
+    def test_cancelled_order_takes_its_pairs_back(self):
+        self.purchase('ORD-1', [self.kale, self.eggs])
+        second = self.purchase('ORD-2', [self.kale, self.eggs, self.yams])
+        self.assertEqual(self.pairs()[(self.kale.pk, self.eggs.pk)][0], 2)
+
+        self.cancel(second)
+
+        self.assertEqual(self.pairs()[(self.kale.pk, self.eggs.pk)], (1, 1.0))
+        self.assertNotIn((self.kale.pk, self.yams.pk), self.pairs())
+        self.assertMatchesRebuild()
+
+    def test_cancelling_the_last_purchase_removes_the_pair(self):
+        order = self.purchase('ORD-1', [self.kale, self.eggs])
+
+        self.cancel(order)
+
+        self.assertEqual(self.pairs(), {})
+
+
+class CursorPaginationTests(CatalogFixtures, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.veg = Category.objects.create(name='Vegetables')
+        for number in range(15):
+            self.make_product(f'Product {number}', self.veg)
+
+    def get(self, query=''):
+        response = self.client.get(reverse('products:product_list') + '?' + query)
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def ids(self, context):
+        return [product.pk for product in context['products']]
+
+    def test_next_pages_are_stable_when_products_are_added(self):
+        first = self.get()
+        self.make_product('Newest', self.veg)
+
+        second = self.get(first['next_page_query'])
+
+        seen = self.ids(first) + self.ids(second)
+        self.assertEqual(len(seen), 15)
+        self.assertEqual(set(seen), set(Product.objects.exclude(name='Newest').values_list('pk', flat=True)))
+        self.assertIsNone(second['cursor_page'].next_cursor)
+
+    def test_previous_cursor_returns_to_the_first_page(self):
+        first = self.get()
+        second = self.get(first['next_page_query'])
+
+        back = self.get(second['previous_page_query'])
+
+        self.assertEqual(self.ids(back), self.ids(first))
+
+    def test_invalid_cursor_starts_from_the_beginning(self):
+        self.assertEqual(self.ids(self.get('cursor=not-a-cursor')), self.ids(self.get()))
+
+
+class BulkImportTests(CatalogFixtures, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.veg = Category.objects.create(name='Vegetables')
+        self.farmer = self.make_farmer('farmer')
+        self.kale = self.make_product('Kale', self.veg, price='2.00', stock=5)
+
+    def import_csv(self, text):
+        return bulk.import_products(self.farmer, BytesIO(text.encode()), 'csv')
+
+    def test_invalid_rows_are_reported_and_the_rest_imported(self):
+        result = self.import_csv(
+            'name,description,category,price,stock\n'
+            'Eggs,Free range,vegetables,1.50,30\n'
+            'Yams,Puna,vegetables,cheap,4\n'
+            'Okra,Fresh,Fruit,1.00,4\n'
+            'Eggs,Free range,Vegetables,1.75,30\n'
+            'Kale,,,3.00,\n'
+        )
+
+        self.assertEqual((result.created, result.updated), (1, 1))
+        self.assertEqual([line for line, message in result.errors], [3, 4, 5])
+        self.assertIn('price', result.errors[0][1])
+        self.assertIn('line 2', result.errors[2][1])
+        self.kale.refresh_from_db()
+        self.assertEqual((self.kale.price, self.kale.stock), (Decimal('3.00'), 5))
+        self.assertEqual(
+            sorted(Product.objects.filter(farmer=self.farmer).values_list('name', flat=True)),
+            ['Eggs', 'Kale'],
+        )
+
+    def test_rows_by_id_must_be_the_farmers_own(self):
+        other = self.make_product('Kale', self.veg, farmer=self.make_farmer('neighbour'))
+
+        result = bulk.import_products(
+            self.farmer, BytesIO(f'{{"id": {other.pk}, "price": "9.00"}}\nnot json\n'.encode()), 'jsonl',
+        )
+
+        self.assertEqual((result.created, result.updated), (0, 0))
+        self.assertEqual([line for line, message in result.errors], [1, 2])
+        other.refresh_from_db()
+        self.assertEqual(other.price, Decimal('2.00'))
+
+    def test_unreadable_files_are_rejected(self):
+        with self.assertRaises(bulk.CatalogFileError):
+            self.import_csv('title,price\nKale,2.00\n')
+        with self.assertRaises(bulk.CatalogFileError):
+            bulk.import_products(self.farmer, BytesIO(b'name\nK\xe2le\n'), 'csv')
+
+    def test_stock_changes_are_all_or_nothing(self):
+        eggs = self.make_product('Eggs', self.veg, stock=30)
+
+        updated, errors = bulk.apply_stock_changes(self.farmer, [
+            {'id': self.kale.pk, 'stock': 8},
+            {'id': eggs.pk, 'stock': -1},
+        ])
+
+        self.assertEqual(updated, [])
+        self.assertEqual(list(errors), [1])
+        self.assertEqual(Product.objects.get(pk=self.kale.pk).stock, 5)
+
+    def test_stock_changes_to_other_farmers_products_reject_the_batch(self):
+        other = self.make_product('Kale', self.veg, farmer=self.make_farmer('neighbour'))
+
+        updated, errors = bulk.apply_stock_changes(self.farmer, [
+            {'id': self.kale.pk, 'price': '2.50'},
+            {'id': other.pk, 'price': '0.10'},
+        ])
+
+        self.assertEqual(updated, [])
+        self.assertEqual(list(errors), [1])
+        self.assertEqual(Product.objects.get(pk=self.kale.pk).price, Decimal('2.00'))
+        self.assertEqual(Product.objects.get(pk=other.pk).price, Decimal('2.00'))
+
+    def test_stock_changes_leave_missing_keys_alone(self):
+        updated, errors = bulk.apply_stock_changes(self.farmer, [{'id': self.kale.pk, 'stock': 0}])
+
+        self.assertEqual((updated, errors), ([self.kale.pk], {}))
+        self.kale.refresh_from_db()
+        self.assertEqual((self.kale.stock, self.kale.price, self.kale.is_available), (0, Decimal('2.00'), True))
+
+
+class DidYouMeanTests(CatalogFixtures, TestCase):
+    def setUp(self):
+        cache.clear()
+        veg = Category.objects.create(name='Vegetables')
+        self.tomatoes = self.make_product('Tomatoes', veg)
+        self.make_product('Kale', veg)
+        autocomplete.index.load()
+
+    def test_unknown_terms_are_respelled(self):
+        self.assertEqual(did_you_mean('tomatoos'), 'tomatoes')
+        self.assertEqual(did_you_mean('fresh tomatoos'), 'fresh tomatoes')
+
+    def test_known_prefixes_and_unrelated_words_are_left_alone(self):
+        self.assertIsNone(did_you_mean('toma'))
+        self.assertIsNone(did_you_mean('xyzzy'))
+
+    def test_empty_search_offers_close_matches(self):
+        response = self.client.get(reverse('products:product_list'), {'search': 'tomatoos'})
+
+        self.assertEqual(response.context['did_you_mean'], 'tomatoes')
+        self.assertTrue(response.context['fuzzy_results'])
+        self.assertEqual([product.pk for product in response.context['products']], [self.tomatoes.pk])
+
+    def test_search_api_retries_with_the_suggestion(self):
+        data = self.client.get(reverse('products:product_search_api'), {'q': 'tomatoos'}).json()
 
-# Create your tests here.
+        self.assertEqual(data['did_you_mean'], 'tomatoes')
+        self.assertEqual([result['id'] for result in data['results']], [self.tomatoes.pk])
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'products'
 
@@ -15,10 +15,18 @@ urlpatterns = [
     path('<int:pk>/edit/', views.ProductUpdateView.as_view(), name='product_edit'),
     path('<int:pk>/delete/', views.ProductDeleteView.as_view(), name='product_delete'),
     path('<int:pk>/toggle-availability/', views.toggle_product_availability, name='toggle_availability'),
+    path('bulk-update/', views.bulk_update_products, name='bulk_update'),
+    path('import/', views.CatalogImportView.as_view(), name='catalog_import'),
+    path('export/', views.catalog_export, name='catalog_export'),
     
     # AJAX endpoints
     path('search/', views.product_search_api, name='product_search_api'),
     path('advanced-search/', views.AdvancedSearchView.as_view(), name='advanced_search'),
     path('analytics/', views.AnalyticsDashboardView.as_view(), name='analytics_dashboard'),
     path('review/<int:product_id>/', views.add_product_review, name='add_product_review'),
+    
+    # Catalog API
+    path('api/v1/products/', api.product_list, name='api_product_list'),
+    path('api/v1/categories/', api.category_list, name='api_category_list'),
+    path('api/v1/farmers/', api.farmer_list, name='api_farmer_list'),
 ]
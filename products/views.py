@@ -1,64 +1,195 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
-from django.http import JsonResponse
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView, FormView
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
-from django.db.models import Q, Count, Sum, Avg
+from django.db import transaction
+from django.db.models import F, Count, Sum, Avg
 from django.core.paginator import Paginator
 from django.urls import reverse_lazy
-from .models import Product, Category, ProductReview
-from .forms import ProductForm
+from decimal import Decimal
+import json
+from .models import Product, ProductReview
+from .categories import all_categories, get_category
+from .forms import CatalogImportForm, ProductForm
+from .search import search_products
+from .fuzzy import did_you_mean, fuzzy_search
+from .facets import compute_facets
+from .tags import RULES as TAG_RULES, tag_filter
+from .pagination import KeysetPaginationMixin
+from . import cache as result_cache
+from .cache import CachedResultsMixin
+from .recommendations import recommended_products
+from . import autocomplete, bulk
+from accounts import geo
 from accounts.models import FarmerProfile
 from orders.models import Order, OrderItem
+from messaging import fanout
 from messaging.models import Notification
 
-class ProductListView(ListView):
+def price_param(value):
+    """A price filter value as a Decimal; ``None`` if empty or not a number."""
+    if not value or not value.strip():
+        return None
+    try:
+        # Coerced the way the result cache keys it
+        return Decimal(result_cache.decimal(value.strip()))
+    except result_cache.InvalidParameter:
+        return None
+
+class NearbyFilterMixin:
+    """Location filtering for product listings.
+
+    ``?lat=&lng=`` (e.g. from the browser's geolocation) or a ``?location=``
+    the gazetteer knows becomes a ``?radius=`` km search around that point,
+    annotating products with ``distance_km``.  Unknown place names fall back
+    to matching the farm location text.
+    """
+    default_radius_km = 25
+    max_radius_km = 500
+    radius_choices = (5, 10, 25, 50, 100)
+
+    def get_origin(self):
+        if not hasattr(self, '_origin'):
+            self._origin = None
+            try:
+                lat = float(self.request.GET['lat'])
+                lng = float(self.request.GET['lng'])
+                if -90 <= lat <= 90 and -180 <= lng <= 180:
+                    self._origin = (lat, lng)
+            except (KeyError, ValueError):
+                location = self.request.GET.get('location')
+                if location:
+                    self._origin = geo.geocode(location)
+        return self._origin
+
+    def get_radius(self):
+        try:
+            radius = float(self.request.GET.get('radius') or self.default_radius_km)
+        except ValueError:
+            radius = self.default_radius_km
+        return min(max(radius, 1), self.max_radius_km)
+
+    def filter_location(self, queryset):
+        origin = self.get_origin()
+        if origin is not None:
+            return geo.filter_within(queryset, *origin, self.get_radius(), prefix='farmer__')
+        location = self.request.GET.get('location')
+        if location:
+            queryset = queryset.filter(farmer__farm_location__icontains=location)
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['location'] = self.request.GET.get('location', '')
+        context['near_lat'] = self.request.GET.get('lat', '')
+        context['near_lng'] = self.request.GET.get('lng', '')
+        context['radius'] = self.get_radius()
+        context['radius_choices'] = self.radius_choices
+        context['location_found'] = self.get_origin() is not None
+        return context
+
+class ProductListView(NearbyFilterMixin, CachedResultsMixin, KeysetPaginationMixin, ListView):
     model = Product
     template_name = 'products/product_list.html'
     context_object_name = 'products'
     paginate_by = 12
+    result_cache_params = {
+        'search': result_cache.text,
+        'category': result_cache.integer,
+        'min_price': result_cache.decimal,
+        'max_price': result_cache.decimal,
+        'location': result_cache.text,
+        'lat': result_cache.number,
+        'lng': result_cache.number,
+        'radius': result_cache.number,
+        'sort': result_cache.text,
+        'page': result_cache.integer,
+        'cursor': str,
+    }
     
     def get_queryset(self):
         queryset = Product.objects.filter(is_available=True).select_related('farmer__user', 'category')
         
-        # Search functionality
-        search = self.request.GET.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(description__icontains=search) |
-                Q(farmer__user__username__icontains=search)
-            )
-        
         # Category filter
         category = self.request.GET.get('category')
         if category:
             queryset = queryset.filter(category_id=category)
         
         # Price range filter
-        min_price = self.request.GET.get('min_price')
-        max_price = self.request.GET.get('max_price')
-        if min_price:
+        min_price = price_param(self.request.GET.get('min_price'))
+        max_price = price_param(self.request.GET.get('max_price'))
+        if min_price is not None:
             queryset = queryset.filter(price__gte=min_price)
-        if max_price:
+        if max_price is not None:
             queryset = queryset.filter(price__lte=max_price)
         
         # Location filter
-        location = self.request.GET.get('location')
-        if location:
-            queryset = queryset.filter(farmer__farm_location__icontains=location)
+        queryset = self.filter_location(queryset)
         
+        # Kept for the fuzzy fallback when the search finds nothing
+        self.unsearched_queryset = queryset
+        
+        # Search functionality (results come back ordered by relevance)
+        search = self.request.GET.get('search')
+        if search:
+            queryset = search_products(queryset, search)
+        
+        return self.apply_ordering(queryset)
+    
+    def apply_ordering(self, queryset):
+        if self.sort_by_distance():
+            return queryset.order_by('distance_km', '-created_at')
+        if self.request.GET.get('search'):
+            return queryset
         return queryset.order_by('-created_at')
     
+    def get_fuzzy_results(self, search):
+        """Close matches for a search with no exact hits: ``(products, suggestion)``."""
+        def compute():
+            queryset, suggestion = fuzzy_search(self.unsearched_queryset, search)
+            queryset = self.apply_ordering(queryset)
+            return {
+                'ids': list(queryset.values_list('pk', flat=True)[:self.paginate_by]),
+                'suggestion': suggestion,
+            }
+        
+        try:
+            params = self.get_result_cache_params()
+        except result_cache.InvalidParameter:
+            result = compute()
+        else:
+            result = result_cache.get_or_compute(result_cache.result_key('fuzzy', params), compute)
+        
+        by_id = self.unsearched_queryset.in_bulk(result['ids'])
+        return [by_id[pk] for pk in result['ids'] if pk in by_id], result['suggestion']
+    
+    def sort_by_distance(self):
+        return self.request.GET.get('sort') == 'distance' and self.get_origin() is not None
+    
+    def get_keyset_ordering(self):
+        # Relevance-ranked and distance-sorted results stay on page numbers
+        if self.request.GET.get('search') or self.sort_by_distance():
+            return None
+        return self.keyset_ordering
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
+        context['categories'] = all_categories()
         context['search_query'] = self.request.GET.get('search', '')
         context['selected_category'] = self.request.GET.get('category', '')
         context['min_price'] = self.request.GET.get('min_price', '')
         context['max_price'] = self.request.GET.get('max_price', '')
-        context['location'] = self.request.GET.get('location', '')
+        
+        # Exact search came back empty: offer close matches instead
+        search = self.request.GET.get('search', '').strip()
+        first_page = not (self.request.GET.get('page') or self.request.GET.get(self.cursor_param))
+        if search and first_page and not context['products']:
+            products, suggestion = self.get_fuzzy_results(search)
+            context['products'] = context['object_list'] = products
+            context['did_you_mean'] = suggestion
+            context['fuzzy_results'] = bool(products)
         return context
 
 class ProductDetailView(DetailView):
@@ -68,14 +199,18 @@ class ProductDetailView(DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        product = self.get_object()
-        context['related_products'] = Product.objects.filter(
-            category=product.category,
-            is_available=True
-        ).exclude(id=product.id)[:4]
+        product = self.object
+        related = recommended_products(product, limit=4)
+        if not related:
+            # No purchase history yet; fall back to the same category
+            related = Product.objects.filter(
+                category=product.category,
+                is_available=True
+            ).exclude(id=product.id)[:4]
+        context['related_products'] = related
         return context
 
-class FarmerProductsView(ListView):
+class FarmerProductsView(KeysetPaginationMixin, ListView):
     model = Product
     template_name = 'products/farmer_products.html'
     context_object_name = 'products'
@@ -83,21 +218,23 @@ class FarmerProductsView(ListView):
     
     def get_queryset(self):
         self.farmer = get_object_or_404(FarmerProfile, id=self.kwargs['farmer_id'])
-        return Product.objects.filter(farmer=self.farmer, is_available=True).order_by('-created_at')
+        return Product.objects.filter(farmer=self.farmer, is_available=True).select_related('farmer__user').order_by('-created_at')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['farmer'] = self.farmer
         return context
 
-class CategoryProductsView(ListView):
+class CategoryProductsView(KeysetPaginationMixin, ListView):
     model = Product
     template_name = 'products/category_products.html'
     context_object_name = 'products'
     paginate_by = 12
     
     def get_queryset(self):
-        self.category = get_object_or_404(Category, id=self.kwargs['category_id'])
+        self.category = get_category(self.kwargs['category_id'])
+        if self.category is None:
+            raise Http404('No such category')
         return Product.objects.filter(category=self.category, is_available=True).order_by('-created_at')
     
     def get_context_data(self, **kwargs):
@@ -152,7 +289,9 @@ class ProductCreateView(LoginRequiredMixin, CreateView):
     def form_valid(self, form):
         form.instance.farmer = self.request.user.farmer_profile
         messages.success(self.request, 'Product added successfully!')
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        fanout.schedule_new_product(self.object)
+        return response
 
 class ProductUpdateView(LoginRequiredMixin, UpdateView):
     model = Product
@@ -202,23 +341,90 @@ def toggle_product_availability(request, pk):
         'status': 'Available' if product.is_available else 'Unavailable'
     })
 
+@login_required
+def bulk_update_products(request):
+    if request.user.user_type != 'farmer':
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        changes = json.loads(request.body)['changes']
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({'success': False, 'error': 'Expected {"changes": [...]}.'}, status=400)
+    try:
+        updated, errors = bulk.apply_stock_changes(request.user.farmer_profile, changes)
+    except bulk.CatalogFileError as exc:
+        return JsonResponse({'success': False, 'error': str(exc)}, status=400)
+
+    if errors:
+        return JsonResponse({
+            'success': False,
+            'errors': [{'index': index, 'error': error} for index, error in sorted(errors.items())],
+        }, status=400)
+    return JsonResponse({'success': True, 'updated': updated})
+
+class CatalogImportView(LoginRequiredMixin, FormView):
+    form_class = CatalogImportForm
+    template_name = 'products/catalog_import.html'
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.user.is_authenticated and request.user.user_type != 'farmer':
+            messages.error(request, 'Access denied. Farmers only.')
+            return redirect('accounts:home')
+        return super().dispatch(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        upload = form.cleaned_data['file']
+        file_format = form.cleaned_data['format'] or bulk.detect_format(upload.name)
+        if file_format is None:
+            form.add_error('format', 'Could not tell the format from the file name; please choose one.')
+            return self.form_invalid(form)
+        try:
+            result = bulk.import_products(self.request.user.farmer_profile, upload, file_format)
+        except bulk.CatalogFileError as exc:
+            form.add_error('file', str(exc))
+            return self.form_invalid(form)
+
+        if result.created or result.updated:
+            messages.success(
+                self.request,
+                f'Imported {result.created} new and updated {result.updated} existing products.'
+            )
+        if result.error_count:
+            messages.warning(self.request, f'{result.error_count} rows were skipped.')
+        return self.render_to_response(self.get_context_data(form=self.form_class(), result=result))
+
+@login_required
+def catalog_export(request):
+    if request.user.user_type != 'farmer':
+        messages.error(request, 'Access denied. Farmers only.')
+        return redirect('accounts:home')
+
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in bulk.FORMATS:
+        file_format = 'csv'
+    products = Product.objects.filter(farmer=request.user.farmer_profile)
+    response = StreamingHttpResponse(
+        bulk.export_products(products, file_format),
+        content_type=bulk.FORMATS[file_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+    return response
+
 def product_search_api(request):
     query = request.GET.get('q', '')
     if query:
-        products = Product.objects.filter(
-            Q(name__icontains=query) | Q(description__icontains=query),
-            is_available=True
-        )[:10]
-        
-        results = [{
-            'id': product.id,
-            'name': product.name,
-            'price': str(product.price),
-            'farmer': product.farmer.user.username,
-            'image_url': product.image.url if product.image else ''
-        } for product in products]
+        # Served from the in-process autocomplete index, no DB round-trip
+        results = [entry.as_json() for entry in autocomplete.suggest(query, limit=10)]
+        if results:
+            return JsonResponse({'results': results})
         
-        return JsonResponse({'results': results})
+        # Nothing matched as typed; try again with misspelled terms corrected
+        suggestion = did_you_mean(query)
+        if suggestion:
+            results = [entry.as_json() for entry in autocomplete.suggest(suggestion, limit=10)]
+        return JsonResponse({'results': results, 'did_you_mean': suggestion})
     
     return JsonResponse({'results': []})
 
@@ -236,19 +442,22 @@ def add_product_review(request, product_id):
         if not (1 <= rating <= 5):
             return JsonResponse({'error': 'Rating must be between 1 and 5'}, status=400)
         
-        review, created = ProductReview.objects.update_or_create(
-            product=product,
-            customer=request.user.customer_profile,
-            defaults={
-                'rating': rating,
-                'review': review_text
-            }
-        )
+        # The review and the product's stored rating aggregates (updated by
+        # the ProductReview signals) must commit together
+        with transaction.atomic():
+            review, created = ProductReview.objects.update_or_create(
+                product=product,
+                customer=request.user.customer_profile,
+                defaults={
+                    'rating': rating,
+                    'review': review_text
+                }
+            )
         
         # Create notification for farmer
         Notification.objects.create(
             user=product.farmer.user,
-            type='review',
+            notification_type='new_review',
             title='New Product Review',
             message=f'{request.user.username} reviewed your product "{product.name}" with {rating} stars.'
         )
@@ -262,65 +471,71 @@ def add_product_review(request, product_id):
     
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
-class AdvancedSearchView(ListView):
+class AdvancedSearchView(NearbyFilterMixin, CachedResultsMixin, KeysetPaginationMixin, ListView):
     model = Product
     template_name = 'products/advanced_search.html'
     context_object_name = 'products'
     paginate_by = 12
+    result_cache_params = dict(
+        ProductListView.result_cache_params,
+        min_rating=result_cache.number,
+        in_stock=result_cache.flag,
+    )
     
     def get_queryset(self):
         queryset = Product.objects.filter(is_available=True).select_related('farmer__user', 'category')
         
-        # Search functionality
-        search = self.request.GET.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(description__icontains=search) |
-                Q(farmer__user__username__icontains=search)
-            )
-        
-        # Category filter
-        category = self.request.GET.get('category')
-        if category:
-            queryset = queryset.filter(category_id=category)
-        
         # Price range filter
-        min_price = self.request.GET.get('min_price')
-        max_price = self.request.GET.get('max_price')
-        if min_price:
+        min_price = price_param(self.request.GET.get('min_price'))
+        max_price = price_param(self.request.GET.get('max_price'))
+        if min_price is not None:
             queryset = queryset.filter(price__gte=min_price)
-        if max_price:
+        if max_price is not None:
             queryset = queryset.filter(price__lte=max_price)
         
         # Location filter
-        location = self.request.GET.get('location')
-        if location:
-            queryset = queryset.filter(farmer__farm_location__icontains=location)
+        queryset = self.filter_location(queryset)
         
         # Rating filter
         min_rating = self.request.GET.get('min_rating')
         if min_rating:
-            # This would require a more complex query with annotations
-            pass
+            try:
+                queryset = queryset.filter(rating_avg__gte=float(min_rating))
+            except ValueError:
+                pass
         
         # Stock filter
         in_stock = self.request.GET.get('in_stock')
         if in_stock:
-            queryset = queryset.filter(stock__gt=0)
-        
-        # Organic filter
-        organic = self.request.GET.get('organic')
-        if organic:
-            queryset = queryset.filter(
-                Q(name__icontains='organic') |
-                Q(description__icontains='organic') |
-                Q(farmer__farming_methods__icontains='organic')
-            )
+            queryset = queryset.filter(stock__gt=F('reserved_stock'))
+        
+        # Attribute tag filters (organic, grass-fed, ...)
+        for slug in self.get_selected_tags():
+            queryset = queryset.filter(tag_filter(slug))
+        
+        # Search functionality, after the filters so it ranks only products
+        # that pass them (results come back ordered by relevance)
+        search = self.request.GET.get('search')
+        
+        # Facet counts are taken over the unsorted result set without the
+        # category filter, so every category shows its own count
+        self.facet_queryset = search_products(queryset, search) if search else queryset
+        
+        # Category filter
+        category = self.get_category_id()
+        if category is None:
+            queryset = self.facet_queryset
+        else:
+            queryset = queryset.filter(category_id=category)
+            if search:
+                queryset = search_products(queryset, search)
         
         # Sorting
-        sort = self.request.GET.get('sort', 'newest')
-        if sort == 'newest':
+        sort = self.get_sort()
+        if sort == 'relevance':
+            # search_products() already ordered by rank
+            pass
+        elif sort == 'newest':
             queryset = queryset.order_by('-created_at')
         elif sort == 'oldest':
             queryset = queryset.order_by('created_at')
@@ -329,26 +544,98 @@ class AdvancedSearchView(ListView):
         elif sort == 'price_high':
             queryset = queryset.order_by('-price')
         elif sort == 'rating':
-            # Would need annotation for average rating
-            queryset = queryset.order_by('-created_at')
+            queryset = queryset.order_by('-rating_avg', '-rating_count', '-created_at')
         elif sort == 'popular':
-            # Would need annotation for popularity
-            queryset = queryset.order_by('-created_at')
+            queryset = queryset.order_by('-popularity_score', '-created_at')
+        elif sort == 'distance':
+            queryset = queryset.order_by('distance_km', '-created_at')
         
         return queryset
     
+    # Cursor orderings per sort; relevance has no seekable key
+    sort_keyset_orderings = {
+        'newest': ('-created_at', '-id'),
+        'oldest': ('created_at', 'id'),
+        'price_low': ('price', 'id'),
+        'price_high': ('-price', '-id'),
+        'rating': ('-rating_avg', '-rating_count', '-created_at', '-id'),
+        'popular': ('-popularity_score', '-created_at', '-id'),
+    }
+    
+    def get_keyset_ordering(self):
+        return self.sort_keyset_orderings.get(self.get_sort())
+    
+    def get_sort(self):
+        default = 'relevance' if self.request.GET.get('search') else 'newest'
+        sort = self.request.GET.get('sort') or default
+        if sort == 'relevance' and not self.request.GET.get('search'):
+            sort = 'newest'
+        if sort == 'distance' and self.get_origin() is None:
+            sort = default
+        return sort
+    
+    def get_category_id(self):
+        try:
+            return int(self.request.GET.get('category') or '')
+        except ValueError:
+            return None
+    
+    def get_selected_tags(self):
+        known = {slug for slug, name, pattern in TAG_RULES}
+        selected = set(self.request.GET.getlist('tag')) & known
+        # ?organic=on predates tags
+        if self.request.GET.get('organic'):
+            selected.add('organic')
+        return sorted(selected)
+    
+    def get_result_cache_params(self):
+        params = [
+            (name, value) for name, value in super().get_result_cache_params()
+            if name != 'sort'
+        ]
+        params += [('sort', self.get_sort()), ('tag', self.get_selected_tags())]
+        return sorted(params)
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
+        context['categories'] = all_categories()
         context['search_query'] = self.request.GET.get('search', '')
         context['selected_category'] = self.request.GET.get('category', '')
         context['min_price'] = self.request.GET.get('min_price', '')
         context['max_price'] = self.request.GET.get('max_price', '')
-        context['location'] = self.request.GET.get('location', '')
         context['min_rating'] = self.request.GET.get('min_rating', '')
         context['in_stock'] = self.request.GET.get('in_stock')
-        context['organic'] = self.request.GET.get('organic')
-        context['sort'] = self.request.GET.get('sort', 'newest')
+        context['selected_tags'] = self.get_selected_tags()
+        context['sort'] = self.get_sort()
+        
+        try:
+            facet_params = [
+                (name, value) for name, value in self.get_result_cache_params()
+                if name not in ('page', 'cursor', 'sort')
+            ]
+        except result_cache.InvalidParameter:
+            facets = compute_facets(self.facet_queryset, self.get_category_id())
+        else:
+            facets = result_cache.get_or_compute(
+                result_cache.result_key('facets', facet_params),
+                lambda: compute_facets(self.facet_queryset, self.get_category_id()),
+            )
+        context['facets'] = facets
+        context['category_facets'] = [
+            (category, facets['categories'].get(category.id, 0))
+            for category in context['categories']
+        ]
+        context['tag_facets'] = [
+            (slug, name, facets['tags'].get(slug, 0))
+            for slug, name, pattern in TAG_RULES
+        ]
+        for bucket in facets['price_buckets']:
+            params = self.request.GET.copy()
+            params.pop('page', None)
+            params['min_price'] = bucket['min'] if bucket['min'] is not None else ''
+            # Bucket maxima are exclusive, the max_price filter is inclusive
+            params['max_price'] = bucket['max'] - Decimal('0.01') if bucket['max'] is not None else ''
+            bucket['query'] = params.urlencode()
         return context
 
 class AnalyticsDashboardView(LoginRequiredMixin, TemplateView):